@@ -0,0 +1,299 @@
+"""Admission control: per-tenant rate limits, a global upstream concurrency limit and request deadlines.
+
+``TenantRateLimiter`` is a token bucket per tenant, checked when an analysis
+request arrives. ``ConcurrencyLimiter`` bounds concurrent upstream calls
+with a bounded FIFO wait queue, and sheds a caller at once when the queue is
+full or the expected wait would outlast its deadline. The deadline comes from
+the ``X-Request-Timeout-Ms`` header; ``DeadlineMiddleware`` stores it in a
+context variable for the whole request, so code further down (including
+streamed response bodies) can ask for ``remaining_seconds()``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+_deadline: ContextVar[float | None] = ContextVar("insight2spec_deadline", default=None)
+
+T = TypeVar("T")
+
+
+class AdmissionError(Exception):
+    """Base class for requests turned away before any upstream call."""
+
+    def __init__(self, message: str, *, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimitedError(AdmissionError):
+    """The tenant's token bucket is empty."""
+
+
+class OverloadedError(AdmissionError):
+    """The upstream concurrency limit is saturated and the caller was shed."""
+
+
+class DeadlineExceededError(AdmissionError):
+    """The client-supplied deadline passed before the analysis finished."""
+
+
+def remaining_seconds() -> float | None:
+    """Seconds left before the current request's deadline, or ``None`` without one."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def without_deadline(operation: Callable[[], Awaitable[T]]) -> Callable[[], Awaitable[T]]:
+    """Wrap ``operation`` to run with no request deadline.
+
+    For work several requests share, such as a coalesced upstream call: a task
+    copies the context of the request that started it, so without this every
+    request joining later would run under the first one's deadline. Each
+    caller enforces its own deadline while it waits instead.
+    """
+
+    async def run() -> T:
+        _deadline.set(None)
+        return await operation()
+
+    return run
+
+
+def parse_timeout_header(value: str | None) -> float | None:
+    """``X-Request-Timeout-Ms`` as seconds; missing or malformed values mean no deadline."""
+    if value is None:
+        return None
+    try:
+        milliseconds = float(value)
+    except ValueError:
+        return None
+    if not math.isfinite(milliseconds):
+        return None
+    return milliseconds / 1000
+
+
+class DeadlineMiddleware:
+    """ASGI middleware that sets the request deadline from ``DEADLINE_HEADER``.
+
+    The deadline is relative (a budget in milliseconds), so client and server
+    clocks never need to agree. It stays set until the response body is sent.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+        self.header = DEADLINE_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        value = next((raw for name, raw in scope.get("headers", ()) if name == self.header), None)
+        budget = parse_timeout_header(value.decode("latin-1") if value is not None else None)
+        token = _deadline.set(time.monotonic() + budget if budget is not None else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens and return 0, or return the seconds until they are available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class TenantRateLimiter:
+    """Token bucket per tenant: ``rate_per_second`` sustained, ``burst`` at once.
+
+    Buckets for the least recently seen tenants are dropped past
+    ``max_tenants``; a dropped tenant simply starts again with a full bucket.
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        burst: float,
+        *,
+        max_tenants: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate_per_second = rate_per_second
+        self.burst = max(1.0, burst)
+        self.max_tenants = max_tenants
+        self.clock = clock
+        self.limited = 0
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "TenantRateLimiter | None":
+        rate = float(os.getenv("INSIGHT2SPEC_RATE_LIMIT_PER_SECOND", "0"))
+        if rate <= 0:
+            return None
+        burst = os.getenv("INSIGHT2SPEC_RATE_LIMIT_BURST") or str(max(1.0, rate * 2))
+        return cls(rate, float(burst))
+
+    def check(self, tenant: str) -> None:
+        """Spend one token for ``tenant`` or raise ``RateLimitedError`` with a ``retry_after``."""
+        now = self.clock()
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            bucket = self._buckets[tenant] = TokenBucket(self.rate_per_second, self.burst, now)
+            if len(self._buckets) > self.max_tenants:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(tenant)
+
+        wait = bucket.take(now)
+        if wait:
+            self.limited += 1
+            raise RateLimitedError(
+                f"Rate limit of {self.rate_per_second:g} requests/s exceeded", retry_after=wait
+            )
+
+
+class ConcurrencyLimiter:
+    """At most ``max_concurrent`` upstream calls at once, with up to ``max_queued`` callers waiting.
+
+    Slots are handed over in arrival order. A caller is shed with
+    ``OverloadedError`` when the queue is full, or when its deadline is shorter
+    than the expected wait (queue position times the recent average call
+    duration, spread over all slots), instead of queueing only to time out.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queued: int,
+        *,
+        alpha: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.alpha = alpha
+        self.clock = clock
+        self.active = 0
+        self.shed = 0
+        self.peak_queued = 0
+        self.average_hold_seconds: float | None = None
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @classmethod
+    def from_env(cls) -> "ConcurrencyLimiter | None":
+        max_concurrent = int(os.getenv("INSIGHT2SPEC_MAX_CONCURRENT_UPSTREAM", "64"))
+        if max_concurrent <= 0:
+            return None
+        return cls(max_concurrent, int(os.getenv("INSIGHT2SPEC_MAX_QUEUED_UPSTREAM", "256")))
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self) -> float:
+        """Rough wait for a caller joining the queue now."""
+        if self.active < self.max_concurrent and not self._waiters:
+            return 0.0
+        if self.average_hold_seconds is None:
+            return 0.0
+        rounds = (len(self._waiters) // self.max_concurrent) + 1
+        return rounds * self.average_hold_seconds
+
+    def _reject(self, message: str) -> OverloadedError:
+        self.shed += 1
+        return OverloadedError(message, retry_after=max(1.0, self.expected_wait()))
+
+    def check(self, deadline_seconds: float | None = None) -> None:
+        """Raise ``OverloadedError`` if a caller arriving now would be shed."""
+        if self.active < self.max_concurrent and not self._waiters:
+            return
+        if len(self._waiters) >= self.max_queued:
+            raise self._reject(f"Upstream concurrency limit reached and {self.max_queued} requests already waiting")
+        if deadline_seconds is not None and self.expected_wait() >= deadline_seconds:
+            raise self._reject("Upstream queue wait would exceed the request deadline")
+
+    async def acquire(self, deadline_seconds: float | None = None) -> None:
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return
+
+        self.check(deadline_seconds)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.peak_queued = max(self.peak_queued, len(self._waiters))
+        try:
+            if deadline_seconds is None:
+                await waiter
+            else:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout=max(0.0, deadline_seconds))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as error:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on.
+                self._release_slot()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(error, asyncio.TimeoutError):
+                raise self._reject("Request deadline passed while waiting for an upstream slot") from None
+            raise
+
+    def _release_slot(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot moves to the waiter; ``active`` is unchanged.
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def release(self, held_seconds: float) -> None:
+        if self.average_hold_seconds is None:
+            self.average_hold_seconds = held_seconds
+        else:
+            self.average_hold_seconds += self.alpha * (held_seconds - self.average_hold_seconds)
+        self._release_slot()
+
+    @asynccontextmanager
+    async def slot(self, deadline_seconds: float | None = None) -> AsyncIterator[None]:
+        await self.acquire(deadline_seconds)
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.release(self.clock() - started)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "shed": self.shed,
+        }
@@ -0,0 +1,247 @@
+"""Offline batch analysis of a JSONL file, without the HTTP server.
+
+    python -m app.batch feedback.jsonl results.jsonl [--mode mock|local|openrouter]
+
+Input lines use the ``/analyze/ndjson`` format and output lines are the same
+result objects. Mock and local analyses run in a process pool; OpenRouter
+analyses run as concurrent async calls through the normal ``/analyze`` path.
+Results are appended as they finish, so re-running the same command after an
+interruption skips the units that already have a result.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections.abc import AsyncIterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, TextIO
+
+from app import json_codec
+from app.main import _analyze_ndjson_unit, create_app
+from app.ndjson import AnalysisUnit, iter_analysis_units, iter_lines
+
+_WORKER_APP = None
+
+
+class CheckpointMismatchError(RuntimeError):
+    """Raised when an existing output file was produced from different input or grouping."""
+
+
+@dataclass(slots=True)
+class BatchSummary:
+    units: int = 0
+    resumed: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    feedback_items: int = 0
+    wall_seconds: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+    def render(self) -> str:
+        processed = self.succeeded + self.failed
+        rate = processed / self.wall_seconds if self.wall_seconds else 0.0
+        item_rate = self.feedback_items / self.wall_seconds if self.wall_seconds else 0.0
+        return "\n".join(
+            [
+                f"units: {self.units} ({self.resumed} resumed from checkpoint, {processed} analyzed)",
+                f"succeeded: {self.succeeded}  failed: {self.failed}",
+                f"wall time: {self.wall_seconds:.2f}s  "
+                f"throughput: {rate:.1f} units/s, {item_rate:.1f} feedback items/s",
+                "latency per unit: "
+                f"p50 {self.percentile(0.50) * 1000:.1f}ms  p95 {self.percentile(0.95) * 1000:.1f}ms  "
+                f"p99 {self.percentile(0.99) * 1000:.1f}ms  max {max(self.latencies, default=0.0) * 1000:.1f}ms",
+            ]
+        )
+
+
+def load_checkpoint(path: str) -> dict[int, tuple[int, int]]:
+    """Return ``{index: (first_line, last_line)}`` for units that already have a result.
+
+    A torn last line from an interrupted run is cut off so appends start clean.
+    Units recorded only with an error are analyzed again.
+    """
+    if not os.path.exists(path):
+        return {}
+
+    done: dict[int, tuple[int, int]] = {}
+    with open(path, "rb+") as handle:
+        data = handle.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            handle.truncate(complete)
+        for line in data[:complete].splitlines():
+            try:
+                record = json_codec.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("result") is not None:
+                done[record["index"]] = (record["first_line"], record["last_line"])
+    return done
+
+
+async def _read_chunks(path: str, chunk_size: int = 1 << 16) -> AsyncIterator[bytes]:
+    with open(path, "rb") as handle:
+        while chunk := handle.read(chunk_size):
+            yield chunk
+
+
+def _init_worker() -> None:
+    global _WORKER_APP
+    _WORKER_APP = create_app()
+
+
+def _analyze_in_worker(index: int, unit: tuple[Any, ...], mode: str) -> tuple[dict[str, Any], float]:
+    """Process-pool entry point; the unit travels as a plain tuple."""
+    unit = AnalysisUnit(*unit)
+    started = time.perf_counter()
+    item = asyncio.run(_analyze_ndjson_unit(_WORKER_APP, index, unit, mode=mode))
+    return item.model_dump(mode="json"), time.perf_counter() - started
+
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    *,
+    mode: str,
+    workers: int,
+    concurrency: int,
+    group_size: int,
+    context: str | None = None,
+    max_line_bytes: int = 1024 * 1024,
+) -> BatchSummary:
+    summary = BatchSummary()
+    done = load_checkpoint(output_path)
+    app = create_app()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if mode != "openrouter" else None
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    tasks: set[asyncio.Task[None]] = set()
+    started = time.perf_counter()
+
+    async def analyze(index: int, unit: AnalysisUnit, out: TextIO) -> None:
+        try:
+            if pool is None:
+                unit_started = time.perf_counter()
+                item = (await _analyze_ndjson_unit(app, index, unit, mode=mode)).model_dump(mode="json")
+                latency = time.perf_counter() - unit_started
+            else:
+                fields = (unit.first_line, unit.last_line, unit.request, unit.error)
+                item, latency = await loop.run_in_executor(pool, _analyze_in_worker, index, fields, mode)
+        finally:
+            slots.release()
+
+        # Flushed per line: a crash loses at most the units still in flight.
+        out.write(json_codec.dumps(item) + "\n")
+        out.flush()
+        summary.latencies.append(latency)
+        if item["error"] is None:
+            summary.succeeded += 1
+        else:
+            summary.failed += 1
+
+    try:
+        with open(output_path, "a", encoding="utf-8") as out:
+            units = iter_analysis_units(
+                iter_lines(_read_chunks(input_path), max_line_bytes=max_line_bytes),
+                group_size=group_size,
+                context=context,
+            )
+            index = -1
+            async for unit in units:
+                index += 1
+                summary.units += 1
+                if index in done:
+                    if done[index] != (unit.first_line, unit.last_line):
+                        raise CheckpointMismatchError(
+                            f"{output_path} was written from different input or --group-size "
+                            f"(unit {index} covered lines {done[index]}, now {unit.first_line}-{unit.last_line})"
+                        )
+                    summary.resumed += 1
+                    continue
+                if unit.request is not None:
+                    summary.feedback_items += len(unit.request.get("feedback") or [])
+
+                await slots.acquire()
+                task = asyncio.create_task(analyze(index, unit, out))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            await asyncio.gather(*tasks)
+            os.fsync(out.fileno())
+    finally:
+        for task in tasks:
+            task.cancel()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        client = app.state.openrouter_client
+        if client is not None:
+            await client.aclose()
+        app.state.analysis_cache.close()
+        app.state.jobs.store.close()
+        app.state.sessions.close()
+        summary.wall_seconds = time.perf_counter() - started
+
+    return summary
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.batch", description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL input (AnalyzeRequest objects or feedback snippets)")
+    parser.add_argument("output", help="JSONL results file; an existing file is resumed")
+    parser.add_argument(
+        "--mode",
+        choices=("mock", "local", "openrouter"),
+        default=os.getenv("INSIGHT2SPEC_ANALYZE_MODE", "mock").lower(),
+        help="analysis mode (default: INSIGHT2SPEC_ANALYZE_MODE or mock)",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for mock/local mode")
+    parser.add_argument(
+        "--concurrency", type=int, default=0, help="units in flight (default: 2 x workers, or 8 for openrouter)"
+    )
+    parser.add_argument("--group-size", type=int, default=50, help="feedback snippets per analysis (default: 50)")
+    parser.add_argument("--context", default=None, help="context applied to grouped snippets")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = _parse_args(argv)
+    workers = max(1, args.workers)
+    concurrency = args.concurrency or (8 if args.mode == "openrouter" else workers * 2)
+    try:
+        summary = asyncio.run(
+            run_batch(
+                args.input,
+                args.output,
+                mode=args.mode,
+                workers=workers,
+                concurrency=max(1, concurrency),
+                group_size=max(1, args.group_size),
+                context=args.context,
+            )
+        )
+    except CheckpointMismatchError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        print("interrupted; re-run the same command to resume", file=sys.stderr)
+        return 130
+
+    print(summary.render())
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
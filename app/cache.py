@@ -0,0 +1,180 @@
+"""Result cache for analysis responses.
+
+Two tiers: a per-process in-memory LRU with size and TTL limits, and an
+optional SQLite file that every worker process on a host can share.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+from app import json_codec
+
+Clock = Callable[[], float]
+
+
+def _normalize_text(value: str) -> str:
+    return " ".join(value.split())
+
+
+def build_cache_key(
+    *,
+    feedback: Sequence[str],
+    context: str | None,
+    model: str,
+    prompt_version: str,
+) -> str:
+    """Hash the inputs that determine an analysis result.
+
+    Whitespace differences are normalized away so re-submissions from
+    different clients land on the same key.
+    """
+    material = {
+        "feedback": [_normalize_text(item) for item in feedback],
+        "context": _normalize_text(context) if context else None,
+        "model": model,
+        "prompt_version": prompt_version,
+    }
+    encoded = json.dumps(material, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+@dataclass(slots=True)
+class MemoryLRUCache:
+    max_entries: int = 1024
+    ttl_seconds: float = 3600.0
+    clock: Clock = time.monotonic
+    _entries: OrderedDict[str, tuple[float, dict[str, Any]]] = field(default_factory=OrderedDict, init=False)
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+
+        self._entries[key] = (self.clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """TTL cache in a SQLite file, shared by all workers on a host.
+
+    Uses WAL mode so concurrent readers in other processes are not blocked by
+    a writer. Expiry uses wall-clock time because monotonic clocks are not
+    comparable across processes.
+    """
+
+    def __init__(self, path: str, *, ttl_seconds: float = 3600.0, clock: Clock = time.time) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, value FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            expires_at, value = row
+            if expires_at <= self.clock():
+                self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                return None
+
+        return json_codec.loads(value)
+
+    def set(self, key: str, value: dict[str, Any]) -> None:
+        encoded = json_codec.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, self.clock() + self.ttl_seconds, encoded),
+            )
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM analysis_cache WHERE expires_at <= ?", (self.clock(),))
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass(slots=True)
+class AnalysisCache:
+    """Memory tier in front of an optional shared SQLite tier."""
+
+    memory: MemoryLRUCache
+    disk: SQLiteCache | None = None
+    hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def from_env(cls) -> "AnalysisCache":
+        ttl_seconds = float(os.getenv("INSIGHT2SPEC_CACHE_TTL_SECONDS", "3600"))
+        memory = MemoryLRUCache(
+            max_entries=int(os.getenv("INSIGHT2SPEC_CACHE_MAX_ENTRIES", "1024")),
+            ttl_seconds=ttl_seconds,
+        )
+        sqlite_path = os.getenv("INSIGHT2SPEC_CACHE_SQLITE_PATH")
+        disk = SQLiteCache(sqlite_path, ttl_seconds=ttl_seconds) if sqlite_path else None
+        return cls(memory=memory, disk=disk)
+
+    def get(self, key: str, *, record: bool = True) -> dict[str, Any] | None:
+        """Look up both tiers; ``record=False`` skips the hit/miss counters (for re-checks)."""
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+
+        if not record:
+            return value
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: dict[str, Any]) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
@@ -0,0 +1,181 @@
+"""Negotiated gzip/brotli response compression, including streamed bodies."""
+
+from __future__ import annotations
+
+import os
+import zlib
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - exercised when brotli is not installed
+    brotli = None
+
+# Preferred first when the client weighs them equally.
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = frozenset(
+    ("application/json", "application/x-ndjson", "text/event-stream", "text/plain")
+)
+
+
+def negotiate_encoding(accept_encoding: str | None, supported: Iterable[str] = SUPPORTED_ENCODINGS) -> str | None:
+    """Pick the supported coding the client weighs highest in ``Accept-Encoding``, or ``None``."""
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for name in supported:
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+class _Encoder:
+    """Incremental encoder; every ``compress`` call flushes, so streamed events are not held back."""
+
+    def __init__(self, encoding: str) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=4)
+        else:
+            self._zlib = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+@dataclass(slots=True)
+class CompressionConfig:
+    enabled: bool = True
+    min_bytes: int = 1024
+
+    @classmethod
+    def from_env(cls) -> "CompressionConfig":
+        return cls(
+            enabled=os.getenv("INSIGHT2SPEC_COMPRESSION_ENABLED", "true").lower() in {"1", "true", "yes"},
+            min_bytes=int(os.getenv("INSIGHT2SPEC_COMPRESSION_MIN_BYTES", "1024")),
+        )
+
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses JSON, NDJSON, SSE and text responses.
+
+    The coding is negotiated from ``Accept-Encoding`` (brotli when installed,
+    else gzip). Bodies sent in one piece are compressed when they are at least
+    ``min_bytes``; streamed bodies are always compressed, with each chunk
+    flushed through so events reach the client as they are produced.
+    """
+
+    def __init__(self, app: Any, *, config: CompressionConfig | None = None) -> None:
+        self.app = app
+        self.config = config if config is not None else CompressionConfig.from_env()
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not self.config.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        accept = next((value for name, value in scope.get("headers", ()) if name == b"accept-encoding"), None)
+        encoding = negotiate_encoding(accept.decode("latin-1") if accept is not None else None)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: dict[str, Any] | None = None
+        encoder: _Encoder | None = None
+        passthrough = False
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                passthrough = not _compressible(message)
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not more_body:
+                    # The whole body in one message: compress it if it is worth it, with an exact length.
+                    if len(body) < self.config.min_bytes:
+                        await send(_with_headers(start))
+                        await send(message)
+                    else:
+                        encoder = _Encoder(encoding)
+                        body = encoder.compress(body) + encoder.finish()
+                        await send(_with_headers(start, encoding=encoding, length=len(body)))
+                        await send({"type": "http.response.body", "body": body, "more_body": False})
+                    passthrough = True
+                    return
+                encoder = _Encoder(encoding)
+                await send(_with_headers(start, encoding=encoding))
+
+            chunk = encoder.compress(body) if body else b""
+            if not more_body:
+                chunk += encoder.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _header(message: dict[str, Any], name: bytes) -> bytes | None:
+    return next((value for key, value in message.get("headers", ()) if key.lower() == name), None)
+
+
+def _compressible(start: dict[str, Any]) -> bool:
+    if start["status"] < 200 or start["status"] in (204, 304):
+        return False
+    if _header(start, b"content-encoding") is not None:
+        return False
+    content_type = _header(start, b"content-type")
+    if content_type is None:
+        return False
+    return content_type.decode("latin-1").split(";", 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+def _with_headers(start: dict[str, Any], *, encoding: str | None = None, length: int | None = None) -> dict[str, Any]:
+    """``start`` with ``Vary: Accept-Encoding`` and, when ``encoding`` is set, the encoded body's headers.
+
+    Without ``length`` a compressed response drops ``Content-Length`` and is sent chunked.
+    """
+    drop = {b"vary"} | ({b"content-length"} if encoding is not None else set())
+    headers = [(name, value) for name, value in start.get("headers", ()) if name.lower() not in drop]
+    vary = _header(start, b"vary")
+    if vary is None:
+        headers.append((b"vary", b"Accept-Encoding"))
+    elif b"accept-encoding" in vary.lower():
+        headers.append((b"vary", vary))
+    else:
+        headers.append((b"vary", vary + b", Accept-Encoding"))
+    if encoding is not None:
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode("latin-1")))
+    return {**start, "headers": headers}
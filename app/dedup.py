@@ -0,0 +1,196 @@
+"""Collapsing of exact and near-duplicate feedback before prompt construction.
+
+Exact duplicates are found by a normalized key (case, whitespace and
+punctuation folded). Near duplicates are found with 64-bit SimHash over
+character trigrams of that key: two snippets are merged when their
+fingerprints differ in at most ``max_distance`` bits. Candidates come from
+``max_distance + 1`` fingerprint blocks (by the pigeonhole principle a near
+duplicate matches at least one block exactly), so the pass stays linear in
+the number of snippets.
+
+Near-duplicate merging is off by default (``max_distance=0``). Character
+trigrams do not see meaning: a negation ("is really useful" vs "is not
+really useful") can land as close as a typo fix, so merging must be
+opted into by deployments whose feedback is mostly verbatim repeats.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from app.openrouter_client import OpenRouterConfigError
+
+FINGERPRINT_BITS = 64
+MAX_DISTANCE_LIMIT = 10
+
+_WORD_RE = re.compile(r"\w+")
+
+# SimHash keeps one counter per fingerprint bit. The 64 counters are packed
+# into one integer, _LANE_BITS bits each, so adding a feature is a single
+# big-integer addition rather than a 64-step loop.
+_LANE_BITS = 16
+_LANE_ONES = sum(1 << (bit * _LANE_BITS) for bit in range(FINGERPRINT_BITS))
+_LANE_SIGNS = _LANE_ONES << (_LANE_BITS - 1)
+_MAX_FEATURES = (1 << (_LANE_BITS - 1)) - 1
+# Reads the lane sign bits back out as a 64-character binary string.
+_SIGN_DIGITS = bytes.maketrans(b"\x00\x80", b"01")
+
+# Representatives checked per fingerprint block; bounds the work on pathological input.
+_CANDIDATES_PER_BLOCK = 32
+
+
+class _FeatureLanes(dict):
+    """Memo of feature -> its hash spread over the counter lanes (one bit per lane)."""
+
+    def __missing__(self, feature: tuple[str, ...]) -> int:
+        digest = hashlib.blake2b("".join(feature).encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        lanes = 0
+        for bit in range(FINGERPRINT_BITS):
+            if value >> bit & 1:
+                lanes |= 1 << (bit * _LANE_BITS)
+        self[feature] = lanes
+        return lanes
+
+
+@dataclass(slots=True)
+class DedupConfig:
+    enabled: bool = True
+    max_distance: int = 0
+
+    @classmethod
+    def from_env(cls) -> "DedupConfig":
+        max_distance = int(os.getenv("INSIGHT2SPEC_DEDUP_MAX_DISTANCE", "0"))
+        if not 0 <= max_distance <= MAX_DISTANCE_LIMIT:
+            raise OpenRouterConfigError(
+                f"INSIGHT2SPEC_DEDUP_MAX_DISTANCE must be between 0 and {MAX_DISTANCE_LIMIT}"
+            )
+        return cls(
+            enabled=os.getenv("INSIGHT2SPEC_DEDUP_ENABLED", "true").lower() in {"1", "true", "yes"},
+            max_distance=max_distance,
+        )
+
+    @property
+    def cache_tag(self) -> str:
+        """Distinguishes prompts built with different collapsing settings in cache keys."""
+        return f"dd:{self.max_distance}" if self.enabled else "dd:off"
+
+
+@dataclass(frozen=True, slots=True)
+class FeedbackGroup:
+    """One distinct snippet (the first one seen) and how many input items it stands for."""
+
+    text: str
+    count: int
+
+
+@dataclass(frozen=True, slots=True)
+class CollapsedFeedback:
+    groups: tuple[FeedbackGroup, ...]
+    input_items: int
+    input_chars: int
+    # Items merged into another by similarity rather than exact match.
+    near_duplicates: int
+
+    @property
+    def distinct_items(self) -> int:
+        return len(self.groups)
+
+    @property
+    def distinct_chars(self) -> int:
+        return sum(len(group.text) for group in self.groups)
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.casefold()))
+
+
+def simhash(key: str, lanes: _FeatureLanes | None = None) -> int:
+    """64-bit SimHash of a normalized key over its character trigrams.
+
+    ``lanes`` memoizes feature hashes across calls; feedback dumps reuse a
+    small set of trigrams, so this skips most of the hashing.
+    """
+    lanes = lanes if lanes is not None else _FeatureLanes()
+    padded = f" {key} "
+    features = list(zip(padded, padded[1:], padded[2:]))[:_MAX_FEATURES]
+    counts = sum(map(lanes.__getitem__, features))
+    # Sets a lane's top bit exactly when more than half the features had that bit set.
+    bias = ((1 << (_LANE_BITS - 1)) - 1 - len(features) // 2) * _LANE_ONES
+    signs = ((counts + bias) & _LANE_SIGNS).to_bytes(FINGERPRINT_BITS * _LANE_BITS // 8, "little")
+    return int(signs[-1::-2].translate(_SIGN_DIGITS), 2)
+
+
+def _blocks(fingerprint: int, parts: int) -> list[tuple[int, int]]:
+    width = -(-FINGERPRINT_BITS // parts)
+    mask = (1 << width) - 1
+    return [(part, (fingerprint >> (part * width)) & mask) for part in range(parts)]
+
+
+def collapse_feedback(items: Sequence[str], *, max_distance: int = 0) -> CollapsedFeedback:
+    """Group exact and near-duplicate snippets, keeping first-seen order.
+
+    ``max_distance=0`` (the default) collapses exact (normalized) duplicates
+    only; a positive distance also merges near duplicates.
+    """
+    index_by_key: dict[str, int] = {}
+    texts: list[str] = []
+    counts: list[int] = []
+    near_duplicates = 0
+    lanes = _FeatureLanes()
+    fingerprints: list[int] = []
+    buckets: dict[tuple[int, int], list[int]] = {}
+
+    for item in items:
+        key = normalize(item)
+        group = index_by_key.get(key)
+        if group is not None:
+            counts[group] += 1
+            continue
+
+        if max_distance > 0:
+            fingerprint = simhash(key, lanes)
+            blocks = _blocks(fingerprint, max_distance + 1)
+            for block in blocks:
+                for candidate in buckets.get(block, ()):
+                    if (fingerprints[candidate] ^ fingerprint).bit_count() <= max_distance:
+                        group = candidate
+                        break
+                if group is not None:
+                    break
+            if group is not None:
+                counts[group] += 1
+                near_duplicates += 1
+                # Later exact repeats of this variant skip the fingerprinting.
+                index_by_key[key] = group
+                continue
+            for block in blocks:
+                bucket = buckets.setdefault(block, [])
+                if len(bucket) < _CANDIDATES_PER_BLOCK:
+                    bucket.append(len(texts))
+            fingerprints.append(fingerprint)
+
+        index_by_key[key] = len(texts)
+        texts.append(item)
+        counts.append(1)
+
+    return CollapsedFeedback(
+        groups=tuple(FeedbackGroup(text, count) for text, count in zip(texts, counts)),
+        input_items=len(items),
+        input_chars=sum(len(item) for item in items),
+        near_duplicates=near_duplicates,
+    )
+
+
+def no_collapse(items: Sequence[str]) -> CollapsedFeedback:
+    """Every item as its own group, for when collapsing is disabled."""
+    return CollapsedFeedback(
+        groups=tuple(FeedbackGroup(item, 1) for item in items),
+        input_items=len(items),
+        input_chars=sum(len(item) for item in items),
+        near_duplicates=0,
+    )
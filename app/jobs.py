@@ -0,0 +1,352 @@
+"""Background analysis jobs: SQLite-backed state and a two-lane in-process worker pool."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+from app import json_codec
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "bulk")
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when a priority lane already holds its maximum number of queued jobs."""
+
+
+class JobFailedError(Exception):
+    """Raised by a job runner to fail a job with a stable error code."""
+
+    def __init__(self, code: str, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+@dataclass(frozen=True, slots=True)
+class JobRecord:
+    id: str
+    status: str
+    priority: str
+    request: dict[str, Any]
+    result: dict[str, Any] | None
+    error: dict[str, str] | None
+    created_at: float
+    updated_at: float
+
+
+class JobStore:
+    """Job rows in SQLite. ``:memory:`` keeps them for the life of the process only.
+
+    Several worker processes can share one file. A worker runs a job only
+    after claiming it, which makes it the job's ``owner`` for a lease of
+    ``lease_seconds`` that it renews while the job runs. A running job is
+    taken back only once its lease has expired, so a live worker's jobs are
+    never run twice.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        *,
+        clock: Callable[[], float] = time.time,
+        lease_seconds: float = 60.0,
+        owner: str | None = None,
+    ) -> None:
+        self.path = path
+        self.clock = clock
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, priority TEXT NOT NULL, request TEXT NOT NULL, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "owner TEXT, lease_expires REAL)"
+        )
+        # Job files written before leases existed lack the lease columns.
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(analysis_jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_expires", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE analysis_jobs ADD COLUMN {column} {kind}")
+
+    def create(self, request: dict[str, Any], *, priority: str) -> JobRecord:
+        now = self.clock()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO analysis_jobs (id, status, priority, request, created_at, updated_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, priority, json_codec.dumps(request), now, now),
+            )
+        return JobRecord(job_id, "queued", priority, request, None, None, now, now)
+
+    def get(self, job_id: str) -> JobRecord | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, priority, request, result, error, created_at, updated_at "
+                "FROM analysis_jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return _record_from_row(row) if row is not None else None
+
+    def claim(self, job_id: str) -> JobRecord | None:
+        """Mark a queued job (or one whose lease expired) running under this store's owner.
+
+        Returns ``None`` when the job is gone, finished, or leased by another worker.
+        """
+        now = self.clock()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE analysis_jobs SET status = 'running', owner = ?, lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND (status = 'queued' OR (status = 'running' AND (lease_expires IS NULL OR lease_expires <= ?)))",
+                (self.owner, now + self.lease_seconds, now, job_id, now),
+            )
+        return self.get(job_id) if cursor.rowcount == 1 else None
+
+    def renew(self, job_id: str) -> bool:
+        """Extend this owner's lease on a running job; ``False`` if the lease was lost."""
+        now = self.clock()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE analysis_jobs SET lease_expires = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (now + self.lease_seconds, job_id, self.owner),
+            )
+        return cursor.rowcount == 1
+
+    def mark_succeeded(self, job_id: str, result: dict[str, Any]) -> bool:
+        return self._finish(job_id, "succeeded", result=json_codec.dumps(result))
+
+    def mark_failed(self, job_id: str, error: dict[str, str]) -> bool:
+        return self._finish(job_id, "failed", error=json_codec.dumps(error))
+
+    def _finish(self, job_id: str, status: str, *, result: str | None = None, error: str | None = None) -> bool:
+        """Store a job's outcome unless another worker has taken the job over."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE analysis_jobs SET status = ?, result = ?, error = ?, updated_at = ?, lease_expires = NULL "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, result, error, self.clock(), job_id, self.owner),
+            )
+        return cursor.rowcount == 1
+
+    def recover(self, *, ttl_seconds: float) -> list[JobRecord]:
+        """Return the jobs waiting to run, oldest first, and prune old finished jobs.
+
+        Running jobs whose lease has expired (their worker stopped or hung) go
+        back to the queue; jobs still leased by a live worker are left alone.
+        Finished jobs older than ``ttl_seconds`` are deleted.
+        """
+        now = self.clock()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analysis_jobs SET status = 'queued', owner = NULL, lease_expires = NULL "
+                "WHERE status = 'running' AND (lease_expires IS NULL OR lease_expires <= ?)",
+                (now,),
+            )
+            self._conn.execute(
+                "DELETE FROM analysis_jobs WHERE status IN ('succeeded', 'failed') AND updated_at <= ?",
+                (now - ttl_seconds,),
+            )
+            rows = self._conn.execute(
+                "SELECT id, status, priority, request, result, error, created_at, updated_at "
+                "FROM analysis_jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        return [_record_from_row(row) for row in rows]
+
+    def reclaim_expired(self) -> list[JobRecord]:
+        """Put running jobs whose lease expired back in the queue and return them, oldest first.
+
+        Only the store whose update flips a row returns it, so each stale job
+        is handed to one worker.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "UPDATE analysis_jobs SET status = 'queued', owner = NULL, lease_expires = NULL "
+                "WHERE status = 'running' AND (lease_expires IS NULL OR lease_expires <= ?) "
+                "RETURNING id, status, priority, request, result, error, created_at, updated_at",
+                (self.clock(),),
+            ).fetchall()
+        return sorted((_record_from_row(row) for row in rows), key=lambda job: job.created_at)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _record_from_row(row: tuple[Any, ...]) -> JobRecord:
+    job_id, status, priority, request, result, error, created_at, updated_at = row
+    return JobRecord(
+        id=job_id,
+        status=status,
+        priority=priority,
+        request=json_codec.loads(request),
+        result=json_codec.loads(result) if result is not None else None,
+        error=json_codec.loads(error) if error is not None else None,
+        created_at=created_at,
+        updated_at=updated_at,
+    )
+
+
+JobRunner = Callable[[dict[str, Any]], Awaitable[dict[str, Any]]]
+
+
+class JobQueue:
+    """Worker pool fed by an interactive lane and a bulk lane.
+
+    Workers take interactive jobs first. After ``interactive_burst``
+    interactive jobs in a row a waiting bulk job goes next, so bulk work is
+    slowed under interactive load but never starved. Each lane accepts at
+    most ``max_queued`` waiting jobs submitted to it; recovered jobs neither
+    count towards nor are limited by it. At start the queue picks up the jobs a
+    previous run left behind. Every ``store.lease_seconds`` after that it takes
+    over running jobs whose lease expired, including those of other workers
+    sharing the store; jobs still queued in another worker are left to it.
+    Finished jobs are kept for ``ttl_seconds``.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        runner: JobRunner,
+        *,
+        workers: int = 2,
+        max_queued: int = 100,
+        interactive_burst: int = 4,
+        ttl_seconds: float = 86400.0,
+    ) -> None:
+        self.store = store
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.interactive_burst = interactive_burst
+        self.ttl_seconds = ttl_seconds
+        self._lanes: dict[str, deque[str]] = {priority: deque() for priority in PRIORITIES}
+        # Recovered job ids still waiting in a lane, kept out of depth().
+        self._recovered: set[str] = set()
+        self._recovered_depth = dict.fromkeys(PRIORITIES, 0)
+        self._available = asyncio.Semaphore(0)
+        self._interactive_streak = 0
+        self._tasks: list[asyncio.Task[None]] = []
+        self.completed = 0
+        self.failed = 0
+
+    @classmethod
+    def from_env(cls, runner: JobRunner) -> "JobQueue":
+        store = JobStore(
+            os.getenv("INSIGHT2SPEC_JOBS_SQLITE_PATH") or ":memory:",
+            lease_seconds=float(os.getenv("INSIGHT2SPEC_JOBS_LEASE_SECONDS", "60")),
+        )
+        return cls(
+            store,
+            runner,
+            workers=max(1, int(os.getenv("INSIGHT2SPEC_JOB_WORKERS", "2"))),
+            max_queued=int(os.getenv("INSIGHT2SPEC_JOBS_MAX_QUEUED", "100")),
+            ttl_seconds=float(os.getenv("INSIGHT2SPEC_JOBS_TTL_SECONDS", "86400")),
+        )
+
+    def depth(self, priority: str) -> int:
+        """Jobs submitted to this queue that are waiting in the ``priority`` lane."""
+        return len(self._lanes[priority]) - self._recovered_depth[priority]
+
+    def submit(self, request: dict[str, Any], *, priority: str) -> JobRecord:
+        if self.depth(priority) >= self.max_queued:
+            raise JobQueueFullError(f"The {priority} job queue is full ({self.max_queued} jobs waiting)")
+        job = self.store.create(request, priority=priority)
+        self._push(job.id, priority)
+        return job
+
+    def _push(self, job_id: str, priority: str, *, recovered: bool = False) -> None:
+        if recovered:
+            self._recovered.add(job_id)
+            self._recovered_depth[priority] += 1
+        self._lanes[priority].append(job_id)
+        self._available.release()
+
+    def _pop(self) -> str:
+        interactive, bulk = self._lanes["interactive"], self._lanes["bulk"]
+        if interactive and not (bulk and self._interactive_streak >= self.interactive_burst):
+            self._interactive_streak += 1
+            priority = "interactive"
+        else:
+            self._interactive_streak = 0
+            priority = "bulk"
+        job_id = self._lanes[priority].popleft()
+        if job_id in self._recovered:
+            self._recovered.discard(job_id)
+            self._recovered_depth[priority] -= 1
+        return job_id
+
+    async def start(self) -> None:
+        """Queue the jobs left over from a previous run, then start the workers."""
+        self._requeue(self.store.recover(ttl_seconds=self.ttl_seconds))
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reclaim()))
+
+    def _requeue(self, jobs: list[JobRecord]) -> None:
+        pending = {job_id for lane in self._lanes.values() for job_id in lane}
+        for job in jobs:
+            if job.id in pending:
+                continue
+            self._push(job.id, job.priority if job.priority in self._lanes else "bulk", recovered=True)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _reclaim(self) -> None:
+        while True:
+            await asyncio.sleep(self.store.lease_seconds)
+            self._requeue(self.store.reclaim_expired())
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            if not self.store.renew(job_id):
+                logger.warning("Lost the lease on analysis job %s", job_id)
+                return
+
+    async def _work(self) -> None:
+        while True:
+            await self._available.acquire()
+            job_id = self._pop()
+            job = self.store.claim(job_id)
+            if job is None:
+                # Finished, gone, or running on another worker.
+                continue
+
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            try:
+                result = await self.runner(job.request)
+            except JobFailedError as error:
+                self.failed += 1
+                self.store.mark_failed(job_id, {"code": error.code, "message": error.message})
+            except asyncio.CancelledError:
+                # Shutting down: the job stays "running" until its lease expires, then runs again.
+                raise
+            except Exception as error:
+                logger.exception("Analysis job %s crashed", job_id)
+                self.failed += 1
+                self.store.mark_failed(job_id, {"code": "internal_error", "message": str(error)})
+            else:
+                self.completed += 1
+                self.store.mark_succeeded(job_id, result)
+            finally:
+                heartbeat.cancel()
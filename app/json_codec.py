@@ -0,0 +1,31 @@
+"""JSON decoding and encoding through orjson when it is installed.
+
+orjson is optional: without it the standard library is used and behaviour is
+the same. Decode errors are ``json.JSONDecodeError`` either way (orjson's
+error type subclasses it), so callers keep catching the stdlib exception.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is not installed
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> str:
+    """Compact JSON text with non-ASCII characters kept as-is."""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,215 @@
+"""Offline theme discovery: TF-IDF features and spherical k-means, no LLM call.
+
+NumPy is an optional dependency, needed only for ``local`` analyze mode.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9']+")
+
+_STOPWORDS = frozenset(
+    """
+    about after again all also and any are because been before being but can cannot could did does doing
+    for from had has have having her here him his how its just more most not now off once only other our
+    out over own same she should some such than that the their them then there these they this those
+    through too under until very was were what when where which while who why will with would you your
+    yours really still even get gets got app use using used want wants like way lot lots much many
+    """.split()
+)
+
+
+class LocalAnalysisError(RuntimeError):
+    """Raised when local analysis cannot run (for example NumPy is not installed)."""
+
+
+@dataclass(frozen=True, slots=True)
+class FeedbackCluster:
+    label: str
+    size: int
+    top_terms: tuple[str, ...]
+    representative_indexes: tuple[int, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class LocalClustering:
+    clusters: tuple[FeedbackCluster, ...]
+    unclustered: int
+
+
+@dataclass(slots=True)
+class LocalAnalysisConfig:
+    clusters: int = 0
+    max_features: int = 256
+    max_iterations: int = 20
+    representatives: int = 3
+
+    @classmethod
+    def from_env(cls) -> "LocalAnalysisConfig":
+        return cls(
+            clusters=int(os.getenv("INSIGHT2SPEC_LOCAL_CLUSTERS", "0")),
+            max_features=int(os.getenv("INSIGHT2SPEC_LOCAL_MAX_FEATURES", "256")),
+        )
+
+
+def _numpy() -> Any:
+    try:
+        import numpy
+    except ImportError as error:
+        raise LocalAnalysisError("Local analysis mode requires NumPy (pip install numpy)") from error
+    return numpy
+
+
+def _tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if len(token) > 2 and token not in _STOPWORDS]
+
+
+def _select_vocabulary(documents: Sequence[list[str]], max_features: int) -> dict[str, int]:
+    document_frequency = Counter(token for tokens in documents for token in set(tokens))
+    total = len(documents)
+    # Terms in a single snippet cannot group anything; only near-universal terms are dropped, since a
+    # dominant theme's own terms can easily appear in most snippets.
+    min_df = 2 if total >= 4 else 1
+    max_df = total * 0.95 if total >= 20 else total
+    candidates = [
+        (count, term) for term, count in document_frequency.items() if min_df <= count <= max_df
+    ]
+    candidates.sort(key=lambda entry: (-entry[0], entry[1]))
+    return {term: column for column, (_, term) in enumerate(candidates[:max_features])}
+
+
+def _auto_cluster_count(documents: int) -> int:
+    return max(1, min(8, round(math.sqrt(documents / 2))))
+
+
+def _kmeans_plus_plus(np: Any, matrix: Any, k: int, rng: Any) -> Any:
+    centroids = [matrix[rng.integers(len(matrix))]]
+    closest = 1.0 - matrix @ centroids[0]
+    for _ in range(1, k):
+        weights = np.clip(closest, 0.0, None) ** 2
+        total = weights.sum()
+        if total <= 0:
+            break
+        choice = rng.choice(len(matrix), p=weights / total)
+        centroids.append(matrix[choice])
+        closest = np.minimum(closest, 1.0 - matrix @ matrix[choice])
+    return np.stack(centroids)
+
+
+def cluster_feedback(items: Sequence[str], config: LocalAnalysisConfig | None = None) -> LocalClustering:
+    """Group feedback into themes with TF-IDF features and spherical k-means.
+
+    Feature extraction, similarity and centroid updates are vectorized NumPy
+    operations; only tokenization walks the items in Python. Results are
+    deterministic for the same input. Items with no informative terms are
+    counted as ``unclustered``.
+    """
+    np = _numpy()
+    config = config or LocalAnalysisConfig()
+    documents = [_tokenize(item) for item in items]
+    vocabulary = _select_vocabulary(documents, config.max_features)
+    if not vocabulary:
+        return LocalClustering(clusters=(), unclustered=len(items))
+
+    rows: list[int] = []
+    columns: list[int] = []
+    for row, tokens in enumerate(documents):
+        for token in tokens:
+            column = vocabulary.get(token)
+            if column is not None:
+                rows.append(row)
+                columns.append(column)
+
+    features = len(vocabulary)
+    flat = np.asarray(rows, dtype=np.int64) * features + np.asarray(columns, dtype=np.int64)
+    counts = np.bincount(flat, minlength=len(items) * features).reshape(len(items), features).astype(np.float32)
+
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log((1.0 + len(items)) / (1.0 + document_frequency)).astype(np.float32) + 1.0
+    matrix = np.log1p(counts) * idf
+    norms = np.linalg.norm(matrix, axis=1)
+    informative = np.flatnonzero(norms > 0)
+    matrix = matrix[informative] / norms[informative, None]
+    if len(matrix) == 0:
+        return LocalClustering(clusters=(), unclustered=len(items))
+
+    k = min(config.clusters or _auto_cluster_count(len(matrix)), len(matrix))
+    rng = np.random.default_rng(0)
+    centroids = _kmeans_plus_plus(np, matrix, k, rng)
+
+    assignments = None
+    for _ in range(config.max_iterations):
+        similarities = matrix @ centroids.T
+        new_assignments = similarities.argmax(axis=1)
+        if assignments is not None and np.array_equal(new_assignments, assignments):
+            break
+        assignments = new_assignments
+        membership = np.eye(len(centroids), dtype=matrix.dtype)[assignments]
+        sums = membership.T @ matrix
+        lengths = np.linalg.norm(sums, axis=1)
+        # Keep the old centroid for a cluster that lost all its members.
+        alive = lengths > 0
+        centroids[alive] = sums[alive] / lengths[alive, None]
+
+    similarities = matrix @ centroids.T
+    assignments = similarities.argmax(axis=1)
+    terms = np.array(sorted(vocabulary, key=vocabulary.get))
+    presence = (counts[informative] > 0).astype(np.float32)
+
+    clusters: list[FeedbackCluster] = []
+    for cluster in range(len(centroids)):
+        in_cluster = assignments == cluster
+        members = np.flatnonzero(in_cluster)
+        if len(members) == 0:
+            continue
+
+        top_terms = _distinctive_terms(np, terms, presence, in_cluster, centroids[cluster])
+        closest = members[np.argsort(-similarities[members, cluster], kind="stable")]
+        representatives: list[int] = []
+        seen: set[str] = set()
+        for row in closest:
+            index = int(informative[row])
+            text = " ".join(items[index].split()).lower()
+            if text in seen:
+                continue
+            seen.add(text)
+            representatives.append(index)
+            if len(representatives) == config.representatives:
+                break
+
+        clusters.append(
+            FeedbackCluster(
+                label=" / ".join(term.title() for term in top_terms),
+                size=int(len(members)),
+                top_terms=top_terms,
+                representative_indexes=tuple(representatives),
+            )
+        )
+
+    clusters.sort(key=lambda cluster: -cluster.size)
+    return LocalClustering(clusters=tuple(clusters), unclustered=len(items) - len(informative))
+
+
+def _distinctive_terms(np: Any, terms: Any, presence: Any, in_cluster: Any, centroid: Any) -> tuple[str, ...]:
+    """Up to three terms that are more common in the cluster's snippets than in the others.
+
+    Terms are ranked by how much more often member snippets contain them than
+    other snippets do, weighted by how many members contain them, then by
+    centroid weight. A label names what the cluster's snippets share and the
+    rest do not, rather than what every snippet says.
+    """
+    inside = presence[in_cluster].mean(axis=0)
+    outside = presence[~in_cluster].mean(axis=0) if (~in_cluster).any() else np.zeros_like(inside)
+    lift = inside * (inside - outside)
+    order = np.lexsort((-centroid, -lift))
+    chosen = [column for column in order[:3] if lift[column] > 0]
+    if not chosen:
+        chosen = list(np.argsort(-centroid, kind="stable")[:3])
+    return tuple(str(terms[column]) for column in chosen)
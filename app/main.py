@@ -2,19 +2,85 @@
 
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
+import math
 import os
-from typing import Literal
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Mapping
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Literal, TypeVar
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 
+from app.admission import (
+    AdmissionError,
+    ConcurrencyLimiter,
+    DeadlineExceededError,
+    DeadlineMiddleware,
+    OverloadedError,
+    RateLimitedError,
+    TenantRateLimiter,
+    remaining_seconds,
+    without_deadline,
+)
+from app.cache import AnalysisCache, build_cache_key
+from app.compression import CompressionMiddleware
+from app.dedup import CollapsedFeedback, DedupConfig, FeedbackGroup, collapse_feedback, no_collapse
+from app import json_codec
+from app.jobs import JobFailedError, JobQueue, JobQueueFullError, JobRecord
+from app.local_analysis import LocalAnalysisConfig, LocalAnalysisError, LocalClustering, cluster_feedback
+from app.map_reduce import (
+    REDUCE_SYSTEM_PROMPT,
+    MapReduceConfig,
+    build_reduce_prompt,
+    chunk_feedback,
+    feedback_tokens,
+    merge_analyses,
+)
+from app.metrics import (
+    ANALYSIS_ERRORS,
+    ANALYSIS_OUTCOMES,
+    JSON_REPAIRS,
+    PROMPT_CHARS,
+    REGISTRY,
+    STAGE_SECONDS,
+    MetricsMiddleware,
+    prompt_size_label,
+)
+from app.model_router import ModelRouter
+from app.ndjson import AnalysisUnit, NDJSONLineTooLongError, iter_analysis_units, iter_lines
 from app.openrouter_client import (
-    OpenRouterClient,
+    AsyncOpenRouterClient,
+    OpenRouterCircuitOpenError,
     OpenRouterConfigError,
+    OpenRouterDeadlineError,
     OpenRouterRequestError,
     OpenRouterTimeoutError,
 )
-from app.openrouter_parser import OpenRouterParseError, extract_structured_analysis
+from app.openrouter_parser import (
+    JSON_FIXUP_SYSTEM_PROMPT,
+    IncrementalAnalysisParser,
+    JSONFixupConfig,
+    MalformedJSONError,
+    OpenRouterParseError,
+    extract_assistant_text,
+    extract_structured_analysis,
+    recover_structured_analysis,
+)
+from app.profiling import RequestProfiler
+from app.resilience import first_success
+from app.sessions import SessionRecord, SessionStore, chain_digest
+from app.singleflight import HostLock, SingleFlight
+from app.taxonomy import TaxonomyStore
+from app.theme_matcher import ThemeMatcher
+from app.token_budget import InputBudget, InputTooLargeError, estimate_chat_tokens, estimate_tokens
+
+T = TypeVar("T")
 
 
 class AnalyzeRequest(BaseModel):
@@ -22,13 +88,56 @@ class AnalyzeRequest(BaseModel):
     context: str | None = Field(default=None, description="Optional product/background context")
 
 
+class ThemeHit(BaseModel):
+    theme: str
+    hits: int = Field(..., description="Keyword occurrences attributed to the theme")
+    item_indexes: list[int] = Field(..., description="Indexes of feedback items that matched the theme")
+
+
+class ThemeCluster(BaseModel):
+    label: str
+    size: int = Field(..., description="Feedback items assigned to the cluster")
+    representative_snippets: list[str] = Field(..., description="Items closest to the cluster centroid")
+
+
+class FeedbackDedup(BaseModel):
+    input_items: int = Field(..., description="Feedback items in the request")
+    distinct_items: int = Field(..., description="Distinct snippets sent to the model after collapsing duplicates")
+    near_duplicates: int = Field(..., description="Items merged by similarity rather than exact match")
+    input_chars: int = Field(..., description="Characters of feedback in the request")
+    distinct_chars: int = Field(..., description="Characters of feedback sent to the model")
+
+
+class TokenUsage(BaseModel):
+    estimated_prompt_tokens: int = Field(..., description="Local estimate checked against INSIGHT2SPEC_MAX_INPUT_TOKENS")
+    prompt_tokens: int | None = Field(default=None, description="Prompt tokens reported by the provider")
+    completion_tokens: int | None = Field(default=None, description="Completion tokens reported by the provider")
+    cached_prompt_tokens: int | None = Field(
+        default=None, description="Prompt tokens the provider served from its prompt cache"
+    )
+    trimmed_items: int = Field(default=0, description="Feedback items dropped to fit the input budget")
+
+
+class AnalysisMetadata(BaseModel):
+    chunks_processed: int = Field(default=1, description="Feedback chunks analyzed (more than 1 in map-reduce mode)")
+    theme_hits: list[ThemeHit] = Field(default_factory=list, description="Per-theme keyword attribution (mock mode)")
+    clusters: list[ThemeCluster] = Field(default_factory=list, description="Discovered feedback clusters (local mode)")
+    dedup: FeedbackDedup | None = Field(
+        default=None, description="How duplicate collapsing shrank the prompt (OpenRouter mode)"
+    )
+    usage: TokenUsage | None = Field(default=None, description="Estimated and reported token usage (OpenRouter mode)")
+
+
 class AnalyzeResponse(BaseModel):
-    mode: Literal["mock", "openrouter"]
+    mode: Literal["mock", "openrouter", "local", "mock_fallback"] = Field(
+        ..., description="'mock_fallback' means OpenRouter's circuit breaker was open and mock output was served"
+    )
     summary: str
     themes: list[str]
     opportunities: list[str]
     prd_outline: list[str]
     experiments: list[str]
+    metadata: AnalysisMetadata = Field(default_factory=AnalysisMetadata)
 
 
 class ErrorDetail(BaseModel):
@@ -40,7 +149,87 @@ class ErrorResponse(BaseModel):
     detail: ErrorDetail
 
 
+class BatchAnalyzeRequest(BaseModel):
+    items: list[AnalyzeRequest] = Field(..., min_length=1, description="Independent analysis requests")
+
+
+class BatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    result: AnalyzeResponse | None = None
+    error: ErrorDetail | None = None
+
+
+class BatchAnalyzeResponse(BaseModel):
+    results: list[BatchItemResult]
+
+
+class NDJSONItemResult(BatchItemResult):
+    first_line: int = Field(..., description="First input line (1-based) that fed this result")
+    last_line: int = Field(..., description="Last input line that fed this result")
+
+
+class AnalyzeJobRequest(AnalyzeRequest):
+    priority: Literal["interactive", "bulk"] = Field(
+        default="interactive", description="Queue lane; bulk jobs yield to interactive ones"
+    )
+
+
+class AnalysisJob(BaseModel):
+    id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    priority: Literal["interactive", "bulk"]
+    created_at: float = Field(..., description="Unix timestamp")
+    updated_at: float = Field(..., description="Unix timestamp")
+    result: AnalyzeResponse | None = None
+    error: ErrorDetail | None = None
+
+
+class CreateSessionRequest(BaseModel):
+    context: str | None = Field(default=None, description="Optional product/background context")
+    feedback: list[str] = Field(default_factory=list, description="Initial feedback snippets")
+
+
+class SessionFeedbackRequest(BaseModel):
+    feedback: list[str] = Field(..., min_length=1, description="Feedback snippets to add to the session")
+
+
+class AnalysisSession(BaseModel):
+    id: str
+    context: str | None
+    items: int = Field(..., description="Feedback items in the session")
+    analyzed_items: int = Field(..., description="Items covered by the stored analysis")
+    pending_items: int = Field(..., description="Items added since the stored analysis was made")
+    digest: str = Field(..., description="SHA-256 chain over the analyzed items, in the order they were added")
+    created_at: float = Field(..., description="Unix timestamp")
+    updated_at: float = Field(..., description="Unix timestamp")
+
+
+class SessionAnalysis(BaseModel):
+    session_id: str
+    refresh: Literal["none", "full", "delta"] = Field(
+        ...,
+        description="'none' served the stored analysis, 'full' analyzed every item, "
+        "'delta' sent only the new items with the stored analysis",
+    )
+    delta_items: int = Field(..., description="Items analyzed by this refresh")
+    analyzed_items: int = Field(..., description="Items covered by the returned analysis")
+    digest: str = Field(..., description="SHA-256 chain over the analyzed items")
+    analysis: AnalyzeResponse
+
+
+_NOT_MODIFIED_RESPONSE = {
+    "description": "If-None-Match named the current ETag; the client's copy is up to date.",
+}
+
 _ANALYZE_ERROR_RESPONSES = {
+    413: {
+        "model": ErrorResponse,
+        "description": "The prompt is over the INSIGHT2SPEC_MAX_INPUT_TOKENS budget (reject policy).",
+    },
+    429: {
+        "model": ErrorResponse,
+        "description": "The tenant's rate limit (INSIGHT2SPEC_RATE_LIMIT_PER_SECOND) is exhausted.",
+    },
     500: {
         "model": ErrorResponse,
         "description": "OpenRouter is misconfigured (for example missing API key).",
@@ -49,12 +238,91 @@ _ANALYZE_ERROR_RESPONSES = {
         "model": ErrorResponse,
         "description": "OpenRouter request or output parsing failed.",
     },
+    503: {
+        "model": ErrorResponse,
+        "description": "Load was shed (upstream concurrency limit), or the OpenRouter circuit breaker is open "
+        "(only where no mock fallback applies).",
+    },
     504: {
         "model": ErrorResponse,
         "description": "OpenRouter timed out before returning a completion.",
     },
 }
 
+_JOB_SUBMIT_ERROR_RESPONSES = {
+    429: _ANALYZE_ERROR_RESPONSES[429],
+    503: {
+        "model": ErrorResponse,
+        "description": "The job's priority lane is full (INSIGHT2SPEC_JOBS_MAX_QUEUED).",
+    },
+}
+
+_JOB_STATUS_ERROR_RESPONSES = {
+    404: {
+        "model": ErrorResponse,
+        "description": "No job with this id (unknown, or finished and pruned).",
+    },
+}
+
+_SESSION_NOT_FOUND_RESPONSE = {
+    "model": ErrorResponse,
+    "description": "No session with this id (unknown, or expired after INSIGHT2SPEC_SESSIONS_TTL_SECONDS).",
+}
+
+_SESSION_FEEDBACK_ERROR_RESPONSES = {
+    404: _SESSION_NOT_FOUND_RESPONSE,
+    429: _ANALYZE_ERROR_RESPONSES[429],
+}
+
+_SESSION_ANALYSIS_ERROR_RESPONSES = {
+    304: _NOT_MODIFIED_RESPONSE,
+    **_ANALYZE_ERROR_RESPONSES,
+    404: _SESSION_NOT_FOUND_RESPONSE,
+    409: {
+        "model": ErrorResponse,
+        "description": "The session has no feedback to analyze yet.",
+    },
+}
+
+_BATCH_ERROR_RESPONSES = {
+    413: {
+        "model": ErrorResponse,
+        "description": "Batch has more items than INSIGHT2SPEC_BATCH_MAX_ITEMS allows.",
+    },
+    429: _ANALYZE_ERROR_RESPONSES[429],
+}
+
+
+# Bump whenever the prompt wording or output contract changes so cached results
+# produced by an older prompt are not served.
+PROMPT_TEMPLATE_VERSION = "v3"
+
+CACHE_HEADER = "X-Insight2Spec-Cache"
+
+# Instructions and output schema. Static, so every call starts with the same bytes
+# and provider prompt caches can reuse the prefix; per-request data goes in the user message.
+_OPENROUTER_SYSTEM_PROMPT = (
+    "You are a product analyst. Be concise, concrete, and return strict JSON only. "
+    "Analyze the feedback and return ONLY valid JSON with this shape: "
+    '{"summary": string, "themes": string[], "opportunities": string[], "experiments": string[], "prd_outline": string[]}. '
+    "Keep each list concise (2-5 items). "
+    'A feedback line ending in "(xN)" stands for N users reporting the same point.'
+)
+
+# Session refreshes send the stored analysis plus only the feedback added since it was made.
+_SESSION_UPDATE_SYSTEM_PROMPT = (
+    "You are a product analyst. Be concise, concrete, and return strict JSON only. "
+    "You are given the current analysis of a feedback set and new feedback added since. "
+    "Update the analysis so it covers both and return ONLY valid JSON with the same shape: "
+    '{"summary": string, "themes": string[], "opportunities": string[], "experiments": string[], "prd_outline": string[]}. '
+    "Keep points the new feedback does not change, add or re-rank points it supports, "
+    "and keep each list concise (2-5 items). "
+    'A feedback line ending in "(xN)" stands for N users reporting the same point.'
+)
+
+# Order in which fields of a finished AnalyzeResponse are replayed as stream events.
+_STREAM_FIELDS = ("summary", "themes", "opportunities", "prd_outline", "experiments")
+
 
 _THEME_KEYWORDS: dict[str, tuple[str, ...]] = {
     "Onboarding Friction": ("onboard", "setup", "signup", "start"),
@@ -63,17 +331,19 @@ _THEME_KEYWORDS: dict[str, tuple[str, ...]] = {
     "Missing Integrations": ("integrat", "slack", "zapier", "api", "export"),
 }
 
+# Built-in taxonomy, used when INSIGHT2SPEC_TAXONOMY_PATH is not set.
+_THEME_MATCHER = ThemeMatcher(_THEME_KEYWORDS)
 
-def _build_mock_analysis(feedback_items: list[str], *, mode: Literal["mock", "openrouter"] = "mock") -> AnalyzeResponse:
-    feedback_blob = " ".join(feedback_items).lower()
 
-    matched_themes = [
-        theme
-        for theme, keywords in _THEME_KEYWORDS.items()
-        if any(keyword in feedback_blob for keyword in keywords)
-    ]
+def _build_mock_analysis(
+    feedback_items: list[str],
+    *,
+    mode: Literal["mock", "openrouter", "mock_fallback"] = "mock",
+    matcher: ThemeMatcher | None = None,
+) -> AnalyzeResponse:
+    theme_matches = (matcher or _THEME_MATCHER).match(feedback_items)
 
-    themes = matched_themes or ["General UX Feedback"]
+    themes = [match.theme for match in theme_matches] or ["General UX Feedback"]
     opportunities = [f"Improve {theme.lower()} with clearer product guidance" for theme in themes[:3]]
 
     prd_outline = [
@@ -100,93 +370,1314 @@ def _build_mock_analysis(feedback_items: list[str], *, mode: Literal["mock", "op
         opportunities=opportunities,
         prd_outline=prd_outline,
         experiments=experiments,
+        metadata=AnalysisMetadata(
+            theme_hits=[
+                ThemeHit(theme=match.theme, hits=match.hits, item_indexes=list(match.item_indexes))
+                for match in theme_matches
+            ]
+        ),
     )
 
 
-def _build_openrouter_prompt(payload: AnalyzeRequest) -> str:
-    context = f"\nContext: {payload.context}" if payload.context else ""
-    feedback_lines = "\n".join(f"- {item}" for item in payload.feedback)
-    return (
-        "Analyze the feedback and return ONLY valid JSON with this shape: "
-        '{"summary": string, "themes": string[], "opportunities": string[], "experiments": string[], "prd_outline": string[]}. '
-        "Keep each list concise (2-5 items)."
-        f"{context}\nFeedback:\n{feedback_lines}"
+def _build_local_analysis(feedback_items: list[str], clustering: LocalClustering) -> AnalyzeResponse:
+    clusters = list(clustering.clusters)
+    themes = [cluster.label for cluster in clusters] or ["General UX Feedback"]
+    opportunities = [
+        f"Address '{cluster.label}' raised in {cluster.size} feedback item(s)" for cluster in clusters[:3]
+    ] or ["Collect more specific feedback to surface recurring themes"]
+
+    prd_outline = [
+        "Problem statement and target persona",
+        "Current user journey pain points",
+        "Proposed feature changes",
+        "Success metrics and rollout plan",
+    ]
+
+    experiments = [
+        f"Validate the '{themes[0]}' cluster with targeted user interviews",
+        "Track support-ticket volume before/after release",
+    ]
+
+    summary = (
+        f"Clustered {len(feedback_items)} feedback item(s) locally into {len(clusters)} theme(s)"
+        + (f": {', '.join(f'{cluster.label} ({cluster.size})' for cluster in clusters)}." if clusters else ".")
     )
+    if clustering.unclustered:
+        summary += f" {clustering.unclustered} item(s) had no distinctive terms."
 
+    return AnalyzeResponse(
+        mode="local",
+        summary=summary,
+        themes=themes,
+        opportunities=opportunities,
+        prd_outline=prd_outline,
+        experiments=experiments,
+        metadata=AnalysisMetadata(
+            clusters=[
+                ThemeCluster(
+                    label=cluster.label,
+                    size=cluster.size,
+                    representative_snippets=[feedback_items[index] for index in cluster.representative_indexes],
+                )
+                for cluster in clusters
+            ]
+        ),
+    )
 
-def _raise_openrouter_http_error(error: Exception) -> None:
+
+def _collapse_feedback(items: list[str]) -> CollapsedFeedback:
+    config = DedupConfig.from_env()
+    if not config.enabled:
+        return no_collapse(items)
+    return collapse_feedback(items, max_distance=config.max_distance)
+
+
+def _collapsed_tokens(collapsed: CollapsedFeedback) -> int:
+    return feedback_tokens([group.text for group in collapsed.groups])
+
+
+def _dedup_metadata(collapsed: CollapsedFeedback) -> FeedbackDedup:
+    return FeedbackDedup(
+        input_items=collapsed.input_items,
+        distinct_items=collapsed.distinct_items,
+        near_duplicates=collapsed.near_duplicates,
+        input_chars=collapsed.input_chars,
+        distinct_chars=collapsed.distinct_chars,
+    )
+
+
+def _feedback_line(group: FeedbackGroup) -> str:
+    return f"- {group.text} (x{group.count})" if group.count > 1 else f"- {group.text}"
+
+
+def _prompt_head(context: str | None) -> str:
+    return f"Context: {context}\nFeedback:\n" if context else "Feedback:\n"
+
+
+def _session_update_head(context: str | None, previous: AnalyzeResponse) -> str:
+    current = json_codec.dumps({field: getattr(previous, field) for field in _STREAM_FIELDS})
+    context_line = f"Context: {context}\n" if context else ""
+    return f"{context_line}Current analysis:\n{current}\nNew feedback:\n"
+
+
+def _build_openrouter_prompt(head: str, collapsed: CollapsedFeedback) -> str:
+    """The per-request user message; instructions live in the static system prompt."""
+    return head + "\n".join(_feedback_line(group) for group in collapsed.groups)
+
+
+def _prepare_openrouter_prompt(
+    head: str,
+    collapsed: CollapsedFeedback,
+    *,
+    system_prompt: str = _OPENROUTER_SYSTEM_PROMPT,
+) -> tuple[str, CollapsedFeedback, int]:
+    """Fit the feedback to the input budget, then build the user prompt.
+
+    Returns the prompt, the feedback it lists and how many items were trimmed
+    to fit. Raises ``InputTooLargeError`` under the ``reject`` policy.
+    """
+    budget = InputBudget.from_env()
+    if budget.enabled:
+        collapsed, trimmed = budget.fit(
+            collapsed,
+            fixed_tokens=estimate_chat_tokens(system_prompt, head),
+            line_tokens=[estimate_tokens(_feedback_line(group)) + 1 for group in collapsed.groups],
+        )
+    else:
+        trimmed = 0
+    return _build_openrouter_prompt(head, collapsed), collapsed, trimmed
+
+
+def _reported_count(value: Any) -> int | None:
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def _token_usage(estimated: int, reported: Mapping[str, Any] | None, *, trimmed_items: int = 0) -> TokenUsage:
+    """Combine the local estimate with the provider's ``usage`` block, when it sent one."""
+    reported = reported if isinstance(reported, Mapping) else {}
+    details = reported.get("prompt_tokens_details")
+    return TokenUsage(
+        estimated_prompt_tokens=estimated,
+        prompt_tokens=_reported_count(reported.get("prompt_tokens")),
+        completion_tokens=_reported_count(reported.get("completion_tokens")),
+        cached_prompt_tokens=_reported_count(details.get("cached_tokens")) if isinstance(details, Mapping) else None,
+        trimmed_items=trimmed_items,
+    )
+
+
+def _sum_usage(usages: list[TokenUsage]) -> TokenUsage:
+    def total(name: str) -> int | None:
+        values = [getattr(usage, name) for usage in usages if getattr(usage, name) is not None]
+        return sum(values) if values else None
+
+    return TokenUsage(
+        estimated_prompt_tokens=sum(usage.estimated_prompt_tokens for usage in usages),
+        prompt_tokens=total("prompt_tokens"),
+        completion_tokens=total("completion_tokens"),
+        cached_prompt_tokens=total("cached_prompt_tokens"),
+        trimmed_items=sum(usage.trimmed_items for usage in usages),
+    )
+
+
+_ANALYSIS_ERRORS = (
+    OpenRouterConfigError,
+    OpenRouterTimeoutError,
+    OpenRouterRequestError,
+    OpenRouterParseError,
+    LocalAnalysisError,
+    AdmissionError,
+    InputTooLargeError,
+)
+
+
+def _analysis_error_detail(error: Exception, *, surface: str) -> tuple[int, ErrorDetail] | None:
+    """Map an analysis failure to its HTTP status and stable error payload.
+
+    Mapped failures are counted in ``ANALYSIS_ERRORS`` under ``surface``
+    (the endpoint or runner reporting them).
+    """
+    resolved = _map_analysis_error(error)
+    if resolved is not None:
+        status_code, detail = resolved
+        ANALYSIS_ERRORS.inc(code=detail.code, status_code=status_code, surface=surface)
+    return resolved
+
+
+def _map_analysis_error(error: Exception) -> tuple[int, ErrorDetail] | None:
     if isinstance(error, OpenRouterConfigError):
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "code": "openrouter_config_error",
-                "message": str(error),
-            },
-        ) from error
+        return 500, ErrorDetail(code="openrouter_config_error", message=str(error))
+
+    if isinstance(error, InputTooLargeError):
+        return 413, ErrorDetail(code="input_too_large", message=str(error))
+
+    if isinstance(error, RateLimitedError):
+        return 429, ErrorDetail(code="rate_limited", message=str(error))
+
+    if isinstance(error, OverloadedError):
+        return 503, ErrorDetail(code="server_overloaded", message=str(error))
+
+    if isinstance(error, (DeadlineExceededError, OpenRouterDeadlineError)):
+        return 504, ErrorDetail(code="deadline_exceeded", message=str(error))
 
     if isinstance(error, OpenRouterTimeoutError):
-        raise HTTPException(
-            status_code=504,
-            detail={
-                "code": "openrouter_timeout",
-                "message": str(error),
-            },
-        ) from error
+        return 504, ErrorDetail(code="openrouter_timeout", message=str(error))
+
+    if isinstance(error, OpenRouterCircuitOpenError):
+        return 503, ErrorDetail(code="openrouter_circuit_open", message=str(error))
 
     if isinstance(error, OpenRouterRequestError):
-        raise HTTPException(
-            status_code=502,
-            detail={
-                "code": "openrouter_request_error",
-                "message": str(error),
-            },
-        ) from error
+        return 502, ErrorDetail(code="openrouter_request_error", message=str(error))
 
     if isinstance(error, OpenRouterParseError):
-        raise HTTPException(
-            status_code=502,
-            detail={
-                "code": "openrouter_parse_error",
-                "message": str(error),
-            },
-        ) from error
+        return 502, ErrorDetail(code="openrouter_parse_error", message=str(error))
+
+    if isinstance(error, LocalAnalysisError):
+        return 500, ErrorDetail(code="local_analysis_unavailable", message=str(error))
+
+    return None
+
+
+def _raise_openrouter_http_error(error: Exception) -> None:
+    resolved = _analysis_error_detail(error, surface="http")
+    if resolved is None:
+        return
+
+    status_code, detail = resolved
+    headers = None
+    if isinstance(error, AdmissionError) and error.retry_after is not None:
+        headers = {"Retry-After": str(math.ceil(error.retry_after))}
+    raise HTTPException(status_code=status_code, detail=detail.model_dump(), headers=headers) from error
+
+
+def _analyze_mode() -> str:
+    return os.getenv("INSIGHT2SPEC_ANALYZE_MODE", "mock").lower()
 
 
-def _analyze_with_openrouter(payload: AnalyzeRequest) -> AnalyzeResponse:
-    client = OpenRouterClient.from_env()
-    completion = client.complete_json(
-        model=os.getenv("OPENROUTER_MODEL", "openai/gpt-4o-mini"),
-        system_prompt="You are a product analyst. Be concise, concrete, and return strict JSON only.",
-        user_prompt=_build_openrouter_prompt(payload),
+def _tenant_id(request: Request) -> str:
+    """The rate-limit key: the tenant header (an API key by default), else the client address."""
+    tenant = request.headers.get(os.getenv("INSIGHT2SPEC_TENANT_HEADER", "X-API-Key"))
+    if tenant:
+        return tenant
+    return request.client.host if request.client is not None else "anonymous"
+
+
+async def _enforce_rate_limit(request: Request) -> None:
+    """Endpoint dependency: spend one token from the caller's bucket or answer ``429 rate_limited``."""
+    limiter: TenantRateLimiter | None = request.app.state.rate_limiter
+    if limiter is None:
+        return
+    try:
+        limiter.check(_tenant_id(request))
+    except RateLimitedError as error:
+        _raise_openrouter_http_error(error)
+
+
+def _upstream_slot(limiter: ConcurrencyLimiter | None):
+    """Hold one of the global upstream slots, waiting at most until the request deadline."""
+    if limiter is None:
+        return nullcontext()
+    return limiter.slot(remaining_seconds())
+
+
+def _analysis_cache_key(payload: AnalyzeRequest, model: str, *, variant: str | None = None) -> str:
+    tags = [PROMPT_TEMPLATE_VERSION, DedupConfig.from_env().cache_tag, InputBudget.from_env().cache_tag]
+    prompt_version = "+".join(tag for tag in tags if tag)
+    return build_cache_key(
+        feedback=payload.feedback,
+        context=payload.context,
+        model=model,
+        prompt_version=f"{prompt_version}+{variant}" if variant else prompt_version,
     )
-    structured = extract_structured_analysis(completion)
 
-    return AnalyzeResponse(
+
+def _coalescing_enabled() -> bool:
+    return os.getenv("INSIGHT2SPEC_COALESCE_ENABLED", "true").lower() in {"1", "true", "yes"}
+
+
+def _get_openrouter_client(app: FastAPI) -> AsyncOpenRouterClient:
+    """Return the app-wide pooled client, building it on first use.
+
+    The lifespan normally builds it at startup; the lazy path covers apps that
+    run without a lifespan (for example ``TestClient`` used outside ``with``)
+    and startups where configuration was missing.
+    """
+    client = app.state.openrouter_client
+    if client is None:
+        client = AsyncOpenRouterClient.from_env()
+        app.state.openrouter_client = client
+    return client
+
+
+async def _complete_structured(
+    router: ModelRouter,
+    client: AsyncOpenRouterClient,
+    model: str,
+    user_prompt: str,
+    *,
+    system_prompt: str = _OPENROUTER_SYSTEM_PROMPT,
+    limiter: ConcurrencyLimiter | None = None,
+) -> tuple[dict[str, Any], Mapping[str, Any] | None]:
+    """Call one model and parse its output, feeding latency and failures to the router.
+
+    The call holds an upstream slot from ``limiter`` and gets whatever is left
+    of the request deadline as its timeout budget. Returns the structured
+    analysis and the provider's ``usage`` block, if any.
+    """
+    prompt_chars = len(system_prompt) + len(user_prompt)
+    prompt_size = prompt_size_label(prompt_chars)
+    PROMPT_CHARS.observe(prompt_chars)
+    waited = time.perf_counter()
+    async with _upstream_slot(limiter):
+        STAGE_SECONDS.observe(time.perf_counter() - waited, stage="admission", prompt_size=prompt_size)
+        started = time.perf_counter()
+        try:
+            with STAGE_SECONDS.time(stage="upstream", prompt_size=prompt_size):
+                completion = await client.complete_json(
+                    model=model,
+                    system_prompt=system_prompt,
+                    user_prompt=user_prompt,
+                    timeout_seconds=remaining_seconds(),
+                )
+            try:
+                with STAGE_SECONDS.time(stage="extract", prompt_size=prompt_size):
+                    structured = extract_structured_analysis(completion)
+            except MalformedJSONError as error:
+                # Local repair already failed; a short fix-up call is still cheaper than a re-analysis.
+                with STAGE_SECONDS.time(stage="json_fixup", prompt_size=prompt_size):
+                    structured = await _fix_up_json(client, model, extract_assistant_text(completion), error)
+        except (OpenRouterCircuitOpenError, OpenRouterDeadlineError):
+            # Nothing reached the model, or our own deadline cut the call short.
+            raise
+        except (OpenRouterRequestError, OpenRouterTimeoutError, OpenRouterParseError):
+            router.record_failure(model)
+            raise
+
+    router.record_success(model, time.perf_counter() - started)
+    usage = completion.get("usage") if isinstance(completion, Mapping) else None
+    return structured, usage
+
+
+async def _fix_up_json(
+    client: AsyncOpenRouterClient,
+    model: str,
+    text: str,
+    error: MalformedJSONError,
+) -> dict[str, Any]:
+    """Ask a model to fix malformed analysis JSON, when enabled; otherwise, or on failure, re-raise ``error``.
+
+    The call sends only the broken output, with a completion cap close to its
+    size. Outcomes are counted in ``JSON_REPAIRS`` (``fixup``, ``fixup_failed``).
+    """
+    config = JSONFixupConfig.from_env()
+    if not config.applies(text):
+        raise error
+    try:
+        completion = await client.complete_json(
+            model=config.model or model,
+            system_prompt=JSON_FIXUP_SYSTEM_PROMPT,
+            user_prompt=text,
+            temperature=0.0,
+            timeout_seconds=remaining_seconds(),
+            max_tokens=estimate_tokens(text) * 2 + 64,
+        )
+        structured = extract_structured_analysis(completion)
+    except OpenRouterDeadlineError:
+        JSON_REPAIRS.inc(outcome="fixup_failed")
+        raise
+    except (OpenRouterRequestError, OpenRouterTimeoutError, OpenRouterParseError):
+        JSON_REPAIRS.inc(outcome="fixup_failed")
+        raise error from None
+    JSON_REPAIRS.inc(outcome="fixup")
+    return structured
+
+
+async def _recover_malformed_json(
+    client: AsyncOpenRouterClient,
+    model: str,
+    text: str,
+    error: MalformedJSONError,
+) -> dict[str, Any]:
+    try:
+        return recover_structured_analysis(text, error)
+    except MalformedJSONError:
+        return await _fix_up_json(client, model, text, error)
+
+
+async def _complete_routed(
+    router: ModelRouter,
+    client: AsyncOpenRouterClient,
+    user_prompt: str,
+    *,
+    input_tokens: int,
+    system_prompt: str = _OPENROUTER_SYSTEM_PROMPT,
+    limiter: ConcurrencyLimiter | None = None,
+) -> tuple[dict[str, Any], Mapping[str, Any] | None]:
+    """Run the prompt on the routed model, or race two models and keep the first valid answer."""
+    models = router.choose(input_tokens)
+    complete = functools.partial(
+        _complete_structured, router, client, user_prompt=user_prompt, system_prompt=system_prompt, limiter=limiter
+    )
+    if len(models) == 1:
+        return await complete(models[0])
+
+    tasks = {asyncio.ensure_future(complete(model)): model for model in models}
+    winner, completed = await first_success(tasks)
+    router.record_race_win(tasks[winner])
+    return completed
+
+
+async def _analyze_with_openrouter(
+    app: FastAPI,
+    client: AsyncOpenRouterClient,
+    payload: AnalyzeRequest,
+    *,
+    collapsed: CollapsedFeedback | None = None,
+    previous: AnalyzeResponse | None = None,
+) -> AnalyzeResponse:
+    """Analyze ``payload`` in one upstream call.
+
+    With ``previous``, the model is asked to update that analysis with
+    ``payload.feedback`` instead of analyzing it from scratch.
+    """
+    started = time.perf_counter()
+    if collapsed is None:
+        collapsed = _collapse_feedback(payload.feedback)
+    if previous is None:
+        system_prompt, head = _OPENROUTER_SYSTEM_PROMPT, _prompt_head(payload.context)
+    else:
+        system_prompt, head = _SESSION_UPDATE_SYSTEM_PROMPT, _session_update_head(payload.context, previous)
+    prompt, collapsed, trimmed = _prepare_openrouter_prompt(head, collapsed, system_prompt=system_prompt)
+    prompt_size = prompt_size_label(len(system_prompt) + len(prompt))
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="prompt_build", prompt_size=prompt_size)
+
+    structured, usage = await _complete_routed(
+        app.state.model_router,
+        client,
+        prompt,
+        input_tokens=_collapsed_tokens(collapsed),
+        system_prompt=system_prompt,
+        limiter=app.state.upstream_limiter,
+    )
+    with STAGE_SECONDS.time(stage="validate", prompt_size=prompt_size):
+        result = _response_from_structured(structured)
+    result.metadata.dedup = _dedup_metadata(collapsed)
+    result.metadata.usage = _token_usage(estimate_chat_tokens(system_prompt, prompt), usage, trimmed_items=trimmed)
+    return result
+
+
+def _response_from_structured(structured: dict[str, Any]) -> AnalyzeResponse:
+    """Wrap an analysis ``openrouter_parser`` already validated, without validating it again."""
+    return AnalyzeResponse.model_construct(
         mode="openrouter",
         summary=structured["summary"],
         themes=structured["themes"],
         opportunities=structured["opportunities"],
         prd_outline=structured["prd_outline"],
         experiments=structured["experiments"],
+        metadata=AnalysisMetadata(),
+    )
+
+
+async def _run_analysis(
+    app: FastAPI,
+    payload: AnalyzeRequest,
+    *,
+    mode: str,
+    fallback: bool = True,
+) -> tuple[AnalyzeResponse, str]:
+    """Analyze one request and report how the cache was involved.
+
+    Returns the response plus ``"hit"``, ``"miss"``, ``"coalesced"`` (shared
+    another request's upstream call) or ``"bypass"``. Failures propagate so
+    each caller can surface them in its own shape. While OpenRouter's circuit
+    breaker is open, mock output (``mode="mock_fallback"``, never cached) is
+    returned instead unless ``fallback`` is false. With a request deadline,
+    ``DeadlineExceededError`` is raised once it passes.
+    """
+    result, outcome = await _within_deadline(
+        functools.partial(_analyze_request, app, payload, mode=mode, fallback=fallback)
+    )
+    ANALYSIS_OUTCOMES.inc(mode=result.mode, outcome=outcome)
+    return result, outcome
+
+
+async def _within_deadline(operation: Callable[[], Awaitable[T]]) -> T:
+    """Run ``operation``, raising ``DeadlineExceededError`` once the request deadline passes."""
+    remaining = remaining_seconds()
+    if remaining is None:
+        return await operation()
+    if remaining <= 0:
+        raise DeadlineExceededError("Request deadline passed before the analysis started")
+    try:
+        async with asyncio.timeout(remaining) as scope:
+            return await operation()
+    except TimeoutError:
+        if not scope.expired():
+            raise
+        raise DeadlineExceededError("Request deadline passed before the analysis finished") from None
+
+
+async def _analyze_request(
+    app: FastAPI,
+    payload: AnalyzeRequest,
+    *,
+    mode: str,
+    fallback: bool,
+) -> tuple[AnalyzeResponse, str]:
+    if mode == "local":
+        # CPU-bound; keep it off the event loop.
+        clustering = await asyncio.to_thread(cluster_feedback, payload.feedback, LocalAnalysisConfig.from_env())
+        return _build_local_analysis(payload.feedback, clustering), "bypass"
+
+    if mode != "openrouter":
+        return _build_mock_analysis(payload.feedback, matcher=app.state.taxonomy.matcher), "bypass"
+
+    map_reduce = MapReduceConfig.from_env()
+    # Chunking is decided on the collapsed size: duplicates cost no prompt tokens.
+    collapsed = (
+        _collapse_feedback(payload.feedback) if map_reduce.enabled and len(payload.feedback) > 1 else None
+    )
+    chunked = collapsed is not None and _collapsed_tokens(collapsed) > map_reduce.chunk_tokens
+
+    cache: AnalysisCache = app.state.analysis_cache
+    router: ModelRouter = app.state.model_router
+    cache_key = _analysis_cache_key(
+        payload, router.cache_identity, variant=map_reduce.cache_tag if chunked else None
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return _cached_response(cached), "hit"
+
+    async def compute() -> tuple[AnalyzeResponse, str]:
+        host_lock: HostLock = app.state.host_lock
+        # A chunked request takes no host lock itself; its chunks take theirs. Holding one stripe
+        # while waiting on the chunks' could deadlock with another worker doing the reverse.
+        lock = nullcontext(False) if chunked else host_lock.hold(cache_key)
+        async with lock as waited:
+            if waited:
+                # Another worker on this host held the key; it may have cached the result.
+                shared = cache.get(cache_key, record=False)
+                if shared is not None:
+                    app.state.coalescing_stats["cross_process"] += 1
+                    return _cached_response(shared), "coalesced"
+
+            client = _get_openrouter_client(app)
+            if chunked:
+                result = await _analyze_map_reduce(app, client, payload, config=map_reduce, collapsed=collapsed)
+            else:
+                result = await _analyze_with_openrouter(app, client, payload, collapsed=collapsed)
+            cache.set(cache_key, result.model_dump())
+            return result, "miss"
+
+    try:
+        if not _coalescing_enabled():
+            return await compute()
+
+        flight: SingleFlight = app.state.single_flight
+        (result, cache_status), joined = await flight.do(cache_key, without_deadline(compute))
+    except OpenRouterCircuitOpenError:
+        if not fallback:
+            raise
+        return _build_mock_fallback(app, payload), "bypass"
+    return result, "coalesced" if joined else cache_status
+
+
+def _cached_response(data: dict[str, Any]) -> AnalyzeResponse:
+    """Rebuild a stored response. It cost no upstream call, so it reports no token usage."""
+    result = AnalyzeResponse.model_validate(data)
+    result.metadata.usage = None
+    return result
+
+
+def _session_from_record(record: SessionRecord) -> AnalysisSession:
+    return AnalysisSession(
+        id=record.id,
+        context=record.context,
+        items=record.item_count,
+        analyzed_items=record.analyzed_count,
+        pending_items=record.pending_count,
+        digest=record.digest,
+        created_at=record.created_at,
+        updated_at=record.updated_at,
+    )
+
+
+def _session_not_found(session_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=404,
+        detail={"code": "session_not_found", "message": f"No analysis session with id {session_id}"},
     )
 
 
+async def _refresh_session(app: FastAPI, record: SessionRecord, *, mode: str) -> SessionAnalysis:
+    """Bring a session's analysis up to date with its feedback and store it.
+
+    The first refresh analyzes every item. After that, in OpenRouter mode only
+    the items added since the stored analysis go upstream, together with that
+    analysis; other modes are cheap and simply re-analyze everything. If
+    another worker stored a refresh meanwhile, this result is returned but
+    not stored.
+    """
+    store: SessionStore = app.state.sessions
+    if record.analysis is not None and record.pending_count == 0:
+        return SessionAnalysis(
+            session_id=record.id,
+            refresh="none",
+            delta_items=0,
+            analyzed_items=record.analyzed_count,
+            digest=record.digest,
+            analysis=_cached_response(record.analysis),
+        )
+
+    new_items = store.items(record.id, start=record.analyzed_count, stop=record.item_count)
+    if record.analysis is None or mode != "openrouter":
+        items = store.items(record.id, stop=record.item_count)
+        payload = AnalyzeRequest(feedback=items, context=record.context)
+        result, _ = await _run_analysis(app, payload, mode=mode, fallback=False)
+        refresh = "full"
+    else:
+        payload = AnalyzeRequest(feedback=new_items, context=record.context)
+        previous = AnalyzeResponse.model_validate(record.analysis)
+        client = _get_openrouter_client(app)
+        result = await _within_deadline(
+            functools.partial(_analyze_with_openrouter, app, client, payload, previous=previous)
+        )
+        ANALYSIS_OUTCOMES.inc(mode=result.mode, outcome="delta")
+        refresh = "delta"
+
+    digest = chain_digest(record.digest, new_items)
+    store.save_analysis(
+        record.id,
+        result.model_dump(),
+        analyzed_count=record.item_count,
+        digest=digest,
+        expected_digest=record.digest,
+    )
+    return SessionAnalysis(
+        session_id=record.id,
+        refresh=refresh,
+        delta_items=len(new_items) if refresh == "delta" else record.item_count,
+        analyzed_items=record.item_count,
+        digest=digest,
+        analysis=result,
+    )
+
+
+def _upstream_stats(client: AsyncOpenRouterClient | None) -> dict[str, Any]:
+    # The client is built lazily and may not exist yet.
+    breaker = getattr(client, "breaker", None)
+    return {
+        "retries": getattr(client, "retries", 0),
+        "hedges": getattr(client, "hedges", 0),
+        "breaker_state": breaker.state if breaker is not None else None,
+        "breaker_opened": breaker.opened_count if breaker is not None else 0,
+        "breaker_short_circuited": breaker.short_circuited if breaker is not None else 0,
+    }
+
+
+def _build_mock_fallback(app: FastAPI, payload: AnalyzeRequest) -> AnalyzeResponse:
+    return _build_mock_analysis(payload.feedback, mode="mock_fallback", matcher=app.state.taxonomy.matcher)
+
+
+async def _analyze_map_reduce(
+    app: FastAPI,
+    client: AsyncOpenRouterClient,
+    payload: AnalyzeRequest,
+    *,
+    config: MapReduceConfig,
+    collapsed: CollapsedFeedback,
+) -> AnalyzeResponse:
+    """Analyze token-budgeted chunks concurrently, then reduce them into one response.
+
+    Chunks go through ``_run_analysis`` so each one is cached on its own, which
+    keeps re-analysis of a growing corpus cheap. Chunks carry the raw items and
+    collapse duplicates within themselves; ``collapsed`` only feeds the metadata.
+    """
+    chunks = chunk_feedback(payload.feedback, max_tokens=config.chunk_tokens)
+    semaphore = asyncio.Semaphore(config.concurrency)
+
+    async def analyze_chunk(chunk: list[str]) -> AnalyzeResponse:
+        async with semaphore:
+            partial, _ = await _run_analysis(
+                app,
+                AnalyzeRequest(feedback=chunk, context=payload.context),
+                mode="openrouter",
+                # A partly mocked corpus would be merged and cached as a real result.
+                fallback=False,
+            )
+        return partial
+
+    tasks = [asyncio.create_task(analyze_chunk(chunk)) for chunk in chunks]
+    try:
+        partial_results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    partials = [partial.model_dump(include=set(_STREAM_FIELDS)) for partial in partial_results]
+    usages = [partial.metadata.usage for partial in partial_results if partial.metadata.usage is not None]
+    if config.strategy == "llm":
+        reduce_prompt = build_reduce_prompt(partials, payload.context)
+        estimated = estimate_chat_tokens(REDUCE_SYSTEM_PROMPT, reduce_prompt)
+        # Partial analyses cannot be trimmed, so the reduce call only checks the budget.
+        InputBudget.from_env().check(estimated)
+        merged, usage = await _complete_routed(
+            app.state.model_router,
+            client,
+            reduce_prompt,
+            input_tokens=estimate_tokens(reduce_prompt),
+            system_prompt=REDUCE_SYSTEM_PROMPT,
+            limiter=app.state.upstream_limiter,
+        )
+        usages.append(_token_usage(estimated, usage))
+    else:
+        merged = merge_analyses(partials)
+
+    result = _response_from_structured(merged)
+    result.metadata.chunks_processed = len(chunks)
+    result.metadata.dedup = _dedup_metadata(collapsed)
+    result.metadata.usage = _sum_usage(usages) if usages else None
+    return result
+
+
+async def _run_batch(
+    app: FastAPI,
+    items: list[AnalyzeRequest],
+    *,
+    mode: str,
+    concurrency: int,
+) -> list[BatchItemResult]:
+    """Analyze items concurrently, at most ``concurrency`` at a time, keeping input order."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(index: int, item: AnalyzeRequest) -> BatchItemResult:
+        async with semaphore:
+            try:
+                result, _ = await _run_analysis(app, item, mode=mode)
+            except _ANALYSIS_ERRORS as error:
+                _, detail = _analysis_error_detail(error, surface="batch")
+                return BatchItemResult(index=index, error=detail)
+        return BatchItemResult(index=index, result=result)
+
+    return list(await asyncio.gather(*(run_one(index, item) for index, item in enumerate(items))))
+
+
+async def _run_job(app: FastAPI, request: dict[str, Any]) -> dict[str, Any]:
+    """Job runner for ``app.state.jobs``: the ``/analyze`` path with failures mapped to job errors."""
+    try:
+        result, _ = await _run_analysis(app, AnalyzeRequest.model_validate(request), mode=_analyze_mode())
+    except _ANALYSIS_ERRORS as error:
+        _, detail = _analysis_error_detail(error, surface="job")
+        raise JobFailedError(detail.code, detail.message) from error
+    return result.model_dump()
+
+
+def _job_from_record(job: JobRecord) -> AnalysisJob:
+    return AnalysisJob(
+        id=job.id,
+        status=job.status,
+        priority=job.priority,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        result=job.result,
+        error=job.error,
+    )
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """Streaming response whose body generator may keep reading the request body.
+
+    ``StreamingResponse`` listens for client disconnects by reading from
+    ``receive``, which would swallow request-body messages the generator still
+    needs. This variant only sends; the generator checks for disconnects itself.
+    """
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _analyze_ndjson_unit(app: FastAPI, index: int, unit: AnalysisUnit, *, mode: str) -> NDJSONItemResult:
+    lines = {"index": index, "first_line": unit.first_line, "last_line": unit.last_line}
+    if unit.error is not None:
+        return NDJSONItemResult(**lines, error=ErrorDetail(code="invalid_ndjson_record", message=unit.error))
+
+    try:
+        payload = AnalyzeRequest.model_validate(unit.request)
+    except ValidationError as error:
+        message = f"Line {unit.first_line} is not a valid AnalyzeRequest: {error.errors()[0]['msg']}"
+        return NDJSONItemResult(**lines, error=ErrorDetail(code="invalid_ndjson_record", message=message))
+
+    try:
+        result, _ = await _run_analysis(app, payload, mode=mode)
+    except _ANALYSIS_ERRORS as error:
+        _, detail = _analysis_error_detail(error, surface="ndjson")
+        return NDJSONItemResult(**lines, error=detail)
+    return NDJSONItemResult(**lines, result=result)
+
+
+def _ndjson_line(item: BaseModel) -> bytes:
+    return item.model_dump_json().encode("utf-8") + b"\n"
+
+
+async def _stream_ndjson_results(
+    request: Request,
+    *,
+    mode: str,
+    group_size: int,
+    context: str | None,
+    concurrency: int,
+    max_line_bytes: int,
+) -> AsyncIterator[bytes]:
+    """Analyze NDJSON units as the body arrives and emit one result line per unit, in input order.
+
+    At most ``concurrency`` units are in flight. While the window is full the
+    request body is not read, which pushes back on the client over TCP. Output
+    is produced only as fast as the client consumes it, so memory stays bounded
+    by the window and the line limit.
+    """
+    app = request.app
+    window: deque[asyncio.Task[NDJSONItemResult]] = deque()
+    index = 0
+    try:
+        units = iter_analysis_units(
+            iter_lines(request.stream(), max_line_bytes=max_line_bytes),
+            group_size=group_size,
+            context=context,
+        )
+        try:
+            async for unit in units:
+                window.append(asyncio.create_task(_analyze_ndjson_unit(app, index, unit, mode=mode)))
+                index += 1
+                while len(window) >= concurrency or (window and window[0].done()):
+                    yield _ndjson_line(await window.popleft())
+        except NDJSONLineTooLongError as error:
+            while window:
+                yield _ndjson_line(await window.popleft())
+            detail = ErrorDetail(code="ndjson_line_too_long", message=str(error))
+            yield _ndjson_line(NDJSONItemResult(index=index, first_line=0, last_line=0, error=detail))
+            return
+
+        while window:
+            if await request.is_disconnected():
+                return
+            yield _ndjson_line(await window.popleft())
+    finally:
+        for task in window:
+            task.cancel()
+
+
+def _model_response(model: BaseModel, *, headers: dict[str, str] | None = None) -> Response:
+    """Render a model that was validated when it was built.
+
+    Returning a ``Response`` skips FastAPI's ``response_model`` pass, which
+    would dump, re-validate and re-serialize it; ``response_model`` still
+    documents the schema.
+    """
+    return Response(model.model_dump_json(), media_type="application/json", headers=headers)
+
+
+def _etag(value: str) -> str:
+    # Weak: a re-run on the same input can word the analysis differently but means the same thing.
+    return f'W/"{value}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of ``etag`` against the request's ``If-None-Match``."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def _not_modified(etag: str, headers: dict[str, str] | None = None) -> Response:
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag})
+
+
+def _conditional_response(
+    request: Request,
+    model: BaseModel,
+    *,
+    etag: str | None = None,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """``_model_response`` with an ``ETag``, or ``304`` when ``If-None-Match`` already names it.
+
+    Without ``etag`` the tag is a hash of the rendered body, which saves the
+    transfer but not the work behind it.
+    """
+    body = model.model_dump_json()
+    if etag is None:
+        etag = _etag(hashlib.sha256(body.encode("utf-8")).hexdigest()[:32])
+    if _etag_matches(request, etag):
+        return _not_modified(etag, headers)
+    return Response(body, media_type="application/json", headers={**(headers or {}), "ETag": etag})
+
+
+def _analysis_etag(payload: AnalyzeRequest, model: str) -> str:
+    """Content address of an OpenRouter analysis: the normalized input, model and prompt version."""
+    return _etag(_analysis_cache_key(payload, model))
+
+
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json_codec.dumps(data)}\n\n"
+
+
+def _replay_field_events(result: AnalyzeResponse) -> list[str]:
+    events: list[str] = []
+    for field_name in _STREAM_FIELDS:
+        value = getattr(result, field_name)
+        items = value if isinstance(value, list) else [value]
+        events.extend(_sse_event("field", {"field": field_name, "value": item}) for item in items)
+    return events
+
+
+async def _stream_analysis_events(
+    app: FastAPI,
+    payload: AnalyzeRequest,
+    *,
+    client: AsyncOpenRouterClient,
+    cache_key: str,
+    prompt: str,
+    collapsed: CollapsedFeedback,
+    trimmed: int,
+) -> AsyncIterator[str]:
+    """Forward fields as the upstream completion streams in, then the validated result.
+
+    Fields are validated as they complete, so invalid fields end the stream
+    with an error as soon as they are seen. Output that stops being valid JSON
+    stops the field events and is repaired (locally, then by the optional
+    fix-up call) once the completion ends. The HTTP status is already committed once streaming starts, so upstream
+    failures are sent as an ``error`` event carrying the ``/analyze`` status and code.
+    Streams use the single best routed model; they are never raced. ``prompt``
+    comes from ``_prepare_openrouter_prompt`` so budget errors surface before
+    the stream starts.
+    """
+    router: ModelRouter = app.state.model_router
+    model = router.choose(_collapsed_tokens(collapsed))[0]
+    parser = IncrementalAnalysisParser()
+    usage: dict[str, Any] = {}
+    deltas: list[str] = []
+    malformed: MalformedJSONError | None = None
+    started = time.perf_counter()
+    try:
+        async with _upstream_slot(app.state.upstream_limiter):
+            async for delta in client.stream_chat(
+                model=model,
+                system_prompt=_OPENROUTER_SYSTEM_PROMPT,
+                user_prompt=prompt,
+                timeout_seconds=remaining_seconds(),
+                usage=usage,
+            ):
+                deltas.append(delta)
+                if malformed is not None:
+                    continue
+                try:
+                    fields = parser.feed(delta)
+                except MalformedJSONError as error:
+                    malformed, fields = error, []
+                for field_name, value in fields:
+                    yield _sse_event("field", {"field": field_name, "value": value})
+
+            if malformed is None:
+                try:
+                    structured = parser.finish()
+                except MalformedJSONError as error:
+                    malformed = error
+            if malformed is not None:
+                structured = await _recover_malformed_json(client, model, "".join(deltas), malformed)
+
+        result = _response_from_structured(structured)
+        result.metadata.dedup = _dedup_metadata(collapsed)
+        result.metadata.usage = _token_usage(
+            estimate_chat_tokens(_OPENROUTER_SYSTEM_PROMPT, prompt), usage, trimmed_items=trimmed
+        )
+    except OpenRouterCircuitOpenError:
+        # Raised before any upstream byte, so nothing has been forwarded yet.
+        async for event in _replay_analysis_events(_build_mock_fallback(app, payload)):
+            yield event
+        return
+    except _ANALYSIS_ERRORS as error:
+        if not isinstance(error, (AdmissionError, OpenRouterDeadlineError)):
+            router.record_failure(model)
+        status_code, detail = _analysis_error_detail(error, surface="stream")
+        yield _sse_event("error", {"status": status_code, **detail.model_dump()})
+        return
+
+    router.record_success(model, time.perf_counter() - started)
+    app.state.analysis_cache.set(cache_key, result.model_dump())
+    yield _sse_event("result", result.model_dump())
+
+
+async def _replay_analysis_events(result: AnalyzeResponse) -> AsyncIterator[str]:
+    for event in _replay_field_events(result):
+        yield event
+    yield _sse_event("result", result.model_dump())
+
+
+async def _analyze_response(request: Request, payload: AnalyzeRequest) -> Response:
+    mode = _analyze_mode()
+    etag = None
+    if mode == "openrouter":
+        try:
+            etag = _analysis_etag(payload, request.app.state.model_router.cache_identity)
+        except OpenRouterConfigError as error:
+            _raise_openrouter_http_error(error)
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+
+    try:
+        result, cache_status = await _run_analysis(request.app, payload, mode=mode)
+    except _ANALYSIS_ERRORS as error:
+        _raise_openrouter_http_error(error)
+
+    if result.mode != "openrouter":
+        # Mock fallback output is not the analysis the ETag names.
+        etag = None
+    return _conditional_response(request, result, etag=etag, headers={CACHE_HEADER: cache_status})
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
+    if _analyze_mode() == "openrouter":
+        try:
+            app.state.openrouter_client = AsyncOpenRouterClient.from_env()
+        except OpenRouterConfigError:
+            # Surface the config error per request (500) instead of failing startup.
+            app.state.openrouter_client = None
+        else:
+            if os.getenv("OPENROUTER_PRECONNECT", "false").lower() in {"1", "true", "yes"}:
+                await app.state.openrouter_client.preconnect()
+
+    jobs: JobQueue = app.state.jobs
+    await jobs.start()
+
+    taxonomy: TaxonomyStore = app.state.taxonomy
+    watcher = None
+    if taxonomy.path is not None:
+        reload_seconds = float(os.getenv("INSIGHT2SPEC_TAXONOMY_RELOAD_SECONDS", "5"))
+        if reload_seconds > 0:
+            watcher = asyncio.create_task(taxonomy.watch(reload_seconds))
+
+    try:
+        yield
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        await jobs.stop()
+        client = app.state.openrouter_client
+        app.state.openrouter_client = None
+        if client is not None:
+            await client.aclose()
+        app.state.analysis_cache.close()
+        jobs.store.close()
+        app.state.sessions.close()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="Insight2Spec API", version="0.1.0")
+    app = FastAPI(title="Insight2Spec API", version="0.1.0", lifespan=_lifespan)
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(DeadlineMiddleware)
+    app.add_middleware(MetricsMiddleware, cache_header=CACHE_HEADER)
+    app.state.openrouter_client = None
+    app.state.analysis_cache = AnalysisCache.from_env()
+    app.state.taxonomy = TaxonomyStore.from_env(default=_THEME_KEYWORDS)
+    app.state.single_flight = SingleFlight()
+    app.state.host_lock = HostLock(
+        os.getenv("INSIGHT2SPEC_COALESCE_LOCK_DIR") or None,
+        timeout_seconds=float(os.getenv("INSIGHT2SPEC_COALESCE_LOCK_TIMEOUT_SECONDS", "30")),
+    )
+    app.state.coalescing_stats = {"cross_process": 0}
+    app.state.model_router = ModelRouter.from_env()
+    app.state.rate_limiter = TenantRateLimiter.from_env()
+    app.state.upstream_limiter = ConcurrencyLimiter.from_env()
+    app.state.jobs = JobQueue.from_env(functools.partial(_run_job, app))
+    app.state.sessions = SessionStore.from_env()
+    app.state.profiler = RequestProfiler.from_env()
 
     @app.get("/health")
     def health() -> dict[str, str]:
         return {"status": "ok", "service": "insight2spec"}
 
-    @app.post("/analyze", response_model=AnalyzeResponse, responses=_ANALYZE_ERROR_RESPONSES)
-    def analyze(payload: AnalyzeRequest) -> AnalyzeResponse:
-        if os.getenv("INSIGHT2SPEC_ANALYZE_MODE", "mock").lower() != "openrouter":
-            return _build_mock_analysis(payload.feedback)
+    @app.get("/metrics", response_class=Response)
+    def metrics() -> Response:
+        """Prometheus text exposition of this worker's pipeline metrics."""
+        return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    @app.get("/stats")
+    def stats(request: Request) -> dict[str, Any]:
+        """Counters for tuning the cache and request coalescing."""
+        state = request.app.state
+        return {
+            "cache": {"hits": state.analysis_cache.hits, "misses": state.analysis_cache.misses},
+            "coalescing": {
+                "upstream_calls": state.single_flight.leaders,
+                "coalesced": state.single_flight.coalesced,
+                "coalesced_cross_process": state.coalescing_stats["cross_process"],
+                "in_flight": len(state.single_flight),
+                "host_lock_waits": state.host_lock.waits,
+                "host_lock_timeouts": state.host_lock.timeouts,
+            },
+            "upstream": _upstream_stats(state.openrouter_client),
+            "models": state.model_router.snapshot(),
+            "jobs": {
+                "queued_interactive": state.jobs.depth("interactive"),
+                "queued_bulk": state.jobs.depth("bulk"),
+                "completed": state.jobs.completed,
+                "failed": state.jobs.failed,
+            },
+            "admission": {
+                "rate_limited": state.rate_limiter.limited if state.rate_limiter is not None else 0,
+                "upstream": state.upstream_limiter.snapshot() if state.upstream_limiter is not None else None,
+            },
+        }
+
+    rate_limited = [Depends(_enforce_rate_limit)]
+
+    @app.post(
+        "/analyze",
+        response_model=AnalyzeResponse,
+        responses={304: _NOT_MODIFIED_RESPONSE, **_ANALYZE_ERROR_RESPONSES},
+        dependencies=rate_limited,
+    )
+    async def analyze(payload: AnalyzeRequest, request: Request) -> Response:
+        """Analyze feedback. The response's ``ETag`` can be sent back as ``If-None-Match`` to get a ``304``.
+
+        In OpenRouter mode the ETag names the normalized input, model and
+        prompt version, so a matching ``If-None-Match`` is answered before any
+        cache lookup or upstream call. Selected requests are profiled; see
+        ``app.profiling``.
+        """
+        profiler: RequestProfiler = request.app.state.profiler
+        async with profiler.profile(request.headers, "analyze"):
+            return await _analyze_response(request, payload)
+
+    @app.post(
+        "/analyze/stream",
+        response_class=StreamingResponse,
+        responses=_ANALYZE_ERROR_RESPONSES,
+        dependencies=rate_limited,
+    )
+    async def analyze_stream(payload: AnalyzeRequest, request: Request) -> StreamingResponse:
+        """Stream the analysis as server-sent events.
+
+        Emits one ``field`` event per completed value (``summary``, then each list
+        item as it finishes), then a final ``result`` event with the validated
+        ``AnalyzeResponse``, or an ``error`` event if the upstream call fails.
+        """
+        headers = {"Cache-Control": "no-cache"}
+        mode = _analyze_mode()
+        if mode != "openrouter":
+            try:
+                result, headers[CACHE_HEADER] = await _run_analysis(request.app, payload, mode=mode)
+            except _ANALYSIS_ERRORS as error:
+                _raise_openrouter_http_error(error)
+            return StreamingResponse(_replay_analysis_events(result), media_type="text/event-stream", headers=headers)
+
+        cache: AnalysisCache = request.app.state.analysis_cache
+        try:
+            cache_key = _analysis_cache_key(payload, request.app.state.model_router.cache_identity)
+        except OpenRouterConfigError as error:
+            _raise_openrouter_http_error(error)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            headers[CACHE_HEADER] = "hit"
+            events = _replay_analysis_events(_cached_response(cached))
+            return StreamingResponse(events, media_type="text/event-stream", headers=headers)
+
+        try:
+            client = _get_openrouter_client(request.app)
+            prompt, collapsed, trimmed = _prepare_openrouter_prompt(
+                _prompt_head(payload.context), _collapse_feedback(payload.feedback)
+            )
+            # Shed before the 200 is committed; afterwards failures can only be error events.
+            limiter: ConcurrencyLimiter | None = request.app.state.upstream_limiter
+            if limiter is not None:
+                limiter.check(remaining_seconds())
+        except (OpenRouterConfigError, InputTooLargeError, OverloadedError) as error:
+            _raise_openrouter_http_error(error)
+
+        headers[CACHE_HEADER] = "miss"
+        events = _stream_analysis_events(
+            request.app,
+            payload,
+            client=client,
+            cache_key=cache_key,
+            prompt=prompt,
+            collapsed=collapsed,
+            trimmed=trimmed,
+        )
+        return StreamingResponse(events, media_type="text/event-stream", headers=headers)
+
+    @app.post(
+        "/analyze/jobs",
+        response_model=AnalysisJob,
+        status_code=202,
+        responses=_JOB_SUBMIT_ERROR_RESPONSES,
+        dependencies=rate_limited,
+    )
+    async def submit_analysis_job(payload: AnalyzeJobRequest, request: Request, response: Response) -> AnalysisJob:
+        """Queue an analysis and return at once; poll ``GET /analyze/jobs/{id}`` for the result."""
+        jobs: JobQueue = request.app.state.jobs
+        try:
+            job = jobs.submit(payload.model_dump(exclude={"priority"}), priority=payload.priority)
+        except JobQueueFullError as error:
+            raise HTTPException(status_code=503, detail={"code": "job_queue_full", "message": str(error)}) from error
+
+        response.headers["Location"] = f"/analyze/jobs/{job.id}"
+        return _job_from_record(job)
+
+    @app.get(
+        "/analyze/jobs/{job_id}",
+        response_model=AnalysisJob,
+        responses={304: _NOT_MODIFIED_RESPONSE, **_JOB_STATUS_ERROR_RESPONSES},
+    )
+    def get_analysis_job(job_id: str, request: Request) -> Response:
+        job = request.app.state.jobs.store.get(job_id)
+        if job is None:
+            raise HTTPException(
+                status_code=404,
+                detail={"code": "job_not_found", "message": f"No analysis job with id {job_id}"},
+            )
+        return _conditional_response(request, _job_from_record(job))
+
+    @app.post("/sessions", response_model=AnalysisSession, status_code=201, dependencies=rate_limited)
+    def create_session(payload: CreateSessionRequest, request: Request, response: Response) -> AnalysisSession:
+        """Start an incremental analysis session; add feedback over time and refresh its analysis."""
+        record = request.app.state.sessions.create(context=payload.context, items=payload.feedback)
+        response.headers["Location"] = f"/sessions/{record.id}"
+        return _session_from_record(record)
 
+    @app.post(
+        "/sessions/{session_id}/feedback",
+        response_model=AnalysisSession,
+        responses=_SESSION_FEEDBACK_ERROR_RESPONSES,
+        dependencies=rate_limited,
+    )
+    def add_session_feedback(session_id: str, payload: SessionFeedbackRequest, request: Request) -> AnalysisSession:
+        record = request.app.state.sessions.add_items(session_id, payload.feedback)
+        if record is None:
+            raise _session_not_found(session_id)
+        return _session_from_record(record)
+
+    @app.get(
+        "/sessions/{session_id}/analysis",
+        response_model=SessionAnalysis,
+        responses=_SESSION_ANALYSIS_ERROR_RESPONSES,
+        dependencies=rate_limited,
+    )
+    async def get_session_analysis(session_id: str, request: Request) -> Response:
+        """The session's analysis, refreshed first if feedback was added since it was made."""
+        record = request.app.state.sessions.get(session_id)
+        if record is None:
+            raise _session_not_found(session_id)
+        if record.item_count == 0:
+            raise HTTPException(
+                status_code=409,
+                detail={"code": "session_empty", "message": f"Session {session_id} has no feedback yet"},
+            )
+
+        if record.analysis is not None and record.pending_count == 0 and _etag_matches(request, _etag(record.digest)):
+            return _not_modified(_etag(record.digest))
+
+        # Concurrent refreshes of the same session state share one upstream call; each request
+        # waits on it only until its own deadline.
+        refresh = functools.partial(_refresh_session, request.app, record, mode=_analyze_mode())
+        flight: SingleFlight = request.app.state.single_flight
+        key = f"session:{record.id}:{record.item_count}:{record.digest}"
         try:
-            return _analyze_with_openrouter(payload)
-        except (OpenRouterConfigError, OpenRouterTimeoutError, OpenRouterRequestError, OpenRouterParseError) as error:
+            analysis, _ = await _within_deadline(functools.partial(flight.do, key, without_deadline(refresh)))
+        except _ANALYSIS_ERRORS as error:
             _raise_openrouter_http_error(error)
+        return _conditional_response(request, analysis, etag=_etag(analysis.digest))
+
+    @app.post("/analyze/ndjson", response_class=StreamingResponse, dependencies=rate_limited)
+    async def analyze_ndjson(
+        request: Request,
+        group_size: int = Query(default=0, ge=0, description="Snippets per analysis; 0 uses the configured default"),
+        context: str | None = Query(default=None, description="Context for grouped snippets"),
+    ) -> StreamingResponse:
+        """Analyze an NDJSON body incrementally and stream NDJSON results.
+
+        Each input line is an ``AnalyzeRequest`` object, or one feedback snippet (a
+        JSON string or ``{"text": ...}``); consecutive snippets are grouped into
+        one analysis. Each output line is a result in input order with the input
+        line range it covers; bad lines produce an ``invalid_ndjson_record`` error
+        line and the stream continues.
+        """
+        events = _stream_ndjson_results(
+            request,
+            mode=_analyze_mode(),
+            group_size=group_size or max(1, int(os.getenv("INSIGHT2SPEC_NDJSON_GROUP_SIZE", "50"))),
+            context=context,
+            concurrency=max(1, int(os.getenv("INSIGHT2SPEC_NDJSON_CONCURRENCY", "4"))),
+            max_line_bytes=int(os.getenv("INSIGHT2SPEC_NDJSON_MAX_LINE_BYTES", str(1024 * 1024))),
+        )
+        return _DuplexStreamingResponse(events, media_type="application/x-ndjson")
+
+    @app.post(
+        "/analyze/batch",
+        response_model=BatchAnalyzeResponse,
+        responses=_BATCH_ERROR_RESPONSES,
+        dependencies=rate_limited,
+    )
+    async def analyze_batch(payload: BatchAnalyzeRequest, request: Request) -> Response:
+        max_items = int(os.getenv("INSIGHT2SPEC_BATCH_MAX_ITEMS", "500"))
+        if len(payload.items) > max_items:
+            raise HTTPException(
+                status_code=413,
+                detail={
+                    "code": "batch_too_large",
+                    "message": f"Batch has {len(payload.items)} items; the limit is {max_items}",
+                },
+            )
+
+        concurrency = max(1, int(os.getenv("INSIGHT2SPEC_BATCH_CONCURRENCY", "8")))
+        results = await _run_batch(request.app, payload.items, mode=_analyze_mode(), concurrency=concurrency)
+        return _model_response(BatchAnalyzeResponse(results=results))
 
     return app
 
@@ -0,0 +1,129 @@
+"""Chunked map-reduce analysis for feedback corpora too large for one prompt."""
+
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from app.openrouter_client import OpenRouterConfigError
+from app.token_budget import estimate_tokens
+
+REDUCE_STRATEGIES = ("merge", "llm")
+
+# Lists in a merged analysis are capped like single-shot output ("2-5 items").
+_MERGED_LIST_LIMIT = 5
+_LIST_FIELDS = ("themes", "opportunities", "experiments", "prd_outline")
+# Chunk summaries quoted in a merged summary, so its length does not grow with the chunk count.
+_MERGED_SUMMARY_LIMIT = 3
+
+
+@dataclass(slots=True)
+class MapReduceConfig:
+    chunk_tokens: int = 0
+    concurrency: int = 4
+    strategy: str = "merge"
+
+    @classmethod
+    def from_env(cls) -> "MapReduceConfig":
+        strategy = os.getenv("INSIGHT2SPEC_MAP_REDUCE_STRATEGY", "merge").lower()
+        if strategy not in REDUCE_STRATEGIES:
+            raise OpenRouterConfigError(
+                f"INSIGHT2SPEC_MAP_REDUCE_STRATEGY must be one of {', '.join(REDUCE_STRATEGIES)}"
+            )
+
+        return cls(
+            chunk_tokens=int(os.getenv("INSIGHT2SPEC_CHUNK_TOKENS", "0")),
+            concurrency=max(1, int(os.getenv("INSIGHT2SPEC_MAP_REDUCE_CONCURRENCY", "4"))),
+            strategy=strategy,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.chunk_tokens > 0
+
+    @property
+    def cache_tag(self) -> str:
+        """Distinguishes chunked results from single-shot ones in cache keys."""
+        return f"mr:{self.chunk_tokens}:{self.strategy}"
+
+
+def feedback_tokens(items: Sequence[str]) -> int:
+    # Each item becomes a "- item\n" prompt line.
+    return sum(estimate_tokens(item) + 1 for item in items)
+
+
+def chunk_feedback(items: Sequence[str], *, max_tokens: int) -> list[list[str]]:
+    """Greedily pack items, in order, into chunks of at most ``max_tokens``.
+
+    An item larger than the budget on its own gets a chunk to itself rather
+    than being split mid-snippet.
+    """
+    chunks: list[list[str]] = []
+    current: list[str] = []
+    current_tokens = 0
+
+    for item in items:
+        item_tokens = estimate_tokens(item) + 1
+        if current and current_tokens + item_tokens > max_tokens:
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(item)
+        current_tokens += item_tokens
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _normalize(value: str) -> str:
+    return " ".join(value.split()).casefold()
+
+
+def _merge_list(partials: Sequence[dict[str, Any]], field_name: str) -> list[str]:
+    """Union a list field across partials, most frequently repeated first."""
+    counts: dict[str, int] = {}
+    first_seen: dict[str, str] = {}
+    for partial in partials:
+        for value in partial[field_name]:
+            key = _normalize(value)
+            counts[key] = counts.get(key, 0) + 1
+            first_seen.setdefault(key, value)
+
+    ranked = sorted(counts, key=lambda key: -counts[key])
+    return [first_seen[key] for key in ranked[:_MERGED_LIST_LIMIT]]
+
+
+def merge_analyses(partials: Sequence[dict[str, Any]]) -> dict[str, Any]:
+    """Reduce partial analyses locally, without another model call.
+
+    The summary quotes the first ``_MERGED_SUMMARY_LIMIT`` chunk summaries and
+    counts the rest, so it stays bounded however many chunks there are.
+    """
+    summaries = " ".join(partial["summary"] for partial in partials[:_MERGED_SUMMARY_LIMIT])
+    omitted = len(partials) - _MERGED_SUMMARY_LIMIT
+    if omitted > 0:
+        summaries += f" (+{omitted} more chunk summaries)"
+    return {
+        "summary": f"Merged {len(partials)} chunk analyses. {summaries}",
+        **{field_name: _merge_list(partials, field_name) for field_name in _LIST_FIELDS},
+    }
+
+
+# Static, so it forms a byte-stable prefix that provider prompt caches can reuse.
+REDUCE_SYSTEM_PROMPT = (
+    "You are a product analyst. Be concise, concrete, and return strict JSON only. "
+    "Merge the partial analyses of one feedback corpus into a single analysis and return ONLY valid JSON with this shape: "
+    '{"summary": string, "themes": string[], "opportunities": string[], "experiments": string[], "prd_outline": string[]}. '
+    "Combine duplicates, prefer themes supported by several partials, and keep each list concise (2-5 items)."
+)
+
+
+def build_reduce_prompt(partials: Sequence[dict[str, Any]], context: str | None) -> str:
+    """The per-request part of the reduce call; instructions live in ``REDUCE_SYSTEM_PROMPT``."""
+    context_line = f"Context: {context}\n" if context else ""
+    encoded = json.dumps(list(partials), ensure_ascii=False)
+    return f"{context_line}Partial analyses:\n{encoded}"
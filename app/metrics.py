@@ -0,0 +1,251 @@
+"""In-process Prometheus metrics: labelled counters and histograms in text exposition format.
+
+Deliberately small (no ``prometheus_client`` dependency). Each worker process
+keeps its own values, as with the default ``prometheus_client`` registry, so
+scrape every worker or run a single one behind ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from collections.abc import Sequence
+from typing import Any
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROMPT_CHAR_BUCKETS = (500, 1_000, 2_000, 4_000, 8_000, 16_000, 32_000, 64_000, 128_000, 256_000)
+
+
+def prompt_size_label(chars: int) -> str:
+    """Coarse prompt-size class, cheap enough to use as a label."""
+    for limit, label in ((1_000, "lt_1k"), (4_000, "1k_4k"), (16_000, "4k_16k"), (64_000, "16k_64k")):
+        if chars < limit:
+            return label
+    return "ge_64k"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}_total{_format_labels(self.label_names, key)} {_format_number(value)}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: dict[str, Any]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (non-cumulative) + overflow, sum].
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def time(self, **labels: Any) -> _Timer:
+        """Context manager that observes the elapsed wall time of its block."""
+        return _Timer(self, labels)
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, float("inf")), counts):
+                    cumulative += count
+                    le = f'le="{_format_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_format_number(total[0])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "insight2spec_stage_seconds",
+        "Time spent in each analyze pipeline stage.",
+        ("stage", "prompt_size"),
+    )
+)
+UPSTREAM_SECONDS = REGISTRY.register(
+    Histogram(
+        "insight2spec_upstream_request_seconds",
+        "Duration of single OpenRouter HTTP attempts (retries and hedges count separately).",
+        ("model", "status", "prompt_size"),
+    )
+)
+PROMPT_CHARS = REGISTRY.register(
+    Histogram(
+        "insight2spec_prompt_chars",
+        "Size of prompts sent to OpenRouter, in characters.",
+        buckets=PROMPT_CHAR_BUCKETS,
+    )
+)
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "insight2spec_http_request_seconds",
+        "HTTP request duration until the last body byte, by route, status and cache outcome.",
+        ("method", "route", "status_code", "cache"),
+    )
+)
+ANALYSIS_ERRORS = REGISTRY.register(
+    Counter(
+        "insight2spec_analysis_errors",
+        "Analysis failures surfaced to clients, by error code.",
+        ("code", "status_code", "surface"),
+    )
+)
+ANALYSIS_OUTCOMES = REGISTRY.register(
+    Counter(
+        "insight2spec_analysis_outcomes",
+        "Analyses by mode and cache/coalesce outcome (hit, miss, coalesced, bypass, delta).",
+        ("mode", "outcome"),
+    )
+)
+
+JSON_REPAIRS = REGISTRY.register(
+    Counter(
+        "insight2spec_json_repairs",
+        "Malformed model JSON by recovery outcome (local, local_failed, fixup, fixup_failed).",
+        ("outcome",),
+    )
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records ``REQUEST_SECONDS`` for every HTTP request.
+
+    The route label is the matched path template (FastAPI stores the route in
+    the scope), so ids in paths do not create new series. The cache label is
+    the ``cache_header`` value of the response, when present.
+    """
+
+    def __init__(self, app: Any, *, cache_header: str) -> None:
+        self.app = app
+        self.cache_header = cache_header.lower().encode("latin-1")
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        response: dict[str, str] = {"status_code": "500", "cache": ""}
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                response["status_code"] = str(message["status"])
+                for name, value in message.get("headers", ()):
+                    if name.lower() == self.cache_header:
+                        response["cache"] = value.decode("latin-1")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                **response,
+            )
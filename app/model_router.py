@@ -0,0 +1,143 @@
+"""Latency-aware routing across a pool of OpenRouter models."""
+
+from __future__ import annotations
+
+import os
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+DEFAULT_MODEL = "openai/gpt-4o-mini"
+
+Clock = Callable[[], float]
+
+
+@dataclass(slots=True)
+class ModelStats:
+    model: str
+    latency_ewma: float | None = None
+    error_ewma: float = 0.0
+    calls: int = 0
+    failures: int = 0
+    race_wins: int = 0
+    last_failure_at: float | None = None
+
+
+class ModelRouter:
+    """Pick a model per request from EWMA latency and error rates.
+
+    Healthy models (error EWMA below ``unhealthy_error_rate``) are ranked by
+    latency EWMA; a model with no samples yet ranks first so it gets measured.
+    An unhealthy model is tried again once ``cooldown_seconds`` have passed
+    since its last failure. If nothing is healthy, the least-failing model is
+    used anyway. With ``race`` on, the two best healthy models are returned.
+
+    Size routing runs first: inputs up to ``small_input_tokens`` go to
+    ``small_model`` and inputs from ``large_input_tokens`` up go to
+    ``large_model`` while those models are healthy. A threshold of ``0``
+    turns that route off.
+    """
+
+    def __init__(
+        self,
+        models: Sequence[str],
+        *,
+        alpha: float = 0.3,
+        unhealthy_error_rate: float = 0.5,
+        cooldown_seconds: float = 30.0,
+        race: bool = False,
+        small_model: str | None = None,
+        small_input_tokens: int = 0,
+        large_model: str | None = None,
+        large_input_tokens: int = 0,
+        clock: Clock = time.monotonic,
+    ) -> None:
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+
+        self.models = tuple(dict.fromkeys(models))
+        self.alpha = alpha
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.race = race
+        self.small_model = small_model if small_input_tokens > 0 else None
+        self.small_input_tokens = small_input_tokens
+        self.large_model = large_model if large_input_tokens > 0 else None
+        self.large_input_tokens = large_input_tokens
+        self.clock = clock
+        routed = [model for model in (self.small_model, self.large_model) if model]
+        self._stats = {model: ModelStats(model) for model in (*self.models, *routed)}
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        default_model = os.getenv("OPENROUTER_MODEL", DEFAULT_MODEL)
+        pool = [model.strip() for model in os.getenv("OPENROUTER_MODELS", "").split(",") if model.strip()]
+        return cls(
+            pool or [default_model],
+            cooldown_seconds=float(os.getenv("OPENROUTER_MODEL_COOLDOWN_SECONDS", "30")),
+            race=os.getenv("OPENROUTER_ROUTING_RACE", "false").lower() in {"1", "true", "yes"},
+            small_model=os.getenv("OPENROUTER_SMALL_MODEL") or None,
+            small_input_tokens=int(os.getenv("OPENROUTER_SMALL_INPUT_TOKENS", "0")),
+            large_model=os.getenv("OPENROUTER_LARGE_MODEL") or None,
+            large_input_tokens=int(os.getenv("OPENROUTER_LARGE_INPUT_TOKENS", "0")),
+        )
+
+    @property
+    def cache_identity(self) -> str:
+        """Model part of cache keys: results from any routed model are interchangeable."""
+        models = list(self._stats)
+        return models[0] if len(models) == 1 else "router:" + ",".join(models)
+
+    def healthy(self, model: str) -> bool:
+        stats = self._stats[model]
+        if stats.error_ewma < self.unhealthy_error_rate:
+            return True
+        return stats.last_failure_at is None or self.clock() - stats.last_failure_at >= self.cooldown_seconds
+
+    def choose(self, input_tokens: int) -> list[str]:
+        """Return the model to call, or the two models to race."""
+        if self.small_model and input_tokens <= self.small_input_tokens and self.healthy(self.small_model):
+            return [self.small_model]
+        if self.large_model and input_tokens >= self.large_input_tokens and self.healthy(self.large_model):
+            return [self.large_model]
+
+        healthy = [model for model in self.models if self.healthy(model)]
+        if not healthy:
+            return [min(self.models, key=lambda model: self._stats[model].error_ewma)]
+
+        healthy.sort(key=lambda model: self._stats[model].latency_ewma or 0.0)
+        return healthy[:2] if self.race else healthy[:1]
+
+    def record_success(self, model: str, latency_seconds: float) -> None:
+        stats = self._stats[model]
+        stats.calls += 1
+        stats.error_ewma *= 1 - self.alpha
+        if stats.latency_ewma is None:
+            stats.latency_ewma = latency_seconds
+        else:
+            stats.latency_ewma += self.alpha * (latency_seconds - stats.latency_ewma)
+
+    def record_failure(self, model: str) -> None:
+        stats = self._stats[model]
+        stats.calls += 1
+        stats.failures += 1
+        stats.error_ewma += self.alpha * (1.0 - stats.error_ewma)
+        stats.last_failure_at = self.clock()
+
+    def record_race_win(self, model: str) -> None:
+        self._stats[model].race_wins += 1
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "model": stats.model,
+                "healthy": self.healthy(stats.model),
+                "latency_ewma_seconds": stats.latency_ewma,
+                "error_ewma": round(stats.error_ewma, 4),
+                "calls": stats.calls,
+                "failures": stats.failures,
+                "race_wins": stats.race_wins,
+            }
+            for stats in self._stats.values()
+        ]
@@ -0,0 +1,121 @@
+"""Incremental NDJSON (JSON Lines) input for streaming analysis."""
+
+from __future__ import annotations
+
+import json
+from collections.abc import AsyncIterable, AsyncIterator
+from dataclasses import dataclass
+from typing import Any
+
+from app import json_codec
+
+
+class NDJSONLineTooLongError(ValueError):
+    """Raised when a single input line exceeds the configured byte limit."""
+
+
+@dataclass(frozen=True, slots=True)
+class AnalysisUnit:
+    """One analysis to run: a request body built from input lines ``first_line``..``last_line``.
+
+    ``error`` is set instead of ``request`` when the lines could not be used.
+    """
+
+    first_line: int
+    last_line: int
+    request: dict[str, Any] | None = None
+    error: str | None = None
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], *, max_line_bytes: int) -> AsyncIterator[tuple[int, bytes]]:
+    """Split a byte stream into ``(line_number, line)`` pairs, skipping blank lines.
+
+    Only the current partial line is buffered, so memory is bounded by
+    ``max_line_bytes`` plus one chunk whatever the stream length.
+    """
+    buffer = bytearray()
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while (newline := buffer.find(b"\n", start)) != -1:
+            line_number += 1
+            if newline - start > max_line_bytes:
+                raise NDJSONLineTooLongError(f"Line {line_number} is longer than {max_line_bytes} bytes")
+            line = bytes(buffer[start:newline])
+            start = newline + 1
+            if line.strip():
+                yield line_number, line
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise NDJSONLineTooLongError(f"Line {line_number + 1} is longer than {max_line_bytes} bytes")
+
+    if buffer.strip():
+        yield line_number + 1, bytes(buffer)
+
+
+def _snippet(record: Any) -> str | None:
+    if isinstance(record, str):
+        return record
+    if isinstance(record, dict) and isinstance(record.get("text"), str):
+        return record["text"]
+    return None
+
+
+async def iter_analysis_units(
+    lines: AsyncIterable[tuple[int, bytes]],
+    *,
+    group_size: int,
+    context: str | None = None,
+) -> AsyncIterator[AnalysisUnit]:
+    """Turn NDJSON records into analysis units, in input order.
+
+    A record with a ``feedback`` key is a complete ``AnalyzeRequest`` body and
+    becomes its own unit. A bare string or an object with a ``text`` string is
+    one feedback snippet; consecutive snippets are grouped ``group_size`` at a
+    time with ``context``. Any other line becomes an error unit. A line that is
+    too long flushes the pending group, then re-raises.
+    """
+    group: list[str] = []
+    group_start = 0
+    last_line = 0
+
+    def flush() -> AnalysisUnit:
+        unit = AnalysisUnit(group_start, last_line, request={"feedback": list(group), "context": context})
+        group.clear()
+        return unit
+
+    try:
+        async for line_number, line in lines:
+            try:
+                record = json_codec.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                record = None
+                problem = "is not valid JSON"
+            else:
+                problem = "must be an AnalyzeRequest object, a string, or an object with a 'text' string"
+
+            snippet = _snippet(record)
+            if snippet is not None:
+                if not group:
+                    group_start = line_number
+                group.append(snippet)
+                last_line = line_number
+                if len(group) >= group_size:
+                    yield flush()
+                continue
+
+            if group:
+                yield flush()
+            if isinstance(record, dict) and "feedback" in record:
+                yield AnalysisUnit(line_number, line_number, request=record)
+            else:
+                yield AnalysisUnit(line_number, line_number, error=f"Line {line_number} {problem}")
+    except NDJSONLineTooLongError:
+        # Analyze the snippets read so far before reporting the bad line.
+        if group:
+            yield flush()
+        raise
+
+    if group:
+        yield flush()
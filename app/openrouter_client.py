@@ -2,12 +2,20 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
 import os
-from dataclasses import dataclass
+import time
+from collections.abc import AsyncIterator, Mapping
+from dataclasses import dataclass, field
 from typing import Any
 
 import httpx
 
+from app import json_codec
+from app.metrics import UPSTREAM_SECONDS, prompt_size_label
+from app.resilience import CircuitBreaker, HedgePolicy, LatencyTracker, RetryPolicy, first_success
+
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
 
@@ -20,13 +28,140 @@ class OpenRouterConfigError(OpenRouterError):
 
 
 class OpenRouterRequestError(OpenRouterError):
-    """Raised when OpenRouter rejects a request."""
+    """Raised when OpenRouter rejects a request.
+
+    ``status_code`` is set for HTTP error responses and ``retry_after`` when
+    the response carried a numeric ``Retry-After`` header.
+    """
+
+    def __init__(self, message: str, *, status_code: int | None = None, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class OpenRouterCircuitOpenError(OpenRouterRequestError):
+    """Raised without calling upstream while the circuit breaker is open."""
 
 
 class OpenRouterTimeoutError(OpenRouterError):
     """Raised when a request to OpenRouter times out."""
 
 
+class OpenRouterDeadlineError(OpenRouterTimeoutError):
+    """Raised when the caller's ``timeout_seconds`` budget ran out.
+
+    This says nothing about upstream health, so it does not feed the breaker.
+    """
+
+
+def _http2_available() -> bool:
+    """HTTP/2 in httpx needs the optional ``h2`` package."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Providers that only cache prompt prefixes marked with ``cache_control`` (OpenRouter
+# passes the marker through); others, such as OpenAI, cache long prefixes on their own.
+_DEFAULT_CACHE_CONTROL_MODELS = ("anthropic/", "google/gemini")
+
+
+def _build_payload(
+    *,
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float,
+    cache_control: bool = False,
+    max_tokens: int | None = None,
+) -> dict[str, Any]:
+    system_content: str | list[dict[str, Any]] = system_prompt
+    if cache_control:
+        system_content = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+    payload: dict[str, Any] = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": user_prompt},
+        ],
+        "temperature": temperature,
+    }
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+    return payload
+
+
+def _message_chars(content: str | list[dict[str, Any]]) -> int:
+    if isinstance(content, str):
+        return len(content)
+    return sum(len(part.get("text", "")) for part in content)
+
+
+def _upstream_labels(payload: dict[str, Any]) -> dict[str, str]:
+    chars = sum(_message_chars(message["content"]) for message in payload["messages"])
+    return {"model": payload["model"], "prompt_size": prompt_size_label(chars)}
+
+
+def _build_headers(api_key: str, app_name: str) -> dict[str, str]:
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://insight2spec.local",
+        "X-Title": app_name,
+    }
+
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _raise_for_status(response: httpx.Response) -> None:
+    if response.status_code >= 400:
+        raise OpenRouterRequestError(
+            f"OpenRouter returned HTTP {response.status_code}: {response.text[:300]}",
+            status_code=response.status_code,
+            retry_after=_retry_after_seconds(response),
+        )
+
+
+def _decode_response(response: httpx.Response) -> dict[str, Any]:
+    _raise_for_status(response)
+    # Decodes the raw bytes; ``response.json()`` would go through the stdlib decoder.
+    return json_codec.loads(response.content)
+
+
+def _parse_stream_chunk(data: str) -> tuple[list[str], Mapping[str, Any] | None]:
+    """Return the assistant text deltas and the ``usage`` block (if any) of one ``data:`` line."""
+    try:
+        chunk = json_codec.loads(data)
+    except json.JSONDecodeError as exc:
+        raise OpenRouterRequestError("OpenRouter sent a malformed stream chunk") from exc
+
+    if not isinstance(chunk, Mapping):
+        raise OpenRouterRequestError("OpenRouter sent a malformed stream chunk")
+
+    error = chunk.get("error")
+    if error:
+        message = error.get("message") if isinstance(error, Mapping) else error
+        raise OpenRouterRequestError(f"OpenRouter stream failed: {message}")
+
+    deltas: list[str] = []
+    for choice in chunk.get("choices") or []:
+        if not isinstance(choice, Mapping):
+            continue
+        delta = choice.get("delta")
+        if isinstance(delta, Mapping) and isinstance(delta.get("content"), str) and delta["content"]:
+            deltas.append(delta["content"])
+    usage = chunk.get("usage")
+    return deltas, usage if isinstance(usage, Mapping) else None
+
+
 @dataclass(slots=True)
 class OpenRouterClient:
     api_key: str
@@ -51,21 +186,13 @@ class OpenRouterClient:
         user_prompt: str,
         temperature: float = 0.2,
     ) -> dict[str, Any]:
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            "temperature": temperature,
-        }
-
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://insight2spec.local",
-            "X-Title": self.app_name,
-        }
+        payload = _build_payload(
+            model=model,
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=temperature,
+        )
+        headers = _build_headers(self.api_key, self.app_name)
 
         try:
             with httpx.Client(timeout=self.timeout_seconds) as client:
@@ -81,9 +208,314 @@ class OpenRouterClient:
         except httpx.HTTPError as exc:
             raise OpenRouterRequestError("OpenRouter request failed before response") from exc
 
-        if response.status_code >= 400:
-            raise OpenRouterRequestError(
-                f"OpenRouter returned HTTP {response.status_code}: {response.text[:300]}"
+        return _decode_response(response)
+
+
+def _cache_control_models_from_env() -> tuple[str, ...]:
+    raw = os.getenv("OPENROUTER_CACHE_CONTROL_MODELS")
+    if raw is None:
+        return _DEFAULT_CACHE_CONTROL_MODELS
+    return tuple(prefix.strip() for prefix in raw.split(",") if prefix.strip())
+
+
+@dataclass(slots=True)
+class AsyncOpenRouterClient:
+    """Long-lived async client that keeps one pooled connection set per process.
+
+    Build it once (``create_app`` does this in its lifespan) and call ``aclose``
+    on shutdown. Connections are kept alive between calls, and HTTP/2 is used
+    when the optional ``h2`` package is installed.
+
+    ``complete_json`` retries transient failures per ``retry``, optionally
+    hedges slow attempts per ``hedge``, and fails fast with
+    ``OpenRouterCircuitOpenError`` while ``breaker`` is open. A bare instance
+    makes single attempts; ``from_env`` turns on the configured policies.
+
+    The system prompt of models matching a ``cache_control_models`` prefix is
+    marked cacheable, so providers that need the hint reuse the static prefix.
+    """
+
+    api_key: str
+    timeout_seconds: float = 20.0
+    base_url: str = OPENROUTER_BASE_URL
+    app_name: str = "Insight2Spec"
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry_seconds: float = 30.0
+    http2: bool = field(default_factory=_http2_available)
+    transport: httpx.AsyncBaseTransport | None = None
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    hedge: HedgePolicy | None = None
+    breaker: CircuitBreaker | None = None
+    latencies: LatencyTracker = field(default_factory=LatencyTracker)
+    cache_control_models: tuple[str, ...] = ()
+    retries: int = field(default=0, init=False)
+    hedges: int = field(default=0, init=False)
+    _client: httpx.AsyncClient | None = field(default=None, init=False, repr=False)
+
+    @classmethod
+    def from_env(cls) -> "AsyncOpenRouterClient":
+        api_key = os.getenv("OPENROUTER_API_KEY")
+        if not api_key:
+            raise OpenRouterConfigError("OPENROUTER_API_KEY is required")
+
+        return cls(
+            api_key=api_key,
+            timeout_seconds=float(os.getenv("OPENROUTER_TIMEOUT_SECONDS", "20")),
+            base_url=os.getenv("OPENROUTER_BASE_URL", OPENROUTER_BASE_URL),
+            max_connections=int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("OPENROUTER_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry_seconds=float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY_SECONDS", "30")),
+            retry=RetryPolicy.from_env(),
+            hedge=HedgePolicy.from_env(),
+            breaker=CircuitBreaker.from_env(),
+            cache_control_models=_cache_control_models_from_env(),
+        )
+
+    def _cache_control(self, model: str) -> bool:
+        return model.startswith(self.cache_control_models)
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout_seconds,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry_seconds,
+                ),
+                http2=self.http2,
+                transport=self.transport,
+                headers=_build_headers(self.api_key, self.app_name),
+            )
+        return self._client
+
+    async def preconnect(self) -> None:
+        """Open a pooled connection ahead of the first real request.
+
+        Any response (even an error status) leaves a warm connection behind, so
+        failures here are swallowed: warm-up must never block startup.
+        """
+        try:
+            await self.http_client.head(self.base_url)
+        except httpx.HTTPError:
+            pass
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def complete_json(
+        self,
+        *,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.2,
+        timeout_seconds: float | None = None,
+        max_tokens: int | None = None,
+    ) -> dict[str, Any]:
+        """Return the raw completion payload.
+
+        ``timeout_seconds`` is an overall budget for this call, retries and
+        hedges included; each attempt still waits at most ``self.timeout_seconds``.
+        ``max_tokens`` caps the completion length when set.
+        """
+        payload = _build_payload(
+            model=model,
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=temperature,
+            cache_control=self._cache_control(model),
+            max_tokens=max_tokens,
+        )
+
+        if self.breaker is not None and not self.breaker.allow():
+            raise OpenRouterCircuitOpenError("OpenRouter circuit breaker is open; skipping upstream call")
+
+        deadline = time.monotonic() + timeout_seconds if timeout_seconds is not None else None
+        try:
+            result = await self._complete_with_retries(payload, deadline)
+        except OpenRouterDeadlineError:
+            raise
+        except (OpenRouterRequestError, OpenRouterTimeoutError) as error:
+            self._record_failure(error)
+            raise
+
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return result
+
+    def _record_failure(self, error: OpenRouterError) -> None:
+        # Client errors (a bad payload or key) say nothing about upstream health.
+        if self.breaker is not None and self._is_retryable(error):
+            self.breaker.record_failure()
+
+    def _is_retryable(self, error: OpenRouterError) -> bool:
+        if isinstance(error, OpenRouterTimeoutError):
+            return True
+        if isinstance(error, OpenRouterRequestError):
+            # No status means the request failed before any response arrived.
+            return error.status_code is None or error.status_code in self.retry.retry_statuses
+        return False
+
+    def _attempt_timeout(self, deadline: float | None) -> float:
+        if deadline is None:
+            return self.timeout_seconds
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise OpenRouterDeadlineError("Request deadline passed before the OpenRouter call was sent")
+        return min(self.timeout_seconds, remaining)
+
+    async def _complete_with_retries(self, payload: dict[str, Any], deadline: float | None = None) -> dict[str, Any]:
+        attempt = 0
+        while True:
+            try:
+                return await self._complete_hedged(payload, deadline)
+            except (OpenRouterRequestError, OpenRouterTimeoutError) as error:
+                attempt += 1
+                if attempt >= self.retry.max_attempts or not self._is_retryable(error):
+                    raise
+                retry_after = error.retry_after if isinstance(error, OpenRouterRequestError) else None
+                delay = self.retry.backoff(attempt - 1, retry_after=retry_after)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    # The retry could not finish in time; report the real failure instead.
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+    async def _complete_hedged(self, payload: dict[str, Any], deadline: float | None = None) -> dict[str, Any]:
+        """One logical attempt: a backup request starts if the first is slower than the hedge delay.
+
+        The first success wins and the other request is cancelled. If both
+        fail, the first failure is raised.
+        """
+        if self.hedge is None:
+            return await self._complete_once(payload, self._attempt_timeout(deadline))
+
+        primary = asyncio.ensure_future(self._complete_once(payload, self._attempt_timeout(deadline)))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge.delay(self.latencies))
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        try:
+            backup_timeout = self._attempt_timeout(deadline)
+        except OpenRouterTimeoutError:
+            # No budget left for a backup; let the primary finish on its own.
+            return await primary
+        self.hedges += 1
+        backup = asyncio.ensure_future(self._complete_once(payload, backup_timeout))
+        _, result = await first_success((primary, backup))
+        return result
+
+    async def _complete_once(self, payload: dict[str, Any], timeout_seconds: float | None = None) -> dict[str, Any]:
+        labels = _upstream_labels(payload)
+        timeout = self.timeout_seconds if timeout_seconds is None else timeout_seconds
+        started = time.perf_counter()
+        try:
+            response = await self.http_client.post(
+                f"{self.base_url}/chat/completions", json=payload, timeout=timeout
             )
+        except httpx.TimeoutException as exc:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, status="timeout", **labels)
+            error = OpenRouterDeadlineError if timeout < self.timeout_seconds else OpenRouterTimeoutError
+            raise error(f"OpenRouter request timed out after {timeout:g}s") from exc
+        except httpx.HTTPError as exc:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, status="connection_error", **labels)
+            raise OpenRouterRequestError("OpenRouter request failed before response") from exc
+
+        elapsed = time.perf_counter() - started
+        UPSTREAM_SECONDS.observe(elapsed, status=str(response.status_code), **labels)
+        result = _decode_response(response)
+        self.latencies.record(elapsed)
+        return result
+
+    async def stream_chat(
+        self,
+        *,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.2,
+        timeout_seconds: float | None = None,
+        usage: dict[str, Any] | None = None,
+    ) -> AsyncIterator[str]:
+        """Yield assistant text deltas as OpenRouter streams them (``stream: true``).
+
+        Upstream failures, including error chunks sent mid-stream, raise the same
+        error types as ``complete_json``. Streams are not retried or hedged
+        (deltas may already have been forwarded), but they honour and feed the
+        circuit breaker. ``timeout_seconds`` bounds the whole stream, checked
+        as each line arrives. ``usage``, when given, is updated with the token
+        usage the provider reports at the end of the stream.
+        """
+        payload = _build_payload(
+            model=model,
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=temperature,
+            cache_control=self._cache_control(model),
+        )
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+
+        if self.breaker is not None and not self.breaker.allow():
+            raise OpenRouterCircuitOpenError("OpenRouter circuit breaker is open; skipping upstream call")
+
+        deadline = time.monotonic() + timeout_seconds if timeout_seconds is not None else None
+        labels = _upstream_labels(payload)
+        status = "connection_error"
+        started = time.perf_counter()
+        try:
+            timeout = self._attempt_timeout(deadline)
+            async with self.http_client.stream(
+                "POST", f"{self.base_url}/chat/completions", json=payload, timeout=timeout
+            ) as response:
+                status = str(response.status_code)
+                if response.status_code >= 400:
+                    await response.aread()
+                    _raise_for_status(response)
+
+                async for line in response.aiter_lines():
+                    if deadline is not None and time.monotonic() >= deadline:
+                        status = "timeout"
+                        raise OpenRouterDeadlineError(f"OpenRouter stream did not finish within {timeout_seconds:g}s")
+                    # SSE comments (": OPENROUTER PROCESSING") are keep-alives.
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    deltas, chunk_usage = _parse_stream_chunk(data)
+                    if chunk_usage is not None and usage is not None:
+                        usage.update(chunk_usage)
+                    for delta in deltas:
+                        yield delta
+        except httpx.TimeoutException as exc:
+            status = "timeout"
+            if timeout < self.timeout_seconds:
+                raise OpenRouterDeadlineError(f"OpenRouter request timed out after {timeout:g}s") from exc
+            error = OpenRouterTimeoutError(f"OpenRouter request timed out after {timeout:g}s")
+            self._record_failure(error)
+            raise error from exc
+        except httpx.HTTPError as exc:
+            error = OpenRouterRequestError("OpenRouter stream failed before completion")
+            self._record_failure(error)
+            raise error from exc
+        except OpenRouterDeadlineError:
+            raise
+        except OpenRouterRequestError as error:
+            self._record_failure(error)
+            raise
+        finally:
+            # Measured to the end of the stream, not to the first byte.
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, status=status, **labels)
 
-        return response.json()
+        if self.breaker is not None:
+            self.breaker.record_success()
@@ -3,15 +3,24 @@
 from __future__ import annotations
 
 import json
+import os
 import re
 from collections.abc import Mapping
+from dataclasses import dataclass
 from typing import Any
 
+from app import json_codec
+from app.metrics import JSON_REPAIRS
+
 
 class OpenRouterParseError(ValueError):
     """Raised when assistant text cannot be extracted from a completion payload."""
 
 
+class MalformedJSONError(OpenRouterParseError):
+    """Raised when the assistant output is not valid JSON (rather than valid JSON of the wrong shape)."""
+
+
 def _extract_text_from_content_block(content: Any) -> str | None:
     """Handle OpenAI-style mixed content blocks.
 
@@ -62,56 +71,576 @@ def extract_assistant_text(payload: Mapping[str, Any]) -> str:
     raise OpenRouterParseError("No assistant text content found in OpenRouter payload")
 
 
-def _coerce_string_list(value: Any, *, field_name: str) -> list[str]:
-    if not isinstance(value, list) or not value:
-        raise OpenRouterParseError(f"Structured analysis field '{field_name}' must be a non-empty list")
+_LIST_FIELDS = ("themes", "opportunities", "experiments", "prd_outline")
+_REQUIRED_LIST_FIELDS = ("themes", "opportunities", "experiments")
+_KNOWN_FIELDS = frozenset(("summary", *_LIST_FIELDS))
 
-    normalized: list[str] = []
-    for item in value:
-        if not isinstance(item, str) or not item.strip():
-            raise OpenRouterParseError(f"Structured analysis field '{field_name}' must contain non-empty strings")
-        normalized.append(item.strip())
+# Outside strings only these characters change parser state; everything between
+# them is skipped in one regex jump instead of a per-character Python loop.
+_STRUCTURAL = re.compile(r'[{}\[\]",:]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_FENCE_OPEN = re.compile(r"^```[\w-]*")
 
-    return normalized
+# Once this much already-consumed text sits in front of the current token it is dropped.
+_TRIM_THRESHOLD = 8192
 
+_scanstring = json.decoder.scanstring
 
-def _extract_json_object(raw_text: str) -> Mapping[str, Any]:
-    text = raw_text.strip()
-    fenced_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, flags=re.DOTALL)
-    if fenced_match:
-        text = fenced_match.group(1).strip()
 
+def _invalid_json() -> MalformedJSONError:
+    return MalformedJSONError("Structured analysis must be valid JSON")
+
+
+def _decode_value(raw: str) -> Any:
     try:
-        parsed = json.loads(text)
+        return json_codec.loads(raw)
     except json.JSONDecodeError as error:
-        raise OpenRouterParseError("Structured analysis must be valid JSON") from error
-
-    if not isinstance(parsed, Mapping):
-        raise OpenRouterParseError("Structured analysis JSON must be an object")
+        raise _invalid_json() from error
 
-    return parsed
 
+def _validate_list_item(item: Any, *, field_name: str) -> str:
+    if not isinstance(item, str) or not item.strip():
+        raise OpenRouterParseError(f"Structured analysis field '{field_name}' must contain non-empty strings")
+    return item.strip()
 
-def extract_structured_analysis(payload: Mapping[str, Any]) -> dict[str, Any]:
-    """Extract and validate a structured product analysis JSON object from assistant output."""
-    raw_text = extract_assistant_text(payload)
-    parsed = _extract_json_object(raw_text)
 
-    summary = parsed.get("summary")
-    if not isinstance(summary, str) or not summary.strip():
+def _validate_summary(value: Any) -> str:
+    if not isinstance(value, str) or not value.strip():
         raise OpenRouterParseError("Structured analysis field 'summary' must be a non-empty string")
+    return value.strip()
+
+
+def _non_empty_list_error(field_name: str) -> OpenRouterParseError:
+    return OpenRouterParseError(f"Structured analysis field '{field_name}' must be a non-empty list")
+
+
+class IncrementalAnalysisParser:
+    """Single-pass parser for the structured analysis object in assistant text.
+
+    Feed text in arrival order; the JSON object is located inside fenced or
+    unfenced output and scanned once, tracking brace and string state. Each
+    schema field is decoded and validated the moment its value closes, so
+    malformed output raises ``OpenRouterParseError`` without waiting for the
+    rest of the completion. ``feed`` returns ``(field, value)`` pairs for
+    ``summary`` and ``(field, item)`` pairs for each list item as they complete;
+    ``finish`` checks required fields and returns the validated analysis.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._pos = 0
+        self._state = "prefix"
+        self._in_string = False
+        self._depth = 0
+        self._level_depth = 1
+        self._in_list = False
+        self._after_comma = False
+        self._list_has_items = False
+        self._token_start = 0
+        self._key: str | None = None
+        self._fields: dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        if self._state == "done":
+            return []
+
+        self._buffer += chunk
+        events: list[tuple[str, Any]] = []
+        if self._state == "prefix" and not self._find_object_start():
+            return events
+
+        buffer = self._buffer
+        end = len(buffer)
+        pos = self._pos
+
+        while pos < end and self._state != "done":
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, pos)
+                if match is None:
+                    pos = end
+                    break
+                index = match.start()
+                if buffer[index] == "\\":
+                    if index + 1 >= end:
+                        pos = index
+                        break
+                    pos = index + 2
+                    continue
+                self._in_string = False
+                pos = index + 1
+                self._close_string(pos, events)
+                continue
+
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                if self._state in ("key", "colon", "after_value") and buffer[pos:].strip():
+                    raise _invalid_json()
+                pos = end
+                break
+            index = match.start()
+            pos = self._structural(buffer[index], pos, index, events)
+
+        self._pos = pos
+        self._trim()
+        return events
+
+    def finish(self) -> dict[str, Any]:
+        if self._state == "prefix":
+            self._check_prefix(self._buffer)
+        if self._state != "done":
+            raise _invalid_json()
+
+        fields = self._fields
+        summary = fields.get("summary")
+        if summary is None:
+            _validate_summary(None)
+
+        for field_name in _REQUIRED_LIST_FIELDS:
+            if not fields.get(field_name):
+                raise _non_empty_list_error(field_name)
+
+        return {
+            "summary": summary,
+            "themes": fields["themes"],
+            "opportunities": fields["opportunities"],
+            "experiments": fields["experiments"],
+            "prd_outline": fields.get("prd_outline") or [],
+        }
+
+    def _check_prefix(self, prefix: str) -> None:
+        prefix = _FENCE_OPEN.sub("", prefix.strip(), count=1).lstrip()
+        if prefix.startswith("["):
+            raise OpenRouterParseError("Structured analysis JSON must be an object")
+
+    def _find_object_start(self) -> bool:
+        start = self._buffer.find("{", self._pos)
+        if start == -1:
+            self._pos = len(self._buffer)
+            return False
+
+        self._check_prefix(self._buffer[:start])
+        self._state = "key"
+        self._depth = 1
+        self._pos = start + 1
+        return True
+
+    def _close_string(self, pos: int, events: list[tuple[str, Any]]) -> None:
+        if self._state == "key_string":
+            self._key = _decode_value(self._buffer[self._token_start:pos])
+            self._state = "colon"
+        elif self._state == "value_string":
+            self._complete_value(_decode_value(self._buffer[self._token_start:pos]), events)
+
+    def _open_string(self, index: int, events: list[tuple[str, Any]], *, is_key: bool) -> int:
+        """Start a key or string value at ``index`` and return where scanning resumes.
+
+        When the closing quote is already buffered the C string scanner decodes
+        it in one call; otherwise the string is tracked until more text arrives.
+        """
+        try:
+            value, end = _scanstring(self._buffer, index + 1)
+        except json.JSONDecodeError:
+            self._token_start = index
+            self._in_string = True
+            self._state = "key_string" if is_key else "value_string"
+            return index + 1
+
+        if is_key:
+            self._key = value
+            self._state = "colon"
+        else:
+            self._complete_value(value, events)
+        return end
+
+    def _structural(self, char: str, pos: int, index: int, events: list[tuple[str, Any]]) -> int:
+        state = self._state
+        buffer = self._buffer
+
+        if state == "value_nested":
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == self._level_depth:
+                    self._complete_value(_decode_value(buffer[self._token_start:index + 1]), events)
+            return index + 1
+
+        if state == "value":
+            literal = buffer[self._token_start:index]
+            if literal.strip():
+                if char != ",":
+                    if char != ("]" if self._in_list else "}"):
+                        raise _invalid_json()
+                self._complete_value(_decode_value(literal), events)
+                self._after_value(char, index)
+                return index + 1
+
+            if char == '"':
+                return self._open_string(index, events, is_key=False)
+            if char == "[" and not self._in_list and self._key in _LIST_FIELDS:
+                self._in_list = True
+                self._depth += 1
+                self._level_depth = self._depth
+                self._after_comma = False
+                self._list_has_items = False
+                self._fields[self._key] = []
+                self._token_start = index + 1
+            elif char in "{[":
+                self._token_start = index
+                self._depth += 1
+                self._state = "value_nested"
+            elif char == "]" and self._in_list and not self._list_has_items and not self._after_comma:
+                self._close_list()
+            else:
+                raise _invalid_json()
+            return index + 1
+
+        if buffer[pos:index].strip():
+            raise _invalid_json()
+
+        if state == "key":
+            if char == '"':
+                return self._open_string(index, events, is_key=True)
+            if char == "}" and not self._after_comma:
+                self._state = "done"
+            else:
+                raise _invalid_json()
+        elif state == "colon":
+            if char != ":":
+                raise _invalid_json()
+            self._token_start = index + 1
+            self._state = "value"
+        elif state == "after_value":
+            self._after_value(char, index)
+        else:
+            raise _invalid_json()
+        return index + 1
+
+    def _after_value(self, char: str, index: int) -> None:
+        if char == ",":
+            self._after_comma = True
+            if self._in_list:
+                self._state = "value"
+                self._token_start = index + 1
+            else:
+                self._state = "key"
+        elif char == "]" and self._in_list:
+            self._close_list()
+        elif char == "}" and not self._in_list:
+            self._state = "done"
+        else:
+            raise _invalid_json()
+
+    def _close_list(self) -> None:
+        field_name = self._key
+        if not self._list_has_items and field_name in _REQUIRED_LIST_FIELDS:
+            raise _non_empty_list_error(field_name)
+
+        self._in_list = False
+        self._depth -= 1
+        self._level_depth = self._depth
+        self._after_comma = False
+        self._state = "after_value"
+
+    def _complete_value(self, value: Any, events: list[tuple[str, Any]]) -> None:
+        field_name = self._key
+        self._state = "after_value"
+        self._after_comma = False
+
+        if self._in_list:
+            item = _validate_list_item(value, field_name=field_name)
+            self._fields[field_name].append(item)
+            self._list_has_items = True
+            events.append((field_name, item))
+            return
+
+        if field_name not in _KNOWN_FIELDS:
+            return
+
+        if field_name == "summary":
+            self._fields["summary"] = _validate_summary(value)
+            events.append(("summary", self._fields["summary"]))
+        elif field_name in _REQUIRED_LIST_FIELDS or value:
+            # A list field given as a non-list (or a null/empty optional field).
+            raise _non_empty_list_error(field_name)
+        else:
+            self._fields[field_name] = []
 
-    themes = _coerce_string_list(parsed.get("themes"), field_name="themes")
-    opportunities = _coerce_string_list(parsed.get("opportunities"), field_name="opportunities")
-    experiments = _coerce_string_list(parsed.get("experiments"), field_name="experiments")
+    def _trim(self) -> None:
+        keep = self._token_start if self._state in ("key_string", "value", "value_string", "value_nested") else self._pos
+        keep = min(keep, self._pos)
+        if keep < _TRIM_THRESHOLD:
+            return
 
-    prd_outline_raw = parsed.get("prd_outline", [])
-    prd_outline = _coerce_string_list(prd_outline_raw, field_name="prd_outline") if prd_outline_raw else []
+        self._buffer = self._buffer[keep:]
+        self._pos -= keep
+        self._token_start -= keep
 
-    return {
-        "summary": summary.strip(),
-        "themes": themes,
-        "opportunities": opportunities,
-        "experiments": experiments,
-        "prd_outline": prd_outline,
-    }
+
+def _validate_analysis(parsed: Any) -> dict[str, Any]:
+    """Validate an already decoded analysis object the way the incremental parser does."""
+    if not isinstance(parsed, dict):
+        raise _invalid_json()
+
+    analysis = {"summary": _validate_summary(parsed.get("summary"))}
+    for field_name in _LIST_FIELDS:
+        value = parsed.get(field_name)
+        if isinstance(value, list) and value:
+            analysis[field_name] = [_validate_list_item(item, field_name=field_name) for item in value]
+        elif field_name in _REQUIRED_LIST_FIELDS or value:
+            raise _non_empty_list_error(field_name)
+        else:
+            analysis[field_name] = []
+    return analysis
+
+
+_CLOSERS = {"{": "}", "[": "]"}
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+_BARE_WORD = re.compile(r"[A-Za-z_][\w-]*")
+# Lenient about missing digits so a number cut off at "1." or "1e" reads as truncated.
+_NUMBER = re.compile(r"-?\d+(?:\.\d*)?(?:[eE][+-]?\d*)?")
+_STRING_END = frozenset(',:}]"')
+_SIMPLE_ESCAPES = frozenset('"\\/bfnrtu')
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class _Truncated(Exception):
+    pass
+
+
+def _repair_string(text: str, start: int) -> tuple[str, int]:
+    """Re-quote the string literal opening at ``start`` as JSON; return it and the index after it.
+
+    Single quotes become double quotes, raw control characters are escaped,
+    and a quote only closes the string when what follows could follow a
+    string (so ``"He said "hi""`` keeps its inner quotes).
+    """
+    quote = text[start]
+    out = ['"']
+    index = start + 1
+    end = len(text)
+    while index < end:
+        char = text[index]
+        if char == "\\":
+            if index + 1 >= end:
+                break
+            escaped = text[index + 1]
+            if escaped == "'":
+                out.append("'")
+            elif escaped in _SIMPLE_ESCAPES:
+                out.append(char + escaped)
+            else:
+                out.append("\\\\" + escaped)
+            index += 2
+            continue
+        if char == quote:
+            rest = text[index + 1:].lstrip()
+            if not rest or rest[0] in _STRING_END:
+                out.append('"')
+                return "".join(out), index + 1
+        if char == '"':
+            out.append('\\"')
+        elif char < " ":
+            out.append(_CONTROL_ESCAPES.get(char) or f"\\u{ord(char):04x}")
+        else:
+            out.append(char)
+        index += 1
+    raise _Truncated
+
+
+def repair_json(text: str) -> str | None:
+    """Rewrite almost-JSON model output as valid JSON text, or return ``None`` when that is hopeless.
+
+    Handles the usual slips: prose or fences around the object, single-quoted
+    strings, bare keys, Python literals, missing, doubled and trailing commas,
+    raw newlines and stray quotes inside strings, and output cut off before
+    its closing brackets (the unfinished value is dropped and the open
+    containers are closed). The result still has to be validated.
+    """
+    start = text.find("{")
+    if start == -1 or "[" in text[:start]:
+        return None
+
+    out: list[str] = []
+    stack: list[str] = []
+    # Per open container: "key", "colon", "value" or "comma" (a value just ended).
+    states: list[str] = []
+    # Last point where closing the open containers yields valid JSON.
+    safe = (0, ())
+
+    def value_done() -> None:
+        nonlocal safe
+        if states:
+            states[-1] = "comma"
+            safe = (len(out), tuple(stack))
+
+    def close_top() -> bool:
+        if states[-1] == "colon" or (states[-1] == "value" and stack[-1] == "}" and out[-1] == ":"):
+            return False
+        if out[-1] == ",":
+            out.pop()
+        out.append(stack.pop())
+        states.pop()
+        value_done()
+        return True
+
+    index = start
+    end = len(text)
+    try:
+        while index < end and (stack or not out):
+            char = text[index]
+            if char.isspace():
+                index += 1
+                continue
+            state = states[-1] if states else "value"
+
+            if char in "}]":
+                if char not in stack:
+                    return None
+                while stack[-1] != char:
+                    if not close_top():
+                        return None
+                if not close_top():
+                    return None
+                index += 1
+                continue
+            if char == ",":
+                if state == "comma":
+                    out.append(",")
+                    states[-1] = "key" if stack[-1] == "}" else "value"
+                index += 1
+                continue
+            if char == ":":
+                if state != "colon":
+                    return None
+                out.append(":")
+                states[-1] = "value"
+                index += 1
+                continue
+
+            if state == "comma":
+                out.append(",")
+                state = states[-1] = "key" if stack[-1] == "}" else "value"
+            if state == "colon":
+                return None
+
+            if state == "key":
+                if char in "\"'":
+                    key, index = _repair_string(text, index)
+                else:
+                    match = _BARE_WORD.match(text, index)
+                    if match is None:
+                        return None
+                    key, index = json_codec.dumps(match.group()), match.end()
+                out.append(key)
+                states[-1] = "colon"
+            elif char in "\"'":
+                value, index = _repair_string(text, index)
+                out.append(value)
+                value_done()
+            elif char in _CLOSERS:
+                out.append(char)
+                stack.append(_CLOSERS[char])
+                states.append("key" if char == "{" else "value")
+                safe = (len(out), tuple(stack))
+                index += 1
+            else:
+                match = _NUMBER.match(text, index) or _BARE_WORD.match(text, index)
+                if match is None:
+                    return None
+                if match.end() >= end:
+                    raise _Truncated
+                literal = match.group()
+                if literal[0].isalpha() or literal[0] == "_":
+                    literal = _LITERALS.get(literal)
+                    if literal is None:
+                        return None
+                out.append(literal)
+                value_done()
+                index = match.end()
+    except _Truncated:
+        pass
+
+    if stack:
+        length, open_containers = safe
+        del out[length:]
+        out.extend(reversed(open_containers))
+    return "".join(out)
+
+
+# Instructions for the optional follow-up call that asks a model to fix output local repair could not.
+JSON_FIXUP_SYSTEM_PROMPT = (
+    "The user message is a JSON object with syntax errors. Return ONLY the corrected JSON object with this shape: "
+    '{"summary": string, "themes": string[], "opportunities": string[], "experiments": string[], "prd_outline": string[]}. '
+    "Keep every value as written; do not add, remove or reword content."
+)
+
+
+@dataclass(slots=True)
+class JSONFixupConfig:
+    enabled: bool = False
+    model: str | None = None
+    max_chars: int = 16000
+
+    @classmethod
+    def from_env(cls) -> "JSONFixupConfig":
+        return cls(
+            enabled=os.getenv("INSIGHT2SPEC_JSON_FIXUP_ENABLED", "false").lower() in {"1", "true", "yes"},
+            model=os.getenv("INSIGHT2SPEC_JSON_FIXUP_MODEL") or None,
+            max_chars=int(os.getenv("INSIGHT2SPEC_JSON_FIXUP_MAX_CHARS", "16000")),
+        )
+
+    def applies(self, text: str) -> bool:
+        return self.enabled and len(text) <= self.max_chars
+
+
+def recover_structured_analysis(text: str, error: MalformedJSONError) -> dict[str, Any]:
+    """Repair malformed analysis output locally, or re-raise ``error`` if that does not yield a valid analysis.
+
+    Outcomes are counted in ``JSON_REPAIRS`` (``local`` or ``local_failed``).
+    """
+    repaired = repair_json(text)
+    if repaired is not None:
+        try:
+            analysis = _validate_analysis(json_codec.loads(repaired))
+        except (json.JSONDecodeError, OpenRouterParseError):
+            pass
+        else:
+            JSON_REPAIRS.inc(outcome="local")
+            return analysis
+    JSON_REPAIRS.inc(outcome="local_failed")
+    raise error
+
+
+def extract_structured_analysis(payload: Mapping[str, Any]) -> dict[str, Any]:
+    """Extract and validate a structured product analysis JSON object from assistant output.
+
+    With the whole text at hand, the outermost ``{...}`` is decoded in one
+    ``json_codec`` call and validated once. Anything that does not decode
+    cleanly that way (trailing prose with braces, a top-level array, invalid
+    fields) goes through ``IncrementalAnalysisParser``, which accepts the same
+    inputs and raises the canonical errors. Output that is not valid JSON gets
+    one local repair attempt (``recover_structured_analysis``) before the
+    ``MalformedJSONError`` is raised.
+    """
+    text = extract_assistant_text(payload)
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end > start and "[" not in text[:start]:
+        try:
+            return _validate_analysis(json_codec.loads(text[start:end + 1]))
+        except (json.JSONDecodeError, OpenRouterParseError):
+            pass
+
+    parser = IncrementalAnalysisParser()
+    try:
+        parser.feed(text)
+        return parser.finish()
+    except MalformedJSONError as error:
+        return recover_structured_analysis(text, error)
@@ -0,0 +1,284 @@
+"""Opt-in sampling profiles of single requests, written as speedscope JSON and collapsed stacks."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Mapping
+from contextlib import nullcontext
+from dataclasses import dataclass
+from types import CodeType, FrameType
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+_TRUTHY = {"1", "true", "yes"}
+
+
+@dataclass(slots=True)
+class ProfilingConfig:
+    directory: str | None = None
+    sample_rate: float = 0.0
+    header: str = "X-Insight2Spec-Profile"
+    interval_seconds: float = 0.005
+
+    @classmethod
+    def from_env(cls) -> "ProfilingConfig":
+        return cls(
+            directory=os.getenv("INSIGHT2SPEC_PROFILE_DIR") or None,
+            sample_rate=min(1.0, max(0.0, float(os.getenv("INSIGHT2SPEC_PROFILE_SAMPLE_RATE", "0")))),
+            header=os.getenv("INSIGHT2SPEC_PROFILE_HEADER", "X-Insight2Spec-Profile"),
+            interval_seconds=max(0.001, float(os.getenv("INSIGHT2SPEC_PROFILE_INTERVAL_MS", "5")) / 1000),
+        )
+
+
+class RequestProfiler:
+    """Decides which requests are profiled and hands out their profiling sessions.
+
+    Profiling is off unless ``directory`` is set; then a request is profiled
+    when it sends ``header`` with a true value, or with probability
+    ``sample_rate``. Requests that are not profiled get ``nullcontext()``.
+    """
+
+    def __init__(self, config: ProfilingConfig, *, rng: Callable[[], float] = random.random) -> None:
+        self.config = config
+        self.rng = rng
+        self.written = 0
+        self._sequence = itertools.count(1)
+
+    @classmethod
+    def from_env(cls) -> "RequestProfiler":
+        return cls(ProfilingConfig.from_env())
+
+    def profile(self, headers: Mapping[str, str], name: str) -> Any:
+        """Async context manager profiling the enclosed block if this request is selected."""
+        config = self.config
+        if config.directory is None:
+            return nullcontext()
+        requested = headers.get(config.header, "").lower() in _TRUTHY
+        if not requested and not (config.sample_rate and self.rng() < config.sample_rate):
+            return nullcontext()
+        return _ProfileSession(self, name)
+
+    def _path(self, name: str) -> str:
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        return os.path.join(self.config.directory, f"{stamp}-{name}-{os.getpid()}-{next(self._sequence)}")
+
+
+class _ProfileSession:
+    def __init__(self, profiler: RequestProfiler, name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.sampler: TaskSampler | None = None
+
+    async def __aenter__(self) -> "_ProfileSession":
+        self.sampler = TaskSampler(asyncio.current_task(), interval_seconds=self.profiler.config.interval_seconds)
+        self.sampler.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.sampler.stop()
+        path = self.profiler._path(self.name)
+        try:
+            await asyncio.to_thread(self.sampler.write, path, name=self.name)
+        except OSError:
+            logger.warning("Could not write profile %s", path, exc_info=True)
+        else:
+            self.profiler.written += 1
+            logger.info("Wrote profile %s.speedscope.json", path)
+
+
+class TaskSampler:
+    """Background thread that samples one asyncio task's stack at a fixed interval.
+
+    Wall-clock samples always count: while the task runs they are the event
+    loop thread's stack from the task's coroutine down (upstream parsing,
+    pydantic validation), and while it waits they are its chain of awaiting
+    coroutines, ending in what it awaits (an upstream call, a lock, a worker
+    thread). CPU samples are weighted by the CPU time the loop thread used
+    since the previous sample and count only while the task is running.
+    """
+
+    def __init__(self, task: asyncio.Task[Any], *, interval_seconds: float = 0.005) -> None:
+        self.task = task
+        self.loop = task.get_loop()
+        self.thread_id = threading.get_ident()
+        self.interval_seconds = interval_seconds
+        self.wall: Counter[tuple[CodeType | str, ...]] = Counter()
+        self.cpu: Counter[tuple[CodeType | str, ...]] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="insight2spec-profiler", daemon=True)
+        try:
+            self._cpu_clock = time.pthread_getcpuclockid(self.thread_id)
+        except (AttributeError, OSError):  # pragma: no cover - not available on every platform
+            self._cpu_clock = None
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _cpu_time(self) -> float | None:
+        return time.clock_gettime(self._cpu_clock) if self._cpu_clock is not None else None
+
+    def _run(self) -> None:
+        last_wall, last_cpu = time.perf_counter(), self._cpu_time()
+        while not self._stop.wait(self.interval_seconds):
+            now, cpu = time.perf_counter(), self._cpu_time()
+            stack, running = self.sample()
+            self.wall[stack] += now - last_wall
+            if running and cpu is not None:
+                self.cpu[stack] += cpu - last_cpu
+            last_wall, last_cpu = now, cpu
+
+    def sample(self) -> tuple[tuple[CodeType | str, ...], bool]:
+        """The task's current stack, outermost first, and whether it is running on the loop thread.
+
+        A task waiting on another task (a coalesced upstream call behind
+        ``asyncio.shield``, a ``gather``) continues into that task's stack.
+        """
+        stack: tuple[CodeType | str, ...] = ()
+        task: asyncio.Task[Any] | None = self.task
+        seen: set[int] = set()
+        while task is not None and id(task) not in seen:
+            seen.add(id(task))
+            coro = task.get_coro()
+            if asyncio.current_task(self.loop) is task:
+                frame = sys._current_frames().get(self.thread_id)
+                running = _thread_stack(frame, root=getattr(coro, "cr_frame", None))
+                if running:
+                    return stack + running, True
+            chain = _await_chain(coro)
+            waiter = getattr(task, "_fut_waiter", None)
+            task = _awaited_task(waiter, self.loop) if waiter is not None else None
+            if task is not None and chain and isinstance(chain[-1], str):
+                chain = chain[:-1]
+            stack += chain
+        return stack, False
+
+    def write(self, path: str, *, name: str) -> None:
+        """Write ``<path>.speedscope.json`` (wall and CPU profiles) and ``<path>.{wall,cpu}.folded``."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        frames: dict[CodeType | str, int] = {}
+        profiles = [
+            _speedscope_profile(f"{name} (wall)", self.wall, frames),
+            _speedscope_profile(f"{name} (cpu)", self.cpu, frames),
+        ]
+        document = {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "insight2spec",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [_speedscope_frame(key) for key in frames]},
+            "profiles": profiles,
+        }
+        with open(f"{path}.speedscope.json", "w", encoding="utf-8") as handle:
+            json.dump(document, handle)
+        for kind, counts in (("wall", self.wall), ("cpu", self.cpu)):
+            with open(f"{path}.{kind}.folded", "w", encoding="utf-8") as handle:
+                handle.writelines(collapsed_lines(counts))
+
+
+def _thread_stack(frame: FrameType | None, *, root: FrameType | None) -> tuple[CodeType, ...]:
+    codes: list[CodeType] = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        if frame is root:
+            break
+        frame = frame.f_back
+    else:
+        # The task's coroutine is not on the stack (the loop is between steps).
+        return ()
+    codes.reverse()
+    return tuple(codes)
+
+
+def _await_chain(awaitable: Any) -> tuple[CodeType | str, ...]:
+    chain: list[CodeType | str] = []
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "ag_frame", None)
+        frame = frame or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            chain.append(f"<await {type(awaitable).__name__}>")
+            break
+        chain.append(frame.f_code)
+        awaitable = (
+            getattr(awaitable, "cr_await", None)
+            or getattr(awaitable, "ag_await", None)
+            or getattr(awaitable, "gi_yieldfrom", None)
+        )
+    return tuple(chain)
+
+
+def _awaited_task(future: asyncio.Future[Any], loop: asyncio.AbstractEventLoop) -> asyncio.Task[Any] | None:
+    """The task whose completion resolves ``future``, when it can be told."""
+    if isinstance(future, asyncio.Task):
+        return future
+    for child in getattr(future, "_children", None) or ():  # asyncio.gather
+        if isinstance(child, asyncio.Task) and not child.done():
+            return child
+    # asyncio.shield: the inner task carries a done callback closing over the outer future.
+    for task in asyncio.all_tasks(loop):
+        for callback, _context in getattr(task, "_callbacks", None) or ():
+            cells = getattr(callback, "__closure__", None) or ()
+            if any(_cell_contents(cell) is future for cell in cells):
+                return task
+    return None
+
+
+def _cell_contents(cell: Any) -> Any:
+    try:
+        return cell.cell_contents
+    except ValueError:  # empty cell
+        return None
+
+
+def _frame_label(key: CodeType | str) -> str:
+    if isinstance(key, str):
+        return key
+    return f"{getattr(key, 'co_qualname', key.co_name)} ({os.path.basename(key.co_filename)}:{key.co_firstlineno})"
+
+
+def _speedscope_frame(key: CodeType | str) -> dict[str, Any]:
+    if isinstance(key, str):
+        return {"name": key}
+    return {"name": getattr(key, "co_qualname", key.co_name), "file": key.co_filename, "line": key.co_firstlineno}
+
+
+def _speedscope_profile(
+    name: str,
+    counts: Counter[tuple[CodeType | str, ...]],
+    frames: dict[CodeType | str, int],
+) -> dict[str, Any]:
+    samples = [[frames.setdefault(key, len(frames)) for key in stack] for stack in counts]
+    weights = list(counts.values())
+    return {
+        "type": "sampled",
+        "name": name,
+        "unit": "seconds",
+        "startValue": 0,
+        "endValue": sum(weights),
+        "samples": samples,
+        "weights": weights,
+    }
+
+
+def collapsed_lines(counts: Counter[tuple[CodeType | str, ...]]) -> list[str]:
+    """Brendan Gregg's collapsed-stack format (``a;b;c <microseconds>``), heaviest first."""
+    return [
+        f"{';'.join(_frame_label(key) for key in stack)} {round(weight * 1e6)}\n"
+        for stack, weight in counts.most_common()
+        if round(weight * 1e6) > 0
+    ]
@@ -0,0 +1,194 @@
+"""Retry, hedging and circuit-breaker policies for upstream calls."""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import random
+import time
+from collections import deque
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+Clock = Callable[[], float]
+
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in {"1", "true", "yes"}
+
+
+async def first_success(tasks: Iterable[asyncio.Future[Any]]) -> tuple[asyncio.Future[Any], Any]:
+    """Wait for the first task to succeed, cancel the rest, and return it with its result.
+
+    If every task fails, the first failure observed is raised.
+    """
+    pending = set(tasks)
+    first_error: BaseException | None = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error is None:
+                    return task, task.result()
+                first_error = first_error or error
+    finally:
+        for task in pending:
+            task.cancel()
+    raise first_error
+
+
+@dataclass(slots=True)
+class RetryPolicy:
+    """Jittered exponential backoff ("full jitter"): sleep U(0, min(max, base * 2**n))."""
+
+    max_attempts: int = 1
+    base_delay_seconds: float = 0.25
+    max_delay_seconds: float = 4.0
+    retry_statuses: frozenset[int] = RETRYABLE_STATUSES
+    rng: random.Random = field(default_factory=random.Random, repr=False)
+
+    def backoff(self, retry_number: int, *, retry_after: float | None = None) -> float:
+        if retry_after is not None:
+            return min(max(retry_after, 0.0), self.max_delay_seconds)
+        ceiling = min(self.max_delay_seconds, self.base_delay_seconds * (2**retry_number))
+        return self.rng.uniform(0.0, ceiling)
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=1 + max(0, int(os.getenv("OPENROUTER_MAX_RETRIES", "2"))),
+            base_delay_seconds=float(os.getenv("OPENROUTER_RETRY_BASE_DELAY_SECONDS", "0.25")),
+            max_delay_seconds=float(os.getenv("OPENROUTER_RETRY_MAX_DELAY_SECONDS", "4")),
+        )
+
+
+@dataclass(slots=True)
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    window: int = 200
+    _samples: deque[float] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._samples = deque(maxlen=self.window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> float | None:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+@dataclass(slots=True)
+class HedgePolicy:
+    """Fire a second attempt when the first is slower than the observed p95.
+
+    Until ``min_samples`` latencies are known, ``initial_delay_seconds`` is used.
+    """
+
+    quantile: float = 0.95
+    min_samples: int = 20
+    initial_delay_seconds: float = 2.0
+    min_delay_seconds: float = 0.05
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy | None":
+        if not _env_flag("OPENROUTER_HEDGE_ENABLED", "false"):
+            return None
+        return cls(initial_delay_seconds=float(os.getenv("OPENROUTER_HEDGE_INITIAL_DELAY_SECONDS", "2")))
+
+    def delay(self, latencies: LatencyTracker) -> float:
+        if len(latencies) < self.min_samples:
+            return self.initial_delay_seconds
+        observed = latencies.percentile(self.quantile) or self.initial_delay_seconds
+        return max(observed, self.min_delay_seconds)
+
+
+@dataclass(slots=True)
+class CircuitBreaker:
+    """Error-rate circuit breaker over the last ``window`` calls.
+
+    Opens when at least ``min_calls`` outcomes are recorded and the failure
+    rate reaches ``failure_rate_threshold``. After ``open_seconds`` one probe
+    call is let through (half-open): success closes the breaker, failure
+    re-opens it. A probe that never reports back (for example a cancelled
+    request) is replaced by a new one after another ``open_seconds``.
+    """
+
+    failure_rate_threshold: float = 0.5
+    window: int = 20
+    min_calls: int = 10
+    open_seconds: float = 30.0
+    clock: Clock = time.monotonic
+    state: str = field(default="closed", init=False)
+    opened_count: int = field(default=0, init=False)
+    short_circuited: int = field(default=0, init=False)
+    _outcomes: deque[bool] = field(init=False, repr=False)
+    _opened_at: float = field(default=0.0, init=False, repr=False)
+    _probe_started_at: float | None = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._outcomes = deque(maxlen=self.window)
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker | None":
+        if not _env_flag("OPENROUTER_BREAKER_ENABLED", "true"):
+            return None
+        return cls(
+            failure_rate_threshold=float(os.getenv("OPENROUTER_BREAKER_FAILURE_RATE", "0.5")),
+            window=int(os.getenv("OPENROUTER_BREAKER_WINDOW", "20")),
+            min_calls=int(os.getenv("OPENROUTER_BREAKER_MIN_CALLS", "10")),
+            open_seconds=float(os.getenv("OPENROUTER_BREAKER_OPEN_SECONDS", "30")),
+        )
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+
+        now = self.clock()
+        if self.state == "open" and now - self._opened_at >= self.open_seconds:
+            self.state = "half_open"
+            self._probe_started_at = None
+
+        if self.state == "half_open" and (
+            self._probe_started_at is None or now - self._probe_started_at >= self.open_seconds
+        ):
+            self._probe_started_at = now
+            return True
+
+        self.short_circuited += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state == "half_open":
+            self.state = "closed"
+            self._outcomes.clear()
+        self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        if self.state == "half_open":
+            self._open()
+            return
+
+        self._outcomes.append(False)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = "open"
+        self._opened_at = self.clock()
+        self._outcomes.clear()
+        self.opened_count += 1
+
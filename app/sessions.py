@@ -0,0 +1,203 @@
+"""Incremental analysis sessions: a growing feedback corpus and its latest analysis, in SQLite."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from app import json_codec
+
+# Digest of a session with nothing analyzed yet.
+EMPTY_DIGEST = hashlib.sha256(b"").hexdigest()
+
+
+def chain_digest(previous: str, items: Sequence[str]) -> str:
+    """Extend the digest of the analyzed items with ``items``, in order.
+
+    Each item is chained on its own, so the digest depends only on the items
+    and their order, not on how they were split across refreshes. Equal
+    digests mean the same items were analyzed.
+    """
+    digest = bytes.fromhex(previous)
+    for item in items:
+        digest = hashlib.sha256(digest + hashlib.sha256(item.encode("utf-8")).digest()).digest()
+    return digest.hex()
+
+
+@dataclass(frozen=True, slots=True)
+class SessionRecord:
+    id: str
+    context: str | None
+    item_count: int
+    analyzed_count: int
+    digest: str
+    analysis: dict[str, Any] | None
+    created_at: float
+    updated_at: float
+
+    @property
+    def pending_count(self) -> int:
+        return self.item_count - self.analyzed_count
+
+
+class SessionStore:
+    """Session rows and their feedback items in SQLite.
+
+    ``:memory:`` keeps sessions for the life of the process only; point every
+    worker at one file to share them. Sessions untouched for ``ttl_seconds``
+    are deleted when new sessions are created.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        *,
+        ttl_seconds: float = 7 * 86400.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_sessions ("
+            "id TEXT PRIMARY KEY, context TEXT, item_count INTEGER NOT NULL, analyzed_count INTEGER NOT NULL, "
+            "digest TEXT NOT NULL, analysis TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_items ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, text TEXT NOT NULL, PRIMARY KEY (session_id, seq))"
+        )
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        return cls(
+            os.getenv("INSIGHT2SPEC_SESSIONS_SQLITE_PATH") or ":memory:",
+            ttl_seconds=float(os.getenv("INSIGHT2SPEC_SESSIONS_TTL_SECONDS", "604800")),
+        )
+
+    def create(self, *, context: str | None, items: Sequence[str] = ()) -> SessionRecord:
+        self.purge_expired()
+        now = self.clock()
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO analysis_sessions "
+                    "(id, context, item_count, analyzed_count, digest, created_at, updated_at) "
+                    "VALUES (?, ?, 0, 0, ?, ?, ?)",
+                    (session_id, context, EMPTY_DIGEST, now, now),
+                )
+                self._append(session_id, 0, items, now)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return SessionRecord(session_id, context, len(items), 0, EMPTY_DIGEST, None, now, now)
+
+    def get(self, session_id: str) -> SessionRecord | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, context, item_count, analyzed_count, digest, analysis, created_at, updated_at "
+                "FROM analysis_sessions WHERE id = ?",
+                (session_id,),
+            ).fetchone()
+        return _record_from_row(row) if row is not None else None
+
+    def add_items(self, session_id: str, items: Sequence[str]) -> SessionRecord | None:
+        """Append feedback to a session; ``None`` when it does not exist."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT item_count FROM analysis_sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                if row is not None:
+                    self._append(session_id, row[0], items, self.clock())
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return self.get(session_id) if row is not None else None
+
+    def _append(self, session_id: str, start: int, items: Sequence[str], now: float) -> None:
+        self._conn.executemany(
+            "INSERT INTO session_items (session_id, seq, text) VALUES (?, ?, ?)",
+            [(session_id, start + offset, item) for offset, item in enumerate(items)],
+        )
+        self._conn.execute(
+            "UPDATE analysis_sessions SET item_count = ?, updated_at = ? WHERE id = ?",
+            (start + len(items), now, session_id),
+        )
+
+    def items(self, session_id: str, *, start: int = 0, stop: int | None = None) -> list[str]:
+        """Feedback items ``start`` (inclusive) to ``stop`` (exclusive), in the order they were added."""
+        stop = stop if stop is not None else 2**62
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text FROM session_items WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (session_id, start, stop),
+            ).fetchall()
+        return [text for (text,) in rows]
+
+    def save_analysis(
+        self,
+        session_id: str,
+        analysis: dict[str, Any],
+        *,
+        analyzed_count: int,
+        digest: str,
+        expected_digest: str,
+    ) -> bool:
+        """Store a refreshed analysis unless another refresh stored one first.
+
+        The update only applies while the session's digest is still
+        ``expected_digest``; returns whether it did.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE analysis_sessions SET analysis = ?, analyzed_count = ?, digest = ?, updated_at = ? "
+                "WHERE id = ? AND digest = ?",
+                (json_codec.dumps(analysis), analyzed_count, digest, self.clock(), session_id, expected_digest),
+            )
+        return cursor.rowcount == 1
+
+    def purge_expired(self) -> int:
+        cutoff = self.clock() - self.ttl_seconds
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM session_items WHERE session_id IN "
+                "(SELECT id FROM analysis_sessions WHERE updated_at <= ?)",
+                (cutoff,),
+            )
+            cursor = self._conn.execute("DELETE FROM analysis_sessions WHERE updated_at <= ?", (cutoff,))
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _record_from_row(row: tuple[Any, ...]) -> SessionRecord:
+    session_id, context, item_count, analyzed_count, digest, analysis, created_at, updated_at = row
+    return SessionRecord(
+        id=session_id,
+        context=context,
+        item_count=item_count,
+        analyzed_count=analyzed_count,
+        digest=digest,
+        analysis=json_codec.loads(analysis) if analysis is not None else None,
+        created_at=created_at,
+        updated_at=updated_at,
+    )
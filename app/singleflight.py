@@ -0,0 +1,147 @@
+"""Coalescing of identical concurrent upstream calls.
+
+``SingleFlight`` shares one in-flight call per key inside a worker process.
+``HostLock`` is an optional stand-in across worker processes on one host: it
+serializes a key through ``flock`` on a lock file, so that after the first
+worker finishes the others find its result in the shared cache tier.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Generic, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Run at most one call per key at a time; concurrent callers share its outcome.
+
+    The call runs as its own task, so a caller that gives up (for example a
+    disconnected client) does not cancel the work the other callers are
+    waiting on. Every caller gets the same result or the same exception.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: dict[str, asyncio.Task[T]] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def _forget(self, key: str, task: asyncio.Task[T]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Return ``func()``'s result and whether this caller joined an existing call."""
+        task = self._inflight.get(key)
+        joined = task is not None
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self.leaders += 1
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task), joined
+
+
+class HostLock:
+    """Cross-process, per-key lock built on ``flock`` over striped lock files.
+
+    Keys map to lock files by their first ``prefix_chars`` hex characters, so
+    the lock directory stays bounded (4096 files by default); unrelated keys
+    that share a file simply serialize across workers. Within one process a
+    held stripe is shared rather than locked again, so concurrent keys on one
+    stripe (map-reduce chunks, say) never wait for their own process.
+    Waiting gives up after ``timeout_seconds`` and proceeds unlocked, so a
+    stuck worker can only cost a duplicate call, never a hang. Without a
+    directory (or on hosts without ``fcntl``) it is a no-op.
+    """
+
+    def __init__(
+        self,
+        directory: str | None,
+        *,
+        timeout_seconds: float = 30.0,
+        poll_seconds: float = 0.02,
+        prefix_chars: int = 3,
+    ) -> None:
+        self.directory = directory if fcntl is not None else None
+        self.timeout_seconds = timeout_seconds
+        self.poll_seconds = poll_seconds
+        self.prefix_chars = prefix_chars
+        self.waits = 0
+        self.timeouts = 0
+        # Stripes this process holds: stripe -> [locked fd, number of holders].
+        self._held: dict[str, list[int]] = {}
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[bool]:
+        """Hold the key's lock; yields whether this worker had to wait for another."""
+        if self.directory is None:
+            yield False
+            return
+
+        stripe = key[:self.prefix_chars]
+        waited, entry = await self._acquire(stripe)
+        if waited:
+            self.waits += 1
+        try:
+            yield waited
+        finally:
+            if entry is not None:
+                self._release(stripe, entry)
+
+    async def _acquire(self, stripe: str) -> tuple[bool, list[int] | None]:
+        """Join this process's hold on ``stripe`` or ``flock`` it; ``None`` after a timeout."""
+        waited = False
+        fd: int | None = None
+        deadline = time.monotonic() + self.timeout_seconds
+        try:
+            while True:
+                entry = self._held.get(stripe)
+                if entry is not None:
+                    entry[1] += 1
+                    return waited, entry
+                if fd is None:
+                    fd = os.open(os.path.join(self.directory, f"{stripe}.lock"), os.O_CREAT | os.O_RDWR, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    waited = True
+                    if time.monotonic() >= deadline:
+                        self.timeouts += 1
+                        return waited, None
+                    await asyncio.sleep(self.poll_seconds)
+                else:
+                    entry = self._held[stripe] = [fd, 1]
+                    fd = None
+                    return waited, entry
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def _release(self, stripe: str, entry: list[int]) -> None:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._held[stripe]
+            fd = entry[0]
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
@@ -0,0 +1,126 @@
+"""External theme taxonomy for mock analysis, compiled once and hot-reloaded."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from collections.abc import Iterable, Mapping
+from pathlib import Path
+from typing import Any
+
+from app.theme_matcher import ThemeMatcher
+
+logger = logging.getLogger(__name__)
+
+
+class TaxonomyError(ValueError):
+    """Raised when a taxonomy file cannot be read or has the wrong shape."""
+
+
+def _parse_yaml(text: str) -> Any:
+    try:
+        import yaml
+    except ImportError as error:
+        raise TaxonomyError("YAML taxonomies need PyYAML installed (pip install pyyaml)") from error
+
+    try:
+        return yaml.safe_load(text)
+    except yaml.YAMLError as error:
+        raise TaxonomyError(f"Taxonomy YAML is invalid: {error}") from error
+
+
+def load_taxonomy(path: str | os.PathLike[str]) -> dict[str, tuple[str, ...]]:
+    """Load ``{theme: [keyword, ...]}`` from a JSON or YAML (``.yaml``/``.yml``) file."""
+    file_path = Path(path)
+    try:
+        text = file_path.read_text(encoding="utf-8")
+    except OSError as error:
+        raise TaxonomyError(f"Cannot read taxonomy file {file_path}: {error}") from error
+
+    if file_path.suffix.lower() in {".yaml", ".yml"}:
+        raw = _parse_yaml(text)
+    else:
+        try:
+            raw = json.loads(text)
+        except json.JSONDecodeError as error:
+            raise TaxonomyError(f"Taxonomy JSON is invalid: {error}") from error
+
+    if not isinstance(raw, Mapping) or not raw:
+        raise TaxonomyError("Taxonomy must be a non-empty mapping of theme name to keyword list")
+
+    taxonomy: dict[str, tuple[str, ...]] = {}
+    for theme, keywords in raw.items():
+        if not isinstance(theme, str) or not theme.strip():
+            raise TaxonomyError("Taxonomy theme names must be non-empty strings")
+        if not isinstance(keywords, list) or not keywords:
+            raise TaxonomyError(f"Taxonomy theme '{theme}' must have a non-empty keyword list")
+        if not all(isinstance(keyword, str) and keyword.strip() for keyword in keywords):
+            raise TaxonomyError(f"Taxonomy theme '{theme}' keywords must be non-empty strings")
+        taxonomy[theme.strip()] = tuple(keywords)
+
+    return taxonomy
+
+
+class TaxonomyStore:
+    """Holds the compiled matcher for the active taxonomy.
+
+    A reload builds the new matcher completely before replacing the reference
+    in one assignment. A request reads ``matcher`` once and keeps using that
+    object, so it never sees a half-built index, even while a reload runs in
+    another thread.
+    """
+
+    def __init__(self, path: str | None, *, default: Mapping[str, Iterable[str]]) -> None:
+        self.path = path
+        self.reloads = 0
+        self._signature: tuple[int, int] | None = None
+        if path is None:
+            self.matcher = ThemeMatcher(default)
+        else:
+            try:
+                self._signature = self._file_signature()
+            except OSError as error:
+                raise TaxonomyError(f"Cannot read taxonomy file {path}: {error}") from error
+            self.matcher = ThemeMatcher(load_taxonomy(path))
+
+    @classmethod
+    def from_env(cls, *, default: Mapping[str, Iterable[str]]) -> "TaxonomyStore":
+        return cls(os.getenv("INSIGHT2SPEC_TAXONOMY_PATH") or None, default=default)
+
+    def _file_signature(self) -> tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self) -> bool:
+        """Recompile when the file's mtime or size changed; return whether it swapped."""
+        if self.path is None:
+            return False
+
+        try:
+            signature = self._file_signature()
+        except OSError:
+            return False
+        if signature == self._signature:
+            return False
+
+        # Record the signature first so a broken edit is reported once, not on every poll.
+        self._signature = signature
+        matcher = ThemeMatcher(load_taxonomy(self.path))
+        self.matcher = matcher
+        self.reloads += 1
+        logger.info("Reloaded taxonomy from %s (%d themes)", self.path, len(matcher.themes))
+        return True
+
+    async def watch(self, interval_seconds: float) -> None:
+        """Poll the file and reload it off the event loop until cancelled.
+
+        A broken edit is logged and skipped; the previous index stays active.
+        """
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except TaxonomyError as error:
+                logger.warning("Keeping previous taxonomy: %s", error)
@@ -0,0 +1,139 @@
+"""Multi-keyword theme matcher used by mock analysis."""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+from itertools import accumulate
+
+
+@dataclass(frozen=True, slots=True)
+class ThemeMatch:
+    theme: str
+    hits: int
+    item_indexes: tuple[int, ...]
+
+
+# Up to this many keywords a plain substring scan beats the compiled trie (see
+# benchmarks/bench_taxonomy); the default taxonomy has 20.
+SCAN_MAX_KEYWORDS = 100
+
+
+def _trie_pattern(node: dict[str, dict], terminal: str) -> str:
+    """Render a keyword trie as a regex that matches the longest keyword at a position."""
+    branches = [re.escape(char) + _trie_pattern(child, terminal) for char, child in sorted(node.items()) if char != terminal]
+    if not branches:
+        return ""
+
+    body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    # A keyword ending here makes the rest optional; greedy matching still prefers the longest.
+    return f"(?:{body})?" if terminal in node else body
+
+
+class ThemeMatcher:
+    """Match every keyword of a taxonomy in one pass over each feedback item.
+
+    Keywords are compiled into a single trie-shaped regex wrapped in a lookahead,
+    so ``finditer`` reports the longest keyword starting at every position. All
+    other keywords that match at that position are prefixes of it, and are
+    resolved from a table built once here. That yields the same overlapping
+    matches as an Aho-Corasick automaton, with the scan running in the C regex
+    engine. Matching is case-insensitive substring search, like the previous
+    ``keyword in text.lower()`` check.
+
+    The compiled scan costs more than it saves on small taxonomies, so with at
+    most ``scan_max_keywords`` keywords each keyword is searched for directly
+    instead, skipping those absent from the whole request. Both give the same
+    matches.
+    """
+
+    def __init__(self, taxonomy: Mapping[str, Iterable[str]], *, scan_max_keywords: int = SCAN_MAX_KEYWORDS) -> None:
+        self.themes: tuple[str, ...] = tuple(taxonomy)
+        keyword_themes: dict[str, set[int]] = {}
+        for theme_index, keywords in enumerate(taxonomy.values()):
+            for keyword in keywords:
+                normalized = keyword.strip().lower()
+                if normalized:
+                    keyword_themes.setdefault(normalized, set()).add(theme_index)
+
+        self.keyword_count = len(keyword_themes)
+        self._pattern = None
+        if self.keyword_count <= scan_max_keywords:
+            self._keywords = tuple((keyword, tuple(sorted(themes))) for keyword, themes in keyword_themes.items())
+            return
+
+        self._keywords = ()
+        # Theme hits when the longest match at a position is this keyword: one per
+        # (keyword, theme) pair for the keyword itself and every keyword prefixing it.
+        self._themes_for_match: dict[str, tuple[int, ...]] = {}
+        for keyword in keyword_themes:
+            themes: list[int] = []
+            for end in range(1, len(keyword) + 1):
+                themes.extend(sorted(keyword_themes.get(keyword[:end], ())))
+            self._themes_for_match[keyword] = tuple(themes)
+
+        terminal = ""
+        trie: dict[str, dict] = {}
+        for keyword in keyword_themes:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[terminal] = {}
+
+        pattern = _trie_pattern(trie, terminal)
+        self._pattern = re.compile(f"(?=({pattern}))") if pattern else None
+
+    def match(self, items: Iterable[str]) -> list[ThemeMatch]:
+        """Return matched themes in taxonomy order with hit counts and item indexes."""
+        hits = [0] * len(self.themes)
+        item_indexes: list[list[int]] = [[] for _ in self.themes]
+        if self._keywords:
+            self._scan([item.lower() for item in items], hits, item_indexes)
+        elif self._pattern is None:
+            return []
+        else:
+            self._find_all(items, hits, item_indexes)
+
+        return [
+            ThemeMatch(theme=theme, hits=hits[index], item_indexes=tuple(item_indexes[index]))
+            for index, theme in enumerate(self.themes)
+            if hits[index]
+        ]
+
+    def _scan(self, lowered: list[str], hits: list[int], item_indexes: list[list[int]]) -> None:
+        # One search per keyword over the joined items; occurrences map back to items by offset.
+        blob = "\n".join(lowered)
+        starts = list(accumulate([len(text) + 1 for text in lowered], initial=0))
+
+        matched: dict[int, set[int]] = {}
+        for keyword, themes in self._keywords:
+            position = blob.find(keyword)
+            while position != -1:
+                item_index = bisect_right(starts, position) - 1
+                # Only a keyword spanning two items' text can run past the item's end.
+                if position + len(keyword) < starts[item_index + 1]:
+                    for theme_index in themes:
+                        hits[theme_index] += 1
+                    matched.setdefault(item_index, set()).update(themes)
+                position = blob.find(keyword, position + 1)
+        for item_index in sorted(matched):
+            for theme_index in matched[item_index]:
+                item_indexes[theme_index].append(item_index)
+
+    def _find_all(self, items: Iterable[str], hits: list[int], item_indexes: list[list[int]]) -> None:
+        findall = self._pattern.findall
+        themes_for_match = self._themes_for_match
+        for item_index, item in enumerate(items):
+            found = findall(item.lower())
+            if not found:
+                continue
+
+            matched: set[int] = set()
+            for keyword in found:
+                for theme_index in themes_for_match[keyword]:
+                    hits[theme_index] += 1
+                    matched.add(theme_index)
+            for theme_index in matched:
+                item_indexes[theme_index].append(item_index)
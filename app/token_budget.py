@@ -0,0 +1,114 @@
+"""Local token estimates and the per-request input budget for upstream calls."""
+
+from __future__ import annotations
+
+import os
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from app.dedup import CollapsedFeedback
+from app.openrouter_client import OpenRouterConfigError
+
+BUDGET_POLICIES = ("reject", "trim")
+
+# Chat formatting adds a few tokens per message plus a few to prime the reply.
+_TOKENS_PER_MESSAGE = 4
+_TOKENS_PER_REPLY = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: ~4 UTF-8 bytes per token.
+
+    That is ~4 characters of English prose, and scripts that need several
+    bytes per character (CJK, emoji) count as proportionally more tokens.
+    """
+    size = len(text) if text.isascii() else len(text.encode("utf-8"))
+    return (size + 3) // 4
+
+
+def estimate_chat_tokens(*messages: str) -> int:
+    """Estimated prompt tokens for a chat request made of ``messages``."""
+    return sum(estimate_tokens(message) + _TOKENS_PER_MESSAGE for message in messages) + _TOKENS_PER_REPLY
+
+
+class InputTooLargeError(Exception):
+    """Raised when a prompt's estimated input tokens exceed the budget."""
+
+    def __init__(self, message: str, *, estimated_tokens: int, max_tokens: int) -> None:
+        super().__init__(message)
+        self.estimated_tokens = estimated_tokens
+        self.max_tokens = max_tokens
+
+
+@dataclass(slots=True)
+class InputBudget:
+    max_input_tokens: int = 0
+    policy: str = "reject"
+
+    @classmethod
+    def from_env(cls) -> "InputBudget":
+        policy = os.getenv("INSIGHT2SPEC_INPUT_BUDGET_POLICY", "reject").lower()
+        if policy not in BUDGET_POLICIES:
+            raise OpenRouterConfigError(
+                f"INSIGHT2SPEC_INPUT_BUDGET_POLICY must be one of {', '.join(BUDGET_POLICIES)}"
+            )
+        return cls(max_input_tokens=int(os.getenv("INSIGHT2SPEC_MAX_INPUT_TOKENS", "0")), policy=policy)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_input_tokens > 0
+
+    @property
+    def cache_tag(self) -> str | None:
+        """Set only when the budget can change a prompt; rejected prompts are never cached."""
+        if self.enabled and self.policy == "trim":
+            return f"tb:{self.max_input_tokens}"
+        return None
+
+    def check(self, estimated_tokens: int) -> None:
+        if self.enabled and estimated_tokens > self.max_input_tokens:
+            raise InputTooLargeError(
+                f"Prompt is ~{estimated_tokens} tokens; the input budget is {self.max_input_tokens}",
+                estimated_tokens=estimated_tokens,
+                max_tokens=self.max_input_tokens,
+            )
+
+    def fit(
+        self,
+        collapsed: CollapsedFeedback,
+        *,
+        fixed_tokens: int,
+        line_tokens: Sequence[int],
+    ) -> tuple[CollapsedFeedback, int]:
+        """Return the feedback that fits the budget and how many input items were dropped.
+
+        ``fixed_tokens`` is the rest of the prompt and ``line_tokens`` the cost
+        of each group's prompt line. The ``trim`` policy keeps the most
+        reported groups (earliest first on ties) in their original order;
+        ``reject`` raises ``InputTooLargeError`` instead.
+        """
+        estimated = fixed_tokens + sum(line_tokens)
+        if not self.enabled or estimated <= self.max_input_tokens:
+            return collapsed, 0
+        if self.policy == "reject":
+            self.check(estimated)
+
+        room = self.max_input_tokens - fixed_tokens
+        ranked = sorted(range(len(collapsed.groups)), key=lambda index: -collapsed.groups[index].count)
+        kept: set[int] = set()
+        for index in ranked:
+            if line_tokens[index] <= room:
+                kept.add(index)
+                room -= line_tokens[index]
+        if not kept:
+            self.check(estimated)
+
+        groups = tuple(group for index, group in enumerate(collapsed.groups) if index in kept)
+        dropped = sum(group.count for group in collapsed.groups) - sum(group.count for group in groups)
+        trimmed = CollapsedFeedback(
+            groups=groups,
+            input_items=collapsed.input_items,
+            input_chars=collapsed.input_chars,
+            near_duplicates=collapsed.near_duplicates,
+        )
+        return trimmed, dropped
@@ -0,0 +1,93 @@
+"""Microbenchmark: per-request CPU of upstream decoding and response rendering.
+
+Run with ``PYTHONPATH=. python -m benchmarks.bench_json``.
+
+"before" reproduces the previous path: stdlib ``json`` for the completion
+body, the incremental parser (stdlib ``json`` for field values) over the
+assistant text, a validating ``AnalyzeResponse(...)``, then FastAPI's
+``response_model`` pass (validate the returned model again, serialize it,
+``json.dumps`` it). "after" is the current path: ``app.json_codec`` (orjson
+when installed) for the body and the assistant object, the parser's one
+validation pass, ``model_construct`` and one ``model_dump_json``.
+Times are CPU time per request (``time.process_time``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import timeit
+from collections.abc import Iterator
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from app import json_codec, openrouter_parser
+from app.main import AnalyzeResponse, _response_from_structured, create_app
+from app.openrouter_parser import extract_structured_analysis
+from benchmarks.bench_parser import build_completion, incremental_full
+
+
+@contextmanager
+def stdlib_field_decoding() -> Iterator[None]:
+    """Make the parser decode field values with ``json.loads``, as it did before."""
+    original = openrouter_parser.json_codec
+    openrouter_parser.json_codec = SimpleNamespace(loads=json.loads)
+    try:
+        yield
+    finally:
+        openrouter_parser.json_codec = original
+
+
+def completion_body(items_per_list: int, item_chars: int) -> bytes:
+    payload = {
+        "id": "gen-1",
+        "model": "openai/gpt-4o-mini",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": build_completion(items_per_list, item_chars)}}],
+        "usage": {"prompt_tokens": 900, "completion_tokens": 300},
+    }
+    return json.dumps(payload).encode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    route = next(route for route in create_app().routes if getattr(route, "path", None) == "/analyze")
+    field = route.response_field
+
+    def before(body: bytes) -> bytes:
+        # httpx's Response.json() is json.loads over the body.
+        result = AnalyzeResponse(mode="openrouter", **incremental_full(json.loads(body)))
+        value, _ = field.validate(result, {}, loc=("response",))
+        content = field.serialize(value, by_alias=True)
+        # JSONResponse.render
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def after(body: bytes) -> bytes:
+        result = _response_from_structured(extract_structured_analysis(json_codec.loads(body)))
+        return result.model_dump_json().encode("utf-8")
+
+    print(f"codec: {json_codec.BACKEND}")
+    print(f"{'completion':>12} {'before us':>10} {'after us':>10} {'speedup':>8}")
+    for items_per_list, item_chars in ((3, 60), (5, 120), (10, 200), (50, 400)):
+        body = completion_body(items_per_list, item_chars)
+        with stdlib_field_decoding():
+            expected = json.loads(before(body))
+        assert json.loads(after(body)) == expected
+
+        number = max(20, 2_000_000 // len(body))
+
+        def best(func) -> float:
+            timer = timeit.Timer(lambda: func(body), timer=time.process_time)
+            return min(timer.repeat(number=number, repeat=args.repeat)) / number * 1e6
+
+        with stdlib_field_decoding():
+            before_us = best(before)
+        after_us = best(after)
+        print(f"{len(body):>10}B {before_us:10.1f} {after_us:10.1f} {before_us / after_us:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Microbenchmark: structured-output extraction vs the previous regex parser.
+
+Run with ``PYTHONPATH=. python -m benchmarks.bench_parser``.
+
+The previous implementation is reproduced here (regex fence match, full
+``json.loads``, then a second walk over every list) so the comparison keeps
+working after it was removed from ``app.openrouter_parser``.
+
+Columns, per completion size (milliseconds per completion):
+
+- ``legacy`` — the previous parser
+- ``extract`` — ``extract_structured_analysis``, the entry point ``/analyze``
+  uses (one-shot decode of the outermost object, incremental parser only as
+  a fallback)
+- ``incremental`` — ``IncrementalAnalysisParser`` fed the whole text at once
+  (the fallback path on its own)
+- ``stream`` / ``legacy-stream`` — 64-char deltas through the incremental
+  parser vs reparsing the growing buffer per delta
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import timeit
+from collections.abc import Mapping
+from typing import Any
+
+from app.openrouter_parser import (
+    IncrementalAnalysisParser,
+    extract_assistant_text,
+    extract_structured_analysis,
+)
+
+
+def _legacy_coerce_string_list(value: Any) -> list[str]:
+    if not isinstance(value, list) or not value:
+        raise ValueError("must be a non-empty list")
+    normalized: list[str] = []
+    for item in value:
+        if not isinstance(item, str) or not item.strip():
+            raise ValueError("must contain non-empty strings")
+        normalized.append(item.strip())
+    return normalized
+
+
+def legacy_extract_structured_analysis(payload: Mapping[str, Any]) -> dict[str, Any]:
+    text = extract_assistant_text(payload).strip()
+    fenced_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, flags=re.DOTALL)
+    if fenced_match:
+        text = fenced_match.group(1).strip()
+    parsed = json.loads(text)
+    return {
+        "summary": parsed["summary"].strip(),
+        "themes": _legacy_coerce_string_list(parsed["themes"]),
+        "opportunities": _legacy_coerce_string_list(parsed["opportunities"]),
+        "experiments": _legacy_coerce_string_list(parsed["experiments"]),
+        "prd_outline": _legacy_coerce_string_list(parsed.get("prd_outline") or ["-"]),
+    }
+
+
+def build_completion(items_per_list: int, item_chars: int) -> str:
+    item = ("customers report that exports stall on large workspaces " * (item_chars // 56 + 1))[:item_chars]
+    lists = {
+        name: [f"{index}: {item}" for index in range(items_per_list)]
+        for name in ("themes", "opportunities", "experiments", "prd_outline")
+    }
+    return json.dumps({"summary": item, **lists}, indent=2)
+
+
+def incremental_full(payload: Mapping[str, Any]) -> dict[str, Any]:
+    parser = IncrementalAnalysisParser()
+    parser.feed(extract_assistant_text(payload))
+    return parser.finish()
+
+
+def incremental_streamed(text: str, chunk_chars: int) -> dict[str, Any]:
+    parser = IncrementalAnalysisParser()
+    for start in range(0, len(text), chunk_chars):
+        parser.feed(text[start:start + chunk_chars])
+    return parser.finish()
+
+
+def legacy_streamed(text: str, chunk_chars: int) -> dict[str, Any]:
+    """What streaming costs without an incremental parser: reparse the buffer per chunk."""
+    buffer = ""
+    result: dict[str, Any] = {}
+    for start in range(0, len(text), chunk_chars):
+        buffer += text[start:start + chunk_chars]
+        try:
+            result = legacy_extract_structured_analysis({"choices": [{"message": {"content": buffer}}]})
+        except (ValueError, KeyError):
+            continue
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chunk-chars", type=int, default=64, help="Delta size for the streamed case")
+    args = parser.parse_args()
+
+    print(
+        f"{'completion':>12} {'legacy ms':>10} {'extract ms':>11} {'x legacy':>9} "
+        f"{'incremental ms':>15} {'x legacy':>9} {'stream ms':>10} {'legacy-stream ms':>17}"
+    )
+    for items_per_list, item_chars in ((5, 80), (50, 200), (200, 400), (500, 1000)):
+        text = build_completion(items_per_list, item_chars)
+        payload = {"choices": [{"message": {"content": text}}]}
+        expected = legacy_extract_structured_analysis(payload)
+        assert extract_structured_analysis(payload) == expected
+        assert incremental_full(payload) == expected
+
+        number = max(1, 200_000 // len(text))
+
+        def best(func) -> float:
+            return min(timeit.repeat(func, number=number, repeat=args.repeat)) / number * 1000
+
+        legacy_ms = best(lambda: legacy_extract_structured_analysis(payload))
+        extract_ms = best(lambda: extract_structured_analysis(payload))
+        single_ms = best(lambda: incremental_full(payload))
+        stream_ms = best(lambda: incremental_streamed(text, args.chunk_chars))
+        # Reparsing per chunk is quadratic; only time it while it stays affordable.
+        legacy_stream = (
+            f"{best(lambda: legacy_streamed(text, args.chunk_chars)):17.3f}" if len(text) < 150_000 else f"{'skipped':>17}"
+        )
+        print(
+            f"{len(text):>10}ch {legacy_ms:10.3f} {extract_ms:11.3f} {extract_ms / legacy_ms:8.1f}x "
+            f"{single_ms:15.3f} {single_ms / legacy_ms:8.1f}x {stream_ms:10.3f} {legacy_stream}"
+        )
+
+if __name__ == "__main__":
+    main()
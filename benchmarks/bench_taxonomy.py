@@ -0,0 +1,89 @@
+"""Benchmark: per-request theme matching cost as the taxonomy grows.
+
+Run with ``PYTHONPATH=. python -m benchmarks.bench_taxonomy``.
+
+Compares the previous linear scan (every keyword of every theme checked with
+``in`` against one lowercased blob) with both ``ThemeMatcher`` strategies, the
+per-keyword scan and the compiled trie, on synthetic taxonomies of increasing
+size. The crossover between the two sets ``SCAN_MAX_KEYWORDS``. Compile time is
+reported separately because it is paid once per (re)load, not per request.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import string
+import time
+import timeit
+from collections.abc import Mapping, Sequence
+
+from app.theme_matcher import SCAN_MAX_KEYWORDS, ThemeMatcher
+
+
+def legacy_match(taxonomy: Mapping[str, Sequence[str]], items: Sequence[str]) -> list[str]:
+    feedback_blob = " ".join(items).lower()
+    return [theme for theme, keywords in taxonomy.items() if any(keyword in feedback_blob for keyword in keywords)]
+
+
+def build_taxonomy(themes: int, keywords_per_theme: int, rng: random.Random) -> dict[str, list[str]]:
+    return {
+        f"Theme {index}": ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 9))) for _ in range(keywords_per_theme)]
+        for index in range(themes)
+    }
+
+
+def build_feedback(taxonomy: Mapping[str, Sequence[str]], items: int, rng: random.Random) -> list[str]:
+    keywords = [keyword for values in taxonomy.values() for keyword in values]
+    filler = "the app works but sometimes it feels confusing when i try things".split()
+    feedback = []
+    for _ in range(items):
+        words = rng.choices(filler, k=14)
+        # Roughly one snippet in three mentions a taxonomy keyword.
+        if rng.random() < 0.33:
+            words.insert(rng.randrange(len(words)), rng.choice(keywords))
+        feedback.append(" ".join(words))
+    return feedback
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=50, help="Feedback items per request")
+    parser.add_argument("--keywords-per-theme", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(
+        f"{'themes':>7} {'keywords':>9} {'compile ms':>11} {'legacy us/req':>14} {'scan us/req':>12}"
+        f" {'trie us/req':>12} {'default':>8}"
+    )
+    for themes in (4, 10, 20, 50, 200, 500, 1000):
+        taxonomy = build_taxonomy(themes, args.keywords_per_theme, rng)
+        feedback = build_feedback(taxonomy, args.items, rng)
+
+        started = time.perf_counter()
+        trie = ThemeMatcher(taxonomy, scan_max_keywords=-1)
+        compile_ms = (time.perf_counter() - started) * 1000
+        scan = ThemeMatcher(taxonomy, scan_max_keywords=trie.keyword_count)
+
+        expected = legacy_match(taxonomy, feedback)
+        assert [match.theme for match in trie.match(feedback)] == expected
+        assert scan.match(feedback) == trie.match(feedback)
+
+        number = 200
+
+        def per_request_us(func) -> float:
+            return min(timeit.repeat(func, number=number, repeat=args.repeat)) / number * 1_000_000
+
+        legacy_us = per_request_us(lambda: legacy_match(taxonomy, feedback))
+        scan_us = per_request_us(lambda: scan.match(feedback))
+        trie_us = per_request_us(lambda: trie.match(feedback))
+        default = "scan" if trie.keyword_count <= SCAN_MAX_KEYWORDS else "trie"
+        print(
+            f"{themes:>7} {trie.keyword_count:>9} {compile_ms:>11.1f} {legacy_us:>14.1f} {scan_us:>12.1f}"
+            f" {trie_us:>12.1f} {default:>8}"
+        )
+
+if __name__ == "__main__":
+    main()
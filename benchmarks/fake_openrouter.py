@@ -0,0 +1,199 @@
+"""Local stand-in for OpenRouter's ``/chat/completions`` endpoint, for load tests.
+
+Run with ``PYTHONPATH=. python -m benchmarks.fake_openrouter --port 9100`` and
+point the service at it with ``OPENROUTER_BASE_URL=http://127.0.0.1:9100/api/v1``.
+
+Every completion is a valid structured analysis, so the service does its full
+parse and validate work. Latency, error rate and streaming pace are
+configurable; ``GET /__stats`` returns the request counters.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from collections import Counter
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+@dataclass(slots=True)
+class FakeUpstreamConfig:
+    latency_ms: float = 300.0
+    distribution: str = "lognormal"
+    # Spread: half-width fraction for ``uniform``, sigma for ``lognormal``.
+    spread: float = 0.5
+    error_rate: float = 0.0
+    error_status: int = 500
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    stream_chunks: int = 20
+    seed: int | None = None
+    rng: random.Random = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.rng = random.Random(self.seed)
+
+    def sample_latency(self) -> float:
+        """One response latency in seconds, drawn around ``latency_ms``."""
+        mean = self.latency_ms / 1000
+        if self.distribution == "fixed" or mean <= 0:
+            return max(0.0, mean)
+        if self.distribution == "uniform":
+            return self.rng.uniform(mean * (1 - self.spread), mean * (1 + self.spread))
+        if self.distribution == "exponential":
+            return self.rng.expovariate(1 / mean)
+        # Lognormal with the requested mean: a long right tail, like real LLM latencies.
+        sigma = self.spread
+        return self.rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+
+
+def build_analysis(prompt: str) -> dict[str, Any]:
+    """Deterministic analysis whose size grows (gently) with the prompt."""
+    lines = [line.strip("- ").strip() for line in prompt.splitlines() if line.startswith("- ")]
+    count = max(1, min(8, len(lines) // 5 + 1))
+    return {
+        "summary": f"Synthetic summary of {len(lines)} feedback items.",
+        "themes": [f"Theme {index + 1}" for index in range(count)],
+        "opportunities": [f"Opportunity {index + 1}: {line[:60]}" for index, line in enumerate(lines[:count])]
+        or ["Opportunity 1"],
+        "experiments": [f"Experiment {index + 1}" for index in range(count)],
+        "prd_outline": ["Problem", "Goals", "Requirements", "Metrics"],
+    }
+
+
+def _message_text(content: Any) -> str:
+    # Content is a list of parts when the prompt carries cache_control hints.
+    if isinstance(content, list):
+        return "".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+    return str(content or "")
+
+
+def _prompt_text(body: dict[str, Any]) -> str:
+    return "\n".join(_message_text(message.get("content")) for message in body.get("messages") or [])
+
+
+def _usage(prompt: str, content: str) -> dict[str, int]:
+    return {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+
+
+def create_fake_openrouter(config: FakeUpstreamConfig) -> FastAPI:
+    app = FastAPI(title="Fake OpenRouter")
+    counters: Counter[str] = Counter()
+    app.state.counters = counters
+
+    @app.head("/api/v1")
+    async def preconnect() -> JSONResponse:
+        return JSONResponse({})
+
+    @app.get("/__stats")
+    async def stats() -> dict[str, int]:
+        return dict(counters)
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counters["requests"] += 1
+        latency = config.sample_latency()
+        roll = config.rng.random()
+
+        if roll < config.rate_limit_rate:
+            counters["rate_limited"] += 1
+            await asyncio.sleep(latency / 10)
+            return JSONResponse(
+                {"error": {"message": "rate limited"}},
+                status_code=429,
+                headers={"Retry-After": str(config.retry_after_seconds)},
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            counters["errors"] += 1
+            await asyncio.sleep(latency)
+            return JSONResponse({"error": {"message": "synthetic upstream failure"}}, status_code=config.error_status)
+
+        content = json.dumps(build_analysis(_prompt_text(body)))
+        model = body.get("model", "fake/model")
+        if body.get("stream"):
+            counters["streams"] += 1
+            return StreamingResponse(
+                _stream(content, model, latency, config.stream_chunks, _usage(_prompt_text(body), content)),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(latency)
+        counters["completions"] += 1
+        return {
+            "id": f"fake-{counters['requests']}",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": _usage(_prompt_text(body), content),
+        }
+
+    return app
+
+
+async def _stream(
+    content: str, model: str, latency: float, chunks: int, usage: dict[str, int]
+) -> AsyncIterator[bytes]:
+    """SSE deltas spread evenly over ``latency``, like a model generating tokens."""
+    chunks = max(1, chunks)
+    size = max(1, -(-len(content) // chunks))
+    pause = latency / chunks
+    yield b": OPENROUTER PROCESSING\n\n"
+    for start in range(0, len(content), size):
+        await asyncio.sleep(pause)
+        event = {"model": model, "choices": [{"index": 0, "delta": {"content": content[start:start + size]}}]}
+        yield f"data: {json.dumps(event)}\n\n".encode()
+    yield f"data: {json.dumps({'model': model, 'choices': [], 'usage': usage})}\n\n".encode()
+    yield b"data: [DONE]\n\n"
+
+
+def add_upstream_arguments(parser: argparse.ArgumentParser) -> None:
+    """Fake-upstream options, shared with ``benchmarks.load_test``."""
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="mean upstream latency (default: 300)")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument(
+        "--latency-spread", type=float, default=0.5, help="uniform half-width fraction or lognormal sigma"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered 429 + Retry-After")
+    parser.add_argument("--stream-chunks", type=int, default=20, help="SSE deltas per streamed completion")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def upstream_config(args: argparse.Namespace) -> FakeUpstreamConfig:
+    return FakeUpstreamConfig(
+        latency_ms=args.latency_ms,
+        distribution=args.latency_dist,
+        spread=args.latency_spread,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        rate_limit_rate=args.rate_limit_rate,
+        stream_chunks=args.stream_chunks,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_fake_openrouter(upstream_config(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
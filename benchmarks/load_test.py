@@ -0,0 +1,456 @@
+"""Load test: drive the service against a local fake OpenRouter and record latency, throughput and memory.
+
+Run with ``PYTHONPATH=. python -m benchmarks.load_test --output bench/load.json``.
+
+By default it starts ``benchmarks.fake_openrouter`` and ``uvicorn app.main:app``
+(``--workers`` processes, ``openrouter`` mode) as subprocesses on free ports,
+then runs each scenario at each concurrency level. ``--target`` drives an
+already running service instead (memory is then not sampled). Results are
+written as JSON; ``--compare`` prints throughput and p95 changes against an
+earlier results file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from collections.abc import Iterator, Sequence
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+import httpx
+
+from benchmarks.fake_openrouter import add_upstream_arguments
+
+SCENARIOS = ("analyze", "batch", "stream", "ndjson")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@dataclass(slots=True)
+class LevelResult:
+    scenario: str
+    concurrency: int
+    requests: int = 0
+    errors: int = 0
+    status_codes: dict[str, int] = field(default_factory=dict)
+    wall_seconds: float = 0.0
+    throughput_rps: float = 0.0
+    latency_ms: dict[str, float] = field(default_factory=dict)
+    first_byte_ms: dict[str, float] = field(default_factory=dict)
+    upstream_requests: int | None = None
+    memory_mb: dict[str, dict[str, float]] = field(default_factory=dict)
+
+
+def percentile(ordered: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def latency_summary(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    summary = {f"p{int(q * 100)}": percentile(ordered, q) * 1000 for q in (0.50, 0.95, 0.99)}
+    summary["max"] = (ordered[-1] if ordered else 0.0) * 1000
+    summary["mean"] = (sum(ordered) / len(ordered) if ordered else 0.0) * 1000
+    return {name: round(value, 2) for name, value in summary.items()}
+
+
+# --- request bodies -----------------------------------------------------------------------------------
+
+
+class BodyFactory:
+    """Request bodies with unique feedback, except a ``repeat_ratio`` share drawn from a small fixed pool.
+
+    Unique bodies miss the result cache; repeated ones exercise caching and coalescing.
+    """
+
+    def __init__(self, *, items: int, repeat_ratio: float, pool_size: int = 8) -> None:
+        self.items = items
+        self.repeat_ratio = repeat_ratio
+        self.pool_size = pool_size
+        # Unique bodies must also differ from earlier runs against a long-lived --target.
+        self._run = f"{os.getpid()}-{time.time_ns()}"
+        self._counter = 0
+
+    def feedback(self) -> list[str]:
+        self._counter += 1
+        # A deterministic share of requests (no RNG), so runs are comparable.
+        if self.repeat_ratio and (self._counter * self.repeat_ratio) % 1 < self.repeat_ratio:
+            seed = f"pool-{self._counter % self.pool_size}"
+        else:
+            seed = f"req-{self._run}-{self._counter}"
+        return [
+            f"{seed} item {index}: exports stall on large workspaces and the pricing page is confusing"
+            for index in range(self.items)
+        ]
+
+    def analyze(self) -> dict[str, Any]:
+        return {"feedback": self.feedback()}
+
+    def batch(self, size: int) -> dict[str, Any]:
+        return {"items": [self.analyze() for _ in range(size)]}
+
+    def ndjson(self, lines: int) -> bytes:
+        snippets = [text for _ in range(max(1, lines // self.items)) for text in self.feedback()]
+        return "\n".join(json.dumps(text) for text in snippets).encode()
+
+
+# --- process management -------------------------------------------------------------------------------
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def process_tree(root: int) -> list[int]:
+    """``root`` and its descendants (Linux ``/proc``; just ``root`` elsewhere)."""
+    if not os.path.isdir("/proc"):
+        return [root]
+    parents: dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii", errors="replace") as handle:
+                # The command name may contain spaces; fields resume after the last ')'.
+                parents[int(entry)] = int(handle.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree = [root]
+    for pid in tree:
+        tree.extend(child for child, parent in parents.items() if parent == pid)
+    return tree
+
+
+def rss_bytes(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/statm", encoding="ascii") as handle:
+            return int(handle.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class MemorySampler:
+    """Samples RSS of every service process in the background; keeps peak and last value."""
+
+    def __init__(self, root: int | None, interval: float = 0.25) -> None:
+        self.root = root
+        self.interval = interval
+        self.peak: dict[int, int] = {}
+        self.last: dict[int, int] = {}
+
+    def sample(self) -> None:
+        if self.root is None:
+            return
+        for pid in process_tree(self.root):
+            rss = rss_bytes(pid)
+            if rss is not None:
+                self.peak[pid] = max(self.peak.get(pid, 0), rss)
+                self.last[pid] = rss
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.to_thread(self.sample)
+            await asyncio.sleep(self.interval)
+
+    def report(self) -> dict[str, dict[str, float]]:
+        mb = 1024 * 1024
+        return {
+            str(pid): {"rss_peak_mb": round(self.peak[pid] / mb, 1), "rss_end_mb": round(self.last[pid] / mb, 1)}
+            for pid in sorted(self.peak)
+        }
+
+
+@contextlib.contextmanager
+def local_stack(args: argparse.Namespace) -> Iterator[tuple[str, str, int]]:
+    """Start the fake upstream and the service; yield ``(service_url, upstream_url, service_pid)``."""
+    upstream_port, service_port = free_port(), free_port()
+    upstream_cmd = [
+        sys.executable, "-m", "benchmarks.fake_openrouter", "--port", str(upstream_port),
+        "--latency-ms", str(args.latency_ms), "--latency-dist", args.latency_dist,
+        "--latency-spread", str(args.latency_spread), "--error-rate", str(args.error_rate),
+        "--error-status", str(args.error_status), "--rate-limit-rate", str(args.rate_limit_rate),
+        "--stream-chunks", str(args.stream_chunks),
+    ]  # fmt: skip
+    if args.seed is not None:
+        upstream_cmd += ["--seed", str(args.seed)]
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])),
+        "INSIGHT2SPEC_ANALYZE_MODE": "openrouter",
+        "OPENROUTER_API_KEY": os.environ.get("OPENROUTER_API_KEY", "load-test"),
+        "OPENROUTER_BASE_URL": f"{upstream_url}/api/v1",
+    }
+    for assignment in args.env:
+        name, _, value = assignment.partition("=")
+        env[name] = value
+    service_cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(service_port),
+        "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+    ]  # fmt: skip
+
+    processes: list[subprocess.Popen[bytes]] = []
+    try:
+        processes.append(subprocess.Popen(upstream_cmd, env=env))
+        wait_until_up(f"{upstream_url}/__stats")
+        processes.append(subprocess.Popen(service_cmd, env=env))
+        service_url = f"http://127.0.0.1:{service_port}"
+        wait_until_up(f"{service_url}/health")
+        yield service_url, upstream_url, processes[-1].pid
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+# --- scenarios ----------------------------------------------------------------------------------------
+
+
+def make_sender(scenario: str, bodies: BodyFactory, args: argparse.Namespace):
+    """Return ``async send(client) -> (status_code, first_byte_seconds | None)``."""
+
+    async def analyze(client: httpx.AsyncClient) -> tuple[int, float | None]:
+        response = await client.post("/analyze", json=bodies.analyze())
+        return response.status_code, None
+
+    async def batch(client: httpx.AsyncClient) -> tuple[int, float | None]:
+        response = await client.post("/analyze/batch", json=bodies.batch(args.batch_size))
+        if response.status_code == 200 and any(item["error"] for item in response.json()["results"]):
+            return 207, None
+        return response.status_code, None
+
+    async def stream(client: httpx.AsyncClient) -> tuple[int, float | None]:
+        started = time.perf_counter()
+        first_byte = None
+        async with client.stream("POST", "/analyze/stream", json=bodies.analyze()) as response:
+            status = response.status_code
+            async for line in response.aiter_lines():
+                if first_byte is None and line.startswith("event:"):
+                    first_byte = time.perf_counter() - started
+                if line == "event: error":
+                    status = 599
+        return status, first_byte
+
+    async def ndjson(client: httpx.AsyncClient) -> tuple[int, float | None]:
+        started = time.perf_counter()
+        first_byte = None
+        status = 0
+        async with client.stream("POST", "/analyze/ndjson", content=bodies.ndjson(args.ndjson_lines)) as response:
+            status = response.status_code
+            async for line in response.aiter_lines():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+                if line and json.loads(line).get("error"):
+                    status = 207
+        return status, first_byte
+
+    return {"analyze": analyze, "batch": batch, "stream": stream, "ndjson": ndjson}[scenario]
+
+
+async def _upstream_requests(upstream_url: str | None) -> int | None:
+    if upstream_url is None:
+        return None
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"{upstream_url}/__stats")).json().get("requests", 0)
+
+
+async def run_level(
+    service_url: str,
+    upstream_url: str | None,
+    service_pid: int | None,
+    scenario: str,
+    concurrency: int,
+    bodies: BodyFactory,
+    args: argparse.Namespace,
+) -> LevelResult:
+    result = LevelResult(scenario=scenario, concurrency=concurrency)
+    send = make_sender(scenario, bodies, args)
+    latencies: list[float] = []
+    first_bytes: list[float] = []
+    statuses: Counter[str] = Counter()
+    total = args.requests
+    issued = 0
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=service_url, timeout=args.timeout, limits=limits) as client:
+        for _ in range(args.warmup):
+            await send(client)
+
+        def next_request() -> bool:
+            nonlocal issued
+            if deadline is not None:
+                return time.perf_counter() < deadline
+            issued += 1
+            return issued <= total
+
+        async def user() -> None:
+            while next_request():
+                started = time.perf_counter()
+                try:
+                    status, first_byte = await send(client)
+                except httpx.HTTPError as error:
+                    status, first_byte = type(error).__name__, None
+                latencies.append(time.perf_counter() - started)
+                if first_byte is not None:
+                    first_bytes.append(first_byte)
+                statuses[str(status)] += 1
+
+        upstream_before = await _upstream_requests(upstream_url)
+        sampler = MemorySampler(service_pid)
+        sampling = asyncio.create_task(sampler.run())
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(user() for _ in range(concurrency)))
+        finally:
+            result.wall_seconds = round(time.perf_counter() - started, 3)
+            sampling.cancel()
+        sampler.sample()
+        upstream_after = await _upstream_requests(upstream_url)
+
+    result.requests = len(latencies)
+    result.status_codes = dict(sorted(statuses.items()))
+    result.errors = sum(count for status, count in statuses.items() if status != "200")
+    result.throughput_rps = round(result.requests / result.wall_seconds, 2) if result.wall_seconds else 0.0
+    result.latency_ms = latency_summary(latencies)
+    result.first_byte_ms = latency_summary(first_bytes) if first_bytes else {}
+    if upstream_before is not None and upstream_after is not None:
+        result.upstream_requests = upstream_after - upstream_before
+    result.memory_mb = sampler.report()
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format_row(result: LevelResult) -> str:
+    memory = ", ".join(f"{values['rss_peak_mb']:.0f}" for values in result.memory_mb.values()) or "-"
+    return (
+        f"{result.scenario:>8} {result.concurrency:>5} {result.requests:>7} {result.errors:>6} "
+        f"{result.throughput_rps:>8.1f} {result.latency_ms['p50']:>8.1f} {result.latency_ms['p95']:>8.1f} "
+        f"{result.latency_ms['p99']:>8.1f} {'-' if result.upstream_requests is None else result.upstream_requests:>9}  {memory}"
+    )
+
+
+def compare(results: list[dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as handle:
+        baseline = {(row["scenario"], row["concurrency"]): row for row in json.load(handle)["results"]}
+    print(f"\nvs {baseline_path}")
+    print(f"{'scenario':>8} {'conc':>5} {'rps':>16} {'p95 ms':>18}")
+    for row in results:
+        before = baseline.get((row["scenario"], row["concurrency"]))
+        if before is None:
+            continue
+
+        def change(new: float, old: float) -> str:
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+        rps = change(row["throughput_rps"], before["throughput_rps"])
+        p95 = change(row["latency_ms"]["p95"], before["latency_ms"]["p95"])
+        print(f"{row['scenario']:>8} {row['concurrency']:>5} {rps:>16} {p95:>18}")
+
+
+async def run(
+    args: argparse.Namespace, service_url: str, upstream_url: str | None, pid: int | None
+) -> list[LevelResult]:
+    print(
+        f"{'scenario':>8} {'conc':>5} {'reqs':>7} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'upstream':>9}  peak RSS MB per process"
+    )
+    # One factory for the whole run, so no level is served from an earlier level's cache entries.
+    bodies = BodyFactory(items=args.feedback_items, repeat_ratio=args.repeat_ratio)
+    results = []
+    for scenario in args.scenario:
+        for concurrency in args.concurrency:
+            result = await run_level(service_url, upstream_url, pid, scenario, concurrency, bodies, args)
+            print(_format_row(result), flush=True)
+            results.append(result)
+    return results
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="repeatable (default: analyze)")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32], help="comma-separated (default: 1,8,32)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per level (default: 200)")
+    parser.add_argument("--duration", type=float, default=0.0, help="seconds per level; overrides --requests")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests before each level")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request")
+    parser.add_argument("--feedback-items", type=int, default=10, help="feedback items per analysis")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="share of repeated (cacheable) bodies")
+    parser.add_argument("--batch-size", type=int, default=10, help="items per /analyze/batch request")
+    parser.add_argument("--ndjson-lines", type=int, default=200, help="lines per /analyze/ndjson request")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra service env var")
+    parser.add_argument("--target", help="URL of a running service (skips the local stack)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier --output file to compare against")
+    add_upstream_arguments(parser)
+    args = parser.parse_args(argv)
+    args.scenario = args.scenario or ["analyze"]
+
+    if args.target:
+        results = asyncio.run(run(args, args.target.rstrip("/"), None, None))
+    else:
+        with local_stack(args) as (service_url, upstream_url, pid):
+            results = asyncio.run(run(args, service_url, upstream_url, pid))
+
+    rows = [asdict(result) for result in results]
+    if args.output:
+        document = {
+            "commit": _git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "settings": {name: value for name, value in vars(args).items() if name not in {"output", "compare"}},
+            "results": rows,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(document, handle, indent=2)
+            handle.write("\n")
+    if args.compare:
+        compare(rows, args.compare)
+
+
+if __name__ == "__main__":
+    main()
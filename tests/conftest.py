@@ -0,0 +1,57 @@
+import json
+from collections.abc import Callable
+
+import pytest
+
+_ANALYSIS = {"summary": "S", "themes": ["A"], "opportunities": ["O"], "experiments": ["E"], "prd_outline": ["P"]}
+
+
+@pytest.fixture
+def completion() -> Callable[[str], dict]:
+    """Build an OpenRouter chat completion payload whose assistant message is ``content``."""
+
+    def build(content: str) -> dict:
+        return {"choices": [{"message": {"content": content}}]}
+
+    return build
+
+
+@pytest.fixture
+def analysis_completion(completion) -> Callable[[str], dict]:
+    """Build a completion carrying a valid structured analysis with the given ``summary``."""
+
+    def build(summary: str) -> dict:
+        return completion(json.dumps({**_ANALYSIS, "summary": summary}))
+
+    return build
+
+
+@pytest.fixture
+def capturing_client(monkeypatch, completion) -> Callable[..., list[dict]]:
+    """Switch the app to ``openrouter`` mode with a fake client that records its calls.
+
+    Every call answers with ``content`` (a valid analysis by default) and, if
+    given, ``usage``. Returns the list of each call's keyword arguments.
+    """
+
+    def install(content: dict | None = None, *, usage: dict | None = None) -> list[dict]:
+        monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+        monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+        calls: list[dict] = []
+        payload = completion(json.dumps(content or _ANALYSIS))
+        if usage is not None:
+            payload["usage"] = usage
+
+        class CapturingClient:
+            @classmethod
+            def from_env(cls):
+                return cls()
+
+            async def complete_json(self, **kwargs):
+                calls.append(kwargs)
+                return payload
+
+        monkeypatch.setattr("app.main.AsyncOpenRouterClient", CapturingClient)
+        return calls
+
+    return install
@@ -0,0 +1,203 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.admission import ConcurrencyLimiter, OverloadedError, RateLimitedError, TenantRateLimiter
+from app.main import create_app
+from app.openrouter_client import AsyncOpenRouterClient, OpenRouterDeadlineError
+from app.resilience import CircuitBreaker
+
+_CONTENT = {"summary": "S", "themes": ["A"], "opportunities": ["O"], "experiments": ["E"]}
+
+
+def test_rate_limiter_refills_per_tenant() -> None:
+    now = 0.0
+    limiter = TenantRateLimiter(rate_per_second=2.0, burst=2, clock=lambda: now)
+
+    limiter.check("a")
+    limiter.check("a")
+    with pytest.raises(RateLimitedError) as raised:
+        limiter.check("a")
+    limiter.check("b")
+
+    assert raised.value.retry_after == pytest.approx(0.5)
+    now = 0.5
+    limiter.check("a")
+    assert limiter.limited == 1
+
+
+def test_concurrency_limiter_queues_in_order_and_sheds() -> None:
+    async def run() -> None:
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queued=1)
+        order: list[str] = []
+        await limiter.acquire()
+
+        async def waiter(name: str) -> None:
+            await limiter.acquire()
+            order.append(name)
+
+        queued = asyncio.create_task(waiter("queued"))
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError, match="already waiting"):
+            await limiter.acquire()
+
+        limiter.release(1.0)
+        await queued
+        assert order == ["queued"]
+        assert limiter.active == 1
+
+        # One caller ahead with ~1s calls: a 0.5s deadline cannot be met.
+        with pytest.raises(OverloadedError, match="deadline"):
+            await limiter.acquire(deadline_seconds=0.5)
+        assert limiter.shed == 2
+        assert limiter.queued == 0
+
+    asyncio.run(run())
+
+
+def test_concurrency_limiter_gives_up_at_the_deadline() -> None:
+    async def run() -> None:
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queued=4)
+        await limiter.acquire()
+
+        with pytest.raises(OverloadedError, match="while waiting"):
+            await limiter.acquire(deadline_seconds=0.01)
+
+        assert limiter.queued == 0
+        limiter.release(0.1)
+        assert limiter.active == 0
+
+    asyncio.run(run())
+
+
+def test_client_spends_budget_and_deadline_timeouts_spare_the_breaker() -> None:
+    timeouts: list[float] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        timeouts.append(request.extensions["timeout"]["read"])
+        raise httpx.ReadTimeout("slow", request=request)
+
+    breaker = CircuitBreaker(min_calls=1)
+    client = AsyncOpenRouterClient(
+        api_key="k", timeout_seconds=20.0, transport=httpx.MockTransport(handler), breaker=breaker
+    )
+
+    async def run() -> None:
+        try:
+            await client.complete_json(model="m", system_prompt="s", user_prompt="u", timeout_seconds=0.5)
+        finally:
+            await client.aclose()
+
+    with pytest.raises(OpenRouterDeadlineError):
+        asyncio.run(run())
+    assert 0.4 < timeouts[0] <= 0.5
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_rate_limited_requests_get_429_with_retry_after(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_RATE_LIMIT_PER_SECOND", "0.5")
+    monkeypatch.setenv("INSIGHT2SPEC_RATE_LIMIT_BURST", "1")
+    client = TestClient(create_app())
+
+    assert client.post("/analyze", json={"feedback": ["one"]}, headers={"X-API-Key": "a"}).status_code == 200
+    limited = client.post("/analyze", json={"feedback": ["two"]}, headers={"X-API-Key": "a"})
+    other_tenant = client.post("/analyze", json={"feedback": ["two"]}, headers={"X-API-Key": "b"})
+
+    assert limited.status_code == 429
+    assert limited.json()["detail"]["code"] == "rate_limited"
+    assert limited.headers["Retry-After"] == "2"
+    assert other_tenant.status_code == 200
+    assert client.get("/stats").json()["admission"]["rate_limited"] == 1
+
+
+def _slow_client(monkeypatch, seen: list, delay: float = 0.0):
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    class SlowClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            seen.append(kwargs["timeout_seconds"])
+            await asyncio.sleep(delay)
+            return {"choices": [{"message": {"content": json.dumps(_CONTENT)}}]}
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", SlowClient)
+
+
+def test_deadline_header_sets_upstream_budget(monkeypatch) -> None:
+    # A coalesced call is shared by requests with different deadlines, so it runs without one.
+    monkeypatch.setenv("INSIGHT2SPEC_COALESCE_ENABLED", "false")
+    seen: list = []
+    _slow_client(monkeypatch, seen)
+    client = TestClient(create_app())
+
+    client.post("/analyze", json={"feedback": ["with deadline"]}, headers={"X-Request-Timeout-Ms": "1500"})
+    client.post("/analyze", json={"feedback": ["without deadline"]})
+
+    assert 1.0 < seen[0] <= 1.5
+    assert seen[1] is None
+
+
+def test_expired_deadline_returns_504(monkeypatch) -> None:
+    seen: list = []
+    _slow_client(monkeypatch, seen, delay=1.0)
+
+    response = TestClient(create_app()).post(
+        "/analyze", json={"feedback": ["too slow"]}, headers={"X-Request-Timeout-Ms": "50"}
+    )
+
+    assert response.status_code == 504
+    assert response.json()["detail"]["code"] == "deadline_exceeded"
+
+
+def test_saturated_upstream_sheds_with_503(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_MAX_CONCURRENT_UPSTREAM", "1")
+    monkeypatch.setenv("INSIGHT2SPEC_MAX_QUEUED_UPSTREAM", "0")
+    seen: list = []
+    _slow_client(monkeypatch, seen, delay=0.1)
+    app = create_app()
+
+    async def run() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(client.post("/analyze", json={"feedback": [f"item {index}"]}) for index in range(2))
+            )
+
+    responses = asyncio.run(run())
+
+    assert sorted(response.status_code for response in responses) == [200, 503]
+    shed = next(response for response in responses if response.status_code == 503)
+    assert shed.json()["detail"]["code"] == "server_overloaded"
+    assert "Retry-After" in shed.headers
+
+
+def test_coalesced_requests_keep_their_own_deadlines(monkeypatch) -> None:
+    seen: list = []
+    _slow_client(monkeypatch, seen, delay=0.3)
+    app = create_app()
+
+    async def run() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            tight = asyncio.create_task(
+                client.post("/analyze", json={"feedback": ["shared"]}, headers={"X-Request-Timeout-Ms": "150"})
+            )
+            await asyncio.sleep(0.05)
+            relaxed = client.post("/analyze", json={"feedback": ["shared"]})
+            return list(await asyncio.gather(tight, relaxed))
+
+    tight, relaxed = asyncio.run(run())
+
+    assert tight.status_code == 504
+    assert tight.json()["detail"]["code"] == "deadline_exceeded"
+    assert relaxed.status_code == 200
+    # One shared upstream call, made without the first caller's deadline.
+    assert seen == [None]
@@ -17,6 +17,7 @@ def test_analyze_defaults_to_mock_mode() -> None:
     body = response.json()
     assert body["mode"] == "mock"
     assert "Onboarding Friction" in body["themes"]
+    assert body["metadata"]["theme_hits"] == [{"theme": "Onboarding Friction", "hits": 1, "item_indexes": [0]}]
 
 
 def test_analyze_openrouter_mode_uses_provider_when_available(monkeypatch) -> None:
@@ -28,7 +29,7 @@ def test_analyze_openrouter_mode_uses_provider_when_available(monkeypatch) -> No
         def from_env(cls):
             return cls()
 
-        def complete_json(self, **kwargs):
+        async def complete_json(self, **kwargs):
             return {
                 "choices": [
                     {
@@ -45,7 +46,7 @@ def test_analyze_openrouter_mode_uses_provider_when_available(monkeypatch) -> No
                 ]
             }
 
-    monkeypatch.setattr("app.main.OpenRouterClient", FakeClient)
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", FakeClient)
 
     client = TestClient(create_app())
     response = client.post("/analyze", json={"feedback": ["app crashes often"]})
@@ -79,10 +80,10 @@ def test_analyze_openrouter_mode_returns_explicit_timeout_error(monkeypatch) ->
         def from_env(cls):
             return cls()
 
-        def complete_json(self, **kwargs):
+        async def complete_json(self, **kwargs):
             raise OpenRouterTimeoutError("timed out")
 
-    monkeypatch.setattr("app.main.OpenRouterClient", TimeoutClient)
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", TimeoutClient)
 
     client = TestClient(create_app())
     response = client.post("/analyze", json={"feedback": ["app crashes often"]})
@@ -111,10 +112,10 @@ def test_analyze_openrouter_mode_rejects_contract_drift(monkeypatch, provider_co
         def from_env(cls):
             return cls()
 
-        def complete_json(self, **kwargs):
+        async def complete_json(self, **kwargs):
             return {"choices": [{"message": {"content": provider_content}}]}
 
-    monkeypatch.setattr("app.main.OpenRouterClient", DriftClient)
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", DriftClient)
 
     client = TestClient(create_app())
     response = client.post("/analyze", json={"feedback": ["app crashes often"]})
@@ -135,3 +136,208 @@ def test_analyze_openapi_documents_error_responses() -> None:
 
     error_schema_ref = responses["500"]["content"]["application/json"]["schema"]["$ref"]
     assert error_schema_ref == "#/components/schemas/ErrorResponse"
+
+
+def test_analyze_openrouter_mode_reuses_one_client_across_requests(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    built: list[object] = []
+    closed: list[object] = []
+
+    class PooledClient:
+        @classmethod
+        def from_env(cls):
+            client = cls()
+            built.append(client)
+            return client
+
+        async def complete_json(self, **kwargs):
+            return {
+                "choices": [
+                    {
+                        "message": {
+                            "content": (
+                                '{"summary":"Pooled","themes":["A"],"opportunities":["B"],'
+                                '"experiments":["C"],"prd_outline":["D"]}'
+                            )
+                        }
+                    }
+                ]
+            }
+
+        async def aclose(self):
+            closed.append(self)
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", PooledClient)
+
+    with TestClient(create_app()) as client:
+        for _ in range(3):
+            assert client.post("/analyze", json={"feedback": ["x"]}).status_code == 200
+
+    assert len(built) == 1
+    assert closed == built
+
+
+def test_analyze_openrouter_mode_serves_repeats_from_cache(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    calls: list[dict] = []
+
+    class CountingClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            calls.append(kwargs)
+            return {
+                "choices": [
+                    {
+                        "message": {
+                            "content": (
+                                '{"summary":"Cached","themes":["A"],"opportunities":["B"],'
+                                '"experiments":["C"],"prd_outline":["D"]}'
+                            )
+                        }
+                    }
+                ]
+            }
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", CountingClient)
+
+    client = TestClient(create_app())
+    first = client.post("/analyze", json={"feedback": ["app crashes often"]})
+    second = client.post("/analyze", json={"feedback": ["app  crashes often "]})
+
+    assert first.headers["X-Insight2Spec-Cache"] == "miss"
+    assert second.headers["X-Insight2Spec-Cache"] == "hit"
+    expected = first.json()
+    assert second.json() == {**expected, "metadata": {**expected["metadata"], "usage": None}}
+    assert len(calls) == 1
+
+
+def test_analyze_openrouter_mode_fixes_unrepairable_json_with_a_short_call(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("INSIGHT2SPEC_JSON_FIXUP_ENABLED", "true")
+    monkeypatch.setenv("INSIGHT2SPEC_JSON_FIXUP_MODEL", "cheap/model")
+    broken = '{"summary": "S", "themes": <A>, "opportunities": ["O"], "experiments": ["E"]}'
+    calls: list[dict] = []
+
+    class BrokenJSONClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                return {"choices": [{"message": {"content": broken}}]}
+            return {"choices": [{"message": {"content": broken.replace("<A>", '["A"]')}}]}
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", BrokenJSONClient)
+
+    response = TestClient(create_app()).post("/analyze", json={"feedback": ["app crashes often"]})
+
+    assert response.status_code == 200
+    assert response.json()["themes"] == ["A"]
+    assert calls[1]["model"] == "cheap/model"
+    assert calls[1]["user_prompt"] == broken
+    assert calls[1]["max_tokens"] < 150
+
+
+def test_analyze_openrouter_mode_without_fixup_reports_the_parse_error(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.delenv("INSIGHT2SPEC_JSON_FIXUP_ENABLED", raising=False)
+    calls: list[dict] = []
+
+    class BrokenJSONClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            calls.append(kwargs)
+            return {"choices": [{"message": {"content": '{"summary": "S", "themes": <A>}'}}]}
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", BrokenJSONClient)
+
+    response = TestClient(create_app()).post("/analyze", json={"feedback": ["app crashes often"]})
+
+    assert response.status_code == 502
+    assert response.json()["detail"]["code"] == "openrouter_parse_error"
+    assert len(calls) == 1
+
+
+def test_analyze_openrouter_mode_answers_matching_etags_without_an_upstream_call(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    calls: list[dict] = []
+
+    class CountingClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            calls.append(kwargs)
+            return {
+                "choices": [
+                    {"message": {"content": '{"summary":"S","themes":["A"],"opportunities":["O"],"experiments":["E"]}'}}
+                ]
+            }
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", CountingClient)
+    client = TestClient(create_app())
+
+    first = client.post("/analyze", json={"feedback": ["app crashes often"]})
+    etag = first.headers["ETag"]
+    # Another worker (empty cache) and a whitespace variant of the same input.
+    other = TestClient(create_app())
+    repeat = other.post("/analyze", json={"feedback": ["app  crashes often "]}, headers={"If-None-Match": etag})
+    changed = other.post("/analyze", json={"feedback": ["app is slow"]}, headers={"If-None-Match": etag})
+
+    assert etag.startswith('W/"')
+    assert repeat.status_code == 304
+    assert repeat.headers["ETag"] == etag
+    assert repeat.content == b""
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(calls) == 2
+
+
+def test_analyze_mock_mode_etag_is_a_body_hash() -> None:
+    os.environ.pop("INSIGHT2SPEC_ANALYZE_MODE", None)
+    client = TestClient(create_app())
+    payload = {"feedback": ["onboarding is confusing"]}
+
+    etag = client.post("/analyze", json=payload).headers["ETag"]
+    response = client.post("/analyze", json=payload, headers={"If-None-Match": f'"other", {etag}'})
+
+    assert response.status_code == 304
+
+
+def test_analyze_openrouter_mode_validates_the_analysis_once(monkeypatch, analysis_completion) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    class FakeClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            return analysis_completion("Parsed once")
+
+    def validate_again(self, **data):
+        raise AssertionError("the parser already validated this analysis")
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", FakeClient)
+    monkeypatch.setattr("app.main.AnalyzeResponse.__init__", validate_again)
+
+    client = TestClient(create_app())
+    response = client.post("/analyze", json={"feedback": ["app crashes often"]})
+
+    assert response.status_code == 200
+    assert response.json()["summary"] == "Parsed once"
@@ -0,0 +1,68 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.openrouter_client import OpenRouterTimeoutError
+
+
+def test_batch_mock_mode_returns_results_in_order(monkeypatch) -> None:
+    monkeypatch.delenv("INSIGHT2SPEC_ANALYZE_MODE", raising=False)
+    client = TestClient(create_app())
+
+    response = client.post(
+        "/analyze/batch",
+        json={"items": [{"feedback": ["pricing is confusing"]}, {"feedback": ["app crashes"]}]},
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["index"] for item in results] == [0, 1]
+    assert "Pricing Confusion" in results[0]["result"]["themes"]
+    assert "Reliability Issues" in results[1]["result"]["themes"]
+
+
+def test_batch_openrouter_mode_isolates_failures_and_caps_concurrency(monkeypatch, analysis_completion) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("INSIGHT2SPEC_BATCH_CONCURRENCY", "2")
+    in_flight = 0
+    peak = 0
+
+    class FanOutClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            if "boom" in kwargs["user_prompt"]:
+                raise OpenRouterTimeoutError("timed out")
+            return analysis_completion("ok")
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", FanOutClient)
+
+    client = TestClient(create_app())
+    items = [{"feedback": [f"item {n}"]} for n in range(5)] + [{"feedback": ["boom"]}]
+    response = client.post("/analyze/batch", json={"items": items})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["result"]["summary"] for item in results[:5]] == ["ok"] * 5
+    assert results[5]["result"] is None
+    assert results[5]["error"]["code"] == "openrouter_timeout"
+    assert peak == 2
+
+
+def test_batch_rejects_oversized_batches(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_BATCH_MAX_ITEMS", "1")
+    client = TestClient(create_app())
+
+    response = client.post("/analyze/batch", json={"items": [{"feedback": ["a"]}, {"feedback": ["b"]}]})
+
+    assert response.status_code == 413
+    assert response.json()["detail"]["code"] == "batch_too_large"
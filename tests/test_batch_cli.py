@@ -0,0 +1,91 @@
+import json
+
+from app.batch import load_checkpoint, main
+from app.sessions import SessionStore
+
+
+def _write_lines(path, lines) -> None:
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+
+
+def _read_results(path) -> dict[int, dict]:
+    return {record["index"]: record for record in map(json.loads, path.read_text().splitlines())}
+
+
+def test_batch_cli_analyzes_file_in_process_pool(tmp_path, capsys) -> None:
+    source = tmp_path / "feedback.jsonl"
+    output = tmp_path / "results.jsonl"
+    _write_lines(source, [{"feedback": ["Pricing plan is confusing"]}, "Onboarding setup failed", "App crashes"])
+
+    exit_code = main([str(source), str(output), "--mode", "mock", "--workers", "2", "--group-size", "2"])
+
+    results = _read_results(output)
+    assert exit_code == 0
+    assert sorted(results) == [0, 1]
+    assert results[0]["result"]["themes"] == ["Pricing Confusion"]
+    assert (results[1]["first_line"], results[1]["last_line"]) == (2, 3)
+    summary = capsys.readouterr().out
+    assert "units: 2 (0 resumed from checkpoint, 2 analyzed)" in summary
+    assert "p95" in summary
+
+
+def test_batch_cli_resumes_from_checkpoint(tmp_path, capsys, monkeypatch) -> None:
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    source = tmp_path / "feedback.jsonl"
+    output = tmp_path / "results.jsonl"
+    _write_lines(source, [{"feedback": [f"item {index}"]} for index in range(4)])
+    done = {"index": 1, "first_line": 2, "last_line": 2, "result": {"summary": "earlier run"}, "error": None}
+    failed = {"index": 2, "first_line": 3, "last_line": 3, "result": None, "error": {"code": "x", "message": "y"}}
+    output.write_text(json.dumps(done) + "\n" + json.dumps(failed) + "\n" + '{"index": 3, "res', encoding="utf-8")
+    prompts: list[str] = []
+
+    class FakeClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, *, user_prompt, **kwargs):
+            prompts.append(user_prompt)
+            content = {"summary": "S", "themes": ["A"], "opportunities": ["O"], "experiments": ["E"]}
+            return {"choices": [{"message": {"content": json.dumps(content)}}]}
+
+        async def aclose(self):
+            pass
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", FakeClient)
+
+    exit_code = main([str(source), str(output), "--mode", "openrouter"])
+
+    assert exit_code == 0
+    assert len(prompts) == 3
+    assert not any("item 1" in prompt for prompt in prompts)
+    assert set(load_checkpoint(str(output))) == {0, 1, 2, 3}
+    assert "1 resumed from checkpoint, 3 analyzed" in capsys.readouterr().out
+
+
+def test_batch_cli_rejects_checkpoint_from_other_grouping(tmp_path, capsys) -> None:
+    source = tmp_path / "feedback.jsonl"
+    output = tmp_path / "results.jsonl"
+    _write_lines(source, ["a", "b", "c"])
+    output.write_text(json.dumps({"index": 0, "first_line": 1, "last_line": 3, "result": {}, "error": None}) + "\n")
+
+    exit_code = main([str(source), str(output), "--mode", "mock", "--workers", "1", "--group-size", "2"])
+
+    assert exit_code == 2
+    assert "different input or --group-size" in capsys.readouterr().err
+
+
+def test_batch_cli_closes_the_app_stores(tmp_path, monkeypatch) -> None:
+    source = tmp_path / "feedback.jsonl"
+    _write_lines(source, ["Pricing plan is confusing"])
+    closed: list[SessionStore] = []
+    close = SessionStore.close
+
+    def recording_close(self) -> None:
+        closed.append(self)
+        close(self)
+
+    monkeypatch.setattr(SessionStore, "close", recording_close)
+
+    assert main([str(source), str(tmp_path / "results.jsonl"), "--mode", "mock", "--workers", "1"]) == 0
+    assert len(closed) == 1
@@ -0,0 +1,65 @@
+from app.cache import AnalysisCache, MemoryLRUCache, SQLiteCache, build_cache_key
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_cache_key_normalizes_whitespace_and_tracks_model() -> None:
+    base = build_cache_key(feedback=["app  crashes\n"], context=" Mobile ", model="m1", prompt_version="v1")
+
+    assert base == build_cache_key(feedback=["app crashes"], context="Mobile", model="m1", prompt_version="v1")
+    assert base != build_cache_key(feedback=["app crashes"], context="Mobile", model="m2", prompt_version="v1")
+    assert base != build_cache_key(feedback=["app crashes"], context="Mobile", model="m1", prompt_version="v2")
+
+
+def test_memory_cache_evicts_least_recently_used() -> None:
+    cache = MemoryLRUCache(max_entries=2)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    cache.get("a")
+    cache.set("c", {"v": 3})
+
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+
+def test_memory_cache_expires_entries_after_ttl() -> None:
+    clock = FakeClock()
+    cache = MemoryLRUCache(ttl_seconds=10, clock=clock)
+    cache.set("a", {"v": 1})
+
+    clock.now += 11
+
+    assert cache.get("a") is None
+
+
+def test_sqlite_tier_is_shared_and_promotes_to_memory(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite3")
+    writer = AnalysisCache(memory=MemoryLRUCache(), disk=SQLiteCache(path))
+    reader = AnalysisCache(memory=MemoryLRUCache(), disk=SQLiteCache(path))
+
+    writer.set("k", {"summary": "cached"})
+
+    assert reader.get("k") == {"summary": "cached"}
+    assert reader.memory.get("k") == {"summary": "cached"}
+    assert reader.hits == 1
+    writer.close()
+    reader.close()
+
+
+def test_sqlite_tier_purges_expired_rows(tmp_path) -> None:
+    clock = FakeClock()
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=5, clock=clock)
+    cache.set("k", {"v": 1})
+
+    clock.now += 6
+
+    assert cache.purge_expired() == 1
+    assert cache.get("k") is None
+    cache.close()
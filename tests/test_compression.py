@@ -0,0 +1,63 @@
+import asyncio
+import zlib
+
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionConfig, CompressionMiddleware, negotiate_encoding
+from app.main import create_app
+
+
+def test_negotiate_encoding_honours_weights_and_exclusions() -> None:
+    assert negotiate_encoding("gzip, deflate", ("br", "gzip")) == "gzip"
+    assert negotiate_encoding("gzip;q=0.5, br", ("br", "gzip")) == "br"
+    assert negotiate_encoding("br;q=0.2, gzip;q=0.8", ("br", "gzip")) == "gzip"
+    assert negotiate_encoding("*;q=0.1, gzip;q=0", ("gzip",)) is None
+    assert negotiate_encoding("identity", ("br", "gzip")) is None
+    assert negotiate_encoding(None) is None
+
+
+def test_large_batch_responses_are_gzipped(monkeypatch) -> None:
+    monkeypatch.delenv("INSIGHT2SPEC_ANALYZE_MODE", raising=False)
+    client = TestClient(create_app())
+    payload = {"items": [{"feedback": [f"pricing is confusing #{index}"]} for index in range(20)]}
+
+    compressed = client.post("/analyze/batch", json=payload, headers={"Accept-Encoding": "gzip"})
+    plain = client.post("/analyze/batch", json=payload, headers={"Accept-Encoding": "identity"})
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert int(compressed.headers["content-length"]) < int(plain.headers["content-length"]) / 4
+    assert compressed.json() == plain.json()
+    assert "content-encoding" not in plain.headers
+
+
+def test_small_responses_are_sent_as_is() -> None:
+    response = TestClient(create_app()).get("/health", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_streamed_chunks_are_flushed_as_they_are_sent() -> None:
+    chunks = [b"event: field\ndata: 1\n\n", b"event: field\ndata: 2\n\n", b""]
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+        for index, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": index < len(chunks) - 1})
+
+    sent: list[dict] = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(app, config=CompressionConfig())(scope, None, send))
+
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # Each event decodes on its own, before the stream ends.
+    assert decoder.decompress(sent[1]["body"]) == chunks[0]
+    assert decoder.decompress(sent[2]["body"]) == chunks[1]
+    decoder.decompress(sent[3]["body"])
+    assert decoder.eof
+    assert (b"content-encoding", b"gzip") in sent[0]["headers"]
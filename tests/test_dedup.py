@@ -0,0 +1,105 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.dedup import DedupConfig, collapse_feedback, normalize, simhash
+from app.main import create_app
+from app.openrouter_client import OpenRouterConfigError
+
+
+def test_collapse_merges_exact_and_near_duplicates_in_first_seen_order() -> None:
+    items = [
+        "The export to CSV is very slow for large workspaces",
+        "Dark mode please",
+        "the export to csv is very slow for large workspace",
+        "THE EXPORT TO CSV IS VERY SLOW FOR LARGE WORKSPACES!!",
+        "dark mode, please",
+        "Light mode please",
+    ]
+
+    collapsed = collapse_feedback(items, max_distance=6)
+
+    assert [(group.text, group.count) for group in collapsed.groups] == [
+        (items[0], 3),
+        (items[1], 2),
+        (items[5], 1),
+    ]
+    assert collapsed.near_duplicates == 1
+    assert collapsed.input_items == 6
+    assert collapsed.distinct_chars < collapsed.input_chars
+
+
+def test_default_collapses_only_normalized_exact_matches() -> None:
+    items = ["App crashes on login", "app crashes on login.", "app crashes on logins"]
+
+    collapsed = collapse_feedback(items)
+
+    assert [group.count for group in collapsed.groups] == [2, 1]
+    assert collapsed.near_duplicates == 0
+
+
+def test_simhash_is_stable_and_close_for_small_edits() -> None:
+    base = simhash(normalize("The export to CSV is very slow for large workspaces"))
+    edited = simhash(normalize("the export to csv is very slow for large workspace"))
+    opposite = simhash(normalize("Price is too high"))
+
+    assert base == simhash(normalize("the export to CSV is very slow, for large workspaces"))
+    assert (base ^ edited).bit_count() <= 6
+    assert (opposite ^ simhash(normalize("Price is too low"))).bit_count() > 10
+
+
+def test_dedup_config_validates_distance(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_DEDUP_MAX_DISTANCE", "16")
+
+    with pytest.raises(OpenRouterConfigError):
+        DedupConfig.from_env()
+
+
+def test_prompt_lists_each_distinct_snippet_once_with_its_count(capturing_client) -> None:
+    calls = capturing_client()
+    feedback = ["App crashes on login", "app crashes on login!", "Need SSO", "app crashes on login"]
+
+    response = TestClient(create_app()).post("/analyze", json={"feedback": feedback})
+
+    assert response.status_code == 200
+    assert calls[0]["user_prompt"] == "Feedback:\n- App crashes on login (x3)\n- Need SSO"
+    assert response.json()["metadata"]["dedup"] == {
+        "input_items": 4,
+        "distinct_items": 2,
+        "near_duplicates": 0,
+        "input_chars": 69,
+        "distinct_chars": 28,
+    }
+
+
+def test_negations_are_not_merged_by_default(capturing_client) -> None:
+    calls = capturing_client()
+    feedback = [
+        "The new dashboard export feature is really useful for our weekly reports",
+        "The new dashboard export feature is not really useful for our weekly reports",
+        "onboarding is confusing",
+        "onboarding is not confusing",
+    ]
+
+    response = TestClient(create_app()).post("/analyze", json={"feedback": feedback})
+
+    assert response.status_code == 200
+    assert DedupConfig.from_env().max_distance == 0
+    assert [group.count for group in collapse_feedback(feedback).groups] == [1, 1, 1, 1]
+    assert calls[0]["user_prompt"] == "Feedback:\n" + "\n".join(f"- {item}" for item in feedback)
+    # Trigram SimHash puts a negation as close as a typo fix, which is why merging is opt-in.
+    first, negated = (simhash(normalize(item)) for item in feedback[:2])
+    assert (first ^ negated).bit_count() <= 6
+
+
+def test_disabling_dedup_sends_every_item_and_changes_the_cache_key(monkeypatch, capturing_client) -> None:
+    calls = capturing_client()
+    client = TestClient(create_app())
+    payload = {"feedback": ["Need SSO", "need sso"]}
+
+    client.post("/analyze", json=payload)
+    monkeypatch.setenv("INSIGHT2SPEC_DEDUP_ENABLED", "false")
+    response = client.post("/analyze", json=payload)
+
+    assert response.headers["X-Insight2Spec-Cache"] == "miss"
+    assert calls[1]["user_prompt"] == "Feedback:\n- Need SSO\n- need sso"
+    assert response.json()["metadata"]["dedup"]["distinct_items"] == 2
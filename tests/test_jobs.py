@@ -0,0 +1,210 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.jobs import JobFailedError, JobQueue, JobQueueFullError, JobStore
+from app.main import create_app
+
+
+async def _drain(queue: JobQueue, expected: int) -> None:
+    await queue.start()
+    try:
+        for _ in range(200):
+            if queue.completed + queue.failed >= expected:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("jobs did not finish")
+    finally:
+        await queue.stop()
+
+
+def _wait_for_job(client: TestClient, job_id: str) -> dict:
+    for _ in range(200):
+        job = client.get(f"/analyze/jobs/{job_id}").json()
+        if job["status"] in {"succeeded", "failed"}:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_interactive_lane_goes_first_but_bulk_is_not_starved() -> None:
+    order: list[str] = []
+
+    async def runner(request: dict) -> dict:
+        order.append(request["name"])
+        return {}
+
+    async def run() -> None:
+        queue = JobQueue(JobStore(), runner, workers=1, interactive_burst=2)
+        for name in ("b1", "b2"):
+            queue.submit({"name": name}, priority="bulk")
+        for name in ("i1", "i2", "i3", "i4"):
+            queue.submit({"name": name}, priority="interactive")
+        await _drain(queue, 6)
+
+    asyncio.run(run())
+
+    assert order == ["i1", "i2", "b1", "i3", "i4", "b2"]
+
+
+def test_lane_depth_is_bounded() -> None:
+    async def runner(request: dict) -> dict:
+        return {}
+
+    queue = JobQueue(JobStore(), runner, max_queued=1)
+    queue.submit({}, priority="bulk")
+    queue.submit({}, priority="interactive")
+
+    with pytest.raises(JobQueueFullError):
+        queue.submit({}, priority="bulk")
+
+
+def test_runner_failures_are_stored_with_their_code() -> None:
+    async def runner(request: dict) -> dict:
+        raise JobFailedError("openrouter_timeout", "too slow")
+
+    store = JobStore()
+
+    async def run() -> str:
+        queue = JobQueue(store, runner)
+        job = queue.submit({}, priority="interactive")
+        await _drain(queue, 1)
+        return job.id
+
+    job = store.get(asyncio.run(run()))
+
+    assert job.status == "failed"
+    assert job.error == {"code": "openrouter_timeout", "message": "too slow"}
+
+
+def test_interrupted_jobs_resume_after_restart(tmp_path) -> None:
+    path = str(tmp_path / "jobs.sqlite3")
+    # The first worker stopped long enough ago for its lease to have expired.
+    first = JobStore(path, clock=lambda: time.time() - 120, lease_seconds=60)
+    queued = first.create({"name": "queued"}, priority="bulk")
+    interrupted = first.create({"name": "interrupted"}, priority="interactive")
+    assert first.claim(interrupted.id) is not None
+    first.close()
+    seen: list[str] = []
+
+    async def runner(request: dict) -> dict:
+        seen.append(request["name"])
+        return {"ok": True}
+
+    store = JobStore(path)
+    asyncio.run(_drain(JobQueue(store, runner), 2))
+
+    assert sorted(seen) == ["interrupted", "queued"]
+    assert store.get(queued.id).result == {"ok": True}
+    assert store.get(interrupted.id).status == "succeeded"
+
+
+def test_jobs_leased_by_a_live_worker_are_not_run_again(tmp_path) -> None:
+    path = str(tmp_path / "jobs.sqlite3")
+    now = [1000.0]
+    live = JobStore(path, clock=lambda: now[0], lease_seconds=30)
+    job = live.create({"name": "busy"}, priority="interactive")
+    assert live.claim(job.id) is not None
+    seen: list[str] = []
+
+    async def runner(request: dict) -> dict:
+        seen.append(request["name"])
+        return {"ok": True}
+
+    async def run() -> None:
+        other = JobStore(path, clock=lambda: now[0], lease_seconds=0.05)
+        queue = JobQueue(other, runner)
+        await queue.start()
+        try:
+            assert other.claim(job.id) is None
+            await asyncio.sleep(0.15)
+            assert seen == []
+            # The live worker keeps renewing; once it stops, the lease runs out and the job is taken over.
+            now[0] += 10
+            assert live.renew(job.id)
+            now[0] += 31
+            for _ in range(100):
+                if seen:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+
+    asyncio.run(run())
+
+    assert seen == ["busy"]
+    assert live.get(job.id).status == "succeeded"
+    # The worker that lost the lease cannot overwrite the new owner's outcome.
+    assert not live.mark_failed(job.id, {"code": "internal_error", "message": "late"})
+
+
+def test_workers_sharing_a_store_leave_each_others_queued_jobs_alone(tmp_path) -> None:
+    path = str(tmp_path / "jobs.sqlite3")
+    seen: list[tuple[str, str]] = []
+
+    def runner_for(worker: str):
+        async def runner(request: dict) -> dict:
+            seen.append((worker, request["name"]))
+            return {}
+
+        return runner
+
+    async def run() -> None:
+        first = JobQueue(JobStore(path, lease_seconds=0.05), runner_for("first"), max_queued=1)
+        second = JobQueue(JobStore(path, lease_seconds=0.05), runner_for("second"), max_queued=1)
+        await second.start()
+        try:
+            first.submit({"name": "waiting"}, priority="bulk")
+            # Several reclaim rounds in the second worker.
+            await asyncio.sleep(0.2)
+            assert second.depth("bulk") == 0
+            second.submit({"name": "own"}, priority="bulk")
+            await asyncio.sleep(0.05)
+        finally:
+            await second.stop()
+        await _drain(first, 1)
+
+    asyncio.run(run())
+
+    assert seen == [("second", "own"), ("first", "waiting")]
+
+
+def test_analyze_job_endpoint_runs_mock_analysis(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "mock")
+
+    with TestClient(create_app()) as client:
+        response = client.post("/analyze/jobs", json={"feedback": ["Pricing is confusing"], "priority": "bulk"})
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        assert response.headers["Location"] == f"/analyze/jobs/{job_id}"
+        assert response.json()["priority"] == "bulk"
+
+        job = _wait_for_job(client, job_id)
+        etag = client.get(f"/analyze/jobs/{job_id}").headers["ETag"]
+        poll = client.get(f"/analyze/jobs/{job_id}", headers={"If-None-Match": etag})
+
+    assert job["status"] == "succeeded"
+    assert job["result"]["themes"] == ["Pricing Confusion"]
+    assert job["error"] is None
+    assert poll.status_code == 304
+
+
+def test_analyze_job_reports_analysis_error_codes(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+
+    with TestClient(create_app()) as client:
+        job_id = client.post("/analyze/jobs", json={"feedback": ["Checkout is slow"]}).json()["id"]
+        job = _wait_for_job(client, job_id)
+
+    assert job["status"] == "failed"
+    assert job["error"]["code"] == "openrouter_config_error"
+
+
+def test_unknown_job_returns_404() -> None:
+    response = TestClient(create_app()).get("/analyze/jobs/missing")
+
+    assert response.status_code == 404
+    assert response.json()["detail"]["code"] == "job_not_found"
@@ -0,0 +1,20 @@
+import json
+
+import pytest
+
+from app import json_codec
+
+
+def test_round_trip_keeps_non_ascii_text_compact() -> None:
+    value = {"summary": "Résumé ✓", "themes": ["a", "b"]}
+
+    encoded = json_codec.dumps(value)
+
+    assert encoded == '{"summary":"Résumé ✓","themes":["a","b"]}'
+    assert json_codec.loads(encoded) == value
+    assert json_codec.loads(encoded.encode("utf-8")) == value
+
+
+def test_decode_errors_are_stdlib_json_errors() -> None:
+    with pytest.raises(json.JSONDecodeError):
+        json_codec.loads(b'{"summary": ')
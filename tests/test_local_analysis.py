@@ -0,0 +1,78 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.local_analysis import LocalAnalysisConfig, LocalAnalysisError, cluster_feedback
+from app.main import create_app
+
+_FEEDBACK = (
+    ["checkout page is slow to load on mobile"] * 6
+    + ["pricing plans are confusing and expensive"] * 5
+    + ["export to csv fails for large reports"] * 4
+    + ["ok"]
+)
+
+
+def test_cluster_feedback_groups_similar_snippets() -> None:
+    pytest.importorskip("numpy")
+
+    clustering = cluster_feedback(_FEEDBACK, LocalAnalysisConfig(clusters=3))
+
+    assert [cluster.size for cluster in clustering.clusters] == [6, 5, 4]
+    assert "checkout" in clustering.clusters[0].top_terms
+    assert _FEEDBACK[clustering.clusters[1].representative_indexes[0]].startswith("pricing")
+    # Identical snippets collapse to one representative.
+    assert len(clustering.clusters[0].representative_indexes) == 1
+    assert clustering.unclustered == 1
+
+
+def test_dominant_theme_keeps_its_terms_and_labels() -> None:
+    pytest.importorskip("numpy")
+    variants = ["every time", "after upgrade", "with sso", "on android", "on ios", "when offline", "randomly"]
+    crashes = [f"app crashes on login {variants[index % len(variants)]} #{index}" for index in range(80)]
+    exports = ["please update the csv export", "csv export is missing columns", "export to csv times out"] * 6
+
+    clustering = cluster_feedback(crashes + exports)
+
+    assert clustering.unclustered == 0
+    crash_clusters = [cluster for cluster in clustering.clusters if "crashes" in cluster.top_terms]
+    assert sum(cluster.size for cluster in crash_clusters) == 80
+    assert all("csv" not in cluster.top_terms for cluster in crash_clusters)
+    export_clusters = [cluster for cluster in clustering.clusters if "csv" in cluster.top_terms]
+    assert sum(cluster.size for cluster in export_clusters) == 18
+
+
+def test_cluster_feedback_is_deterministic() -> None:
+    pytest.importorskip("numpy")
+
+    assert cluster_feedback(_FEEDBACK) == cluster_feedback(_FEEDBACK)
+
+
+def test_analyze_local_mode_returns_clusters(monkeypatch) -> None:
+    pytest.importorskip("numpy")
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "local")
+    monkeypatch.setenv("INSIGHT2SPEC_LOCAL_CLUSTERS", "3")
+
+    client = TestClient(create_app())
+    response = client.post("/analyze", json={"feedback": _FEEDBACK})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["mode"] == "local"
+    assert len(body["themes"]) == 3
+    assert body["metadata"]["clusters"][0]["size"] == 6
+    assert body["metadata"]["clusters"][0]["representative_snippets"] == [_FEEDBACK[0]]
+
+
+def test_analyze_local_mode_reports_missing_numpy(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "local")
+
+    def missing_numpy():
+        raise LocalAnalysisError("Local analysis mode requires NumPy (pip install numpy)")
+
+    monkeypatch.setattr("app.local_analysis._numpy", missing_numpy)
+
+    client = TestClient(create_app())
+    response = client.post("/analyze", json={"feedback": ["anything"]})
+
+    assert response.status_code == 500
+    assert response.json()["detail"]["code"] == "local_analysis_unavailable"
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.map_reduce import MapReduceConfig, chunk_feedback, estimate_tokens, merge_analyses
+from app.openrouter_client import OpenRouterConfigError
+
+
+def test_chunk_feedback_packs_items_in_order_within_budget() -> None:
+    items = ["a" * 40, "b" * 40, "c" * 40, "d" * 400]
+
+    chunks = chunk_feedback(items, max_tokens=25)
+
+    assert chunks == [["a" * 40, "b" * 40], ["c" * 40], ["d" * 400]]
+    assert estimate_tokens("a" * 40) == 10
+
+
+def test_merge_analyses_ranks_repeated_values_first() -> None:
+    partials = [
+        {"summary": "One.", "themes": ["Pricing", "Speed"], "opportunities": ["O1"], "experiments": ["E1"], "prd_outline": []},
+        {"summary": "Two.", "themes": ["speed ", "Onboarding"], "opportunities": ["O2"], "experiments": ["E1"], "prd_outline": ["P"]},
+    ]
+
+    merged = merge_analyses(partials)
+
+    assert merged["summary"] == "Merged 2 chunk analyses. One. Two."
+    assert merged["themes"] == ["Speed", "Pricing", "Onboarding"]
+    assert merged["experiments"] == ["E1"]
+    assert merged["prd_outline"] == ["P"]
+
+
+def test_merged_summary_stays_bounded_as_chunks_grow() -> None:
+    partials = [
+        {"summary": f"Chunk {index} summary.", "themes": ["T"], "opportunities": ["O"], "experiments": ["E"], "prd_outline": []}
+        for index in range(200)
+    ]
+
+    merged = merge_analyses(partials)
+
+    assert merged["summary"] == (
+        "Merged 200 chunk analyses. Chunk 0 summary. Chunk 1 summary. Chunk 2 summary. (+197 more chunk summaries)"
+    )
+
+
+def test_map_reduce_config_rejects_unknown_strategy(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_MAP_REDUCE_STRATEGY", "vote")
+
+    with pytest.raises(OpenRouterConfigError):
+        MapReduceConfig.from_env()
+
+
+@pytest.mark.parametrize("strategy", ["merge", "llm"])
+def test_analyze_splits_large_corpora_into_chunks(monkeypatch, strategy: str) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("INSIGHT2SPEC_CHUNK_TOKENS", "20")
+    monkeypatch.setenv("INSIGHT2SPEC_MAP_REDUCE_STRATEGY", strategy)
+    prompts: list[str] = []
+
+    class ChunkClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            prompts.append(kwargs["user_prompt"])
+            summary = "Reduced" if "Partial analyses" in kwargs["user_prompt"] else f"Chunk {len(prompts)}"
+            content = {
+                "summary": summary,
+                "themes": ["Reliability Issues"],
+                "opportunities": ["Fix crashes"],
+                "experiments": ["Crash banner"],
+                "prd_outline": ["Problem"],
+            }
+            return {"choices": [{"message": {"content": json.dumps(content)}}]}
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", ChunkClient)
+
+    client = TestClient(create_app())
+    feedback = [f"app crashes on screen number {n}" for n in range(6)]
+    response = client.post("/analyze", json={"feedback": feedback})
+
+    assert response.status_code == 200
+    body = response.json()
+    chunk_count = body["metadata"]["chunks_processed"]
+    assert chunk_count == 3
+    assert body["themes"] == ["Reliability Issues"]
+    if strategy == "llm":
+        assert len(prompts) == chunk_count + 1
+        assert body["summary"] == "Reduced"
+    else:
+        assert len(prompts) == chunk_count
+        assert body["summary"].startswith("Merged 3 chunk analyses.")
@@ -0,0 +1,95 @@
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.metrics import (
+    ANALYSIS_ERRORS,
+    REQUEST_SECONDS,
+    STAGE_SECONDS,
+    UPSTREAM_SECONDS,
+    Counter,
+    Histogram,
+    prompt_size_label,
+)
+from app.openrouter_client import AsyncOpenRouterClient
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    histogram = Histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.1, stage="a")
+    histogram.observe(3.0, stage="a")
+
+    assert histogram.render() == [
+        "# HELP demo_seconds Demo.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{stage="a",le="0.1"} 2',
+        'demo_seconds_bucket{stage="a",le="1"} 2',
+        'demo_seconds_bucket{stage="a",le="+Inf"} 3',
+        'demo_seconds_sum{stage="a"} 3.15',
+        'demo_seconds_count{stage="a"} 3',
+    ]
+
+
+def test_counter_escapes_label_values() -> None:
+    counter = Counter("demo_events", "Demo.", ("code",))
+    counter.inc(code='bad "quote"')
+    counter.inc(2, code='bad "quote"')
+
+    assert counter.render()[-1] == 'demo_events_total{code="bad \\"quote\\""} 3'
+
+
+def test_prompt_size_label_classes() -> None:
+    assert [prompt_size_label(size) for size in (10, 1_000, 20_000, 100_000)] == [
+        "lt_1k",
+        "1k_4k",
+        "16k_64k",
+        "ge_64k",
+    ]
+
+
+def _app_with_upstream(monkeypatch, handler) -> TestClient:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_MODEL", "metrics/model")
+    app = create_app()
+    app.state.openrouter_client = AsyncOpenRouterClient(api_key="k", transport=httpx.MockTransport(handler))
+    return TestClient(app)
+
+
+def test_analyze_records_stage_upstream_and_request_metrics(monkeypatch) -> None:
+    content = {"summary": "S", "themes": ["A"], "opportunities": ["O"], "experiments": ["E"]}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(content)}}]})
+
+    client = _app_with_upstream(monkeypatch, handler)
+    stage_names = ("prompt_build", "upstream", "extract", "validate")
+    stages = {stage: STAGE_SECONDS.count(stage=stage, prompt_size="lt_1k") for stage in stage_names}
+    upstream = UPSTREAM_SECONDS.count(model="metrics/model", status="200", prompt_size="lt_1k")
+    requests = REQUEST_SECONDS.count(method="POST", route="/analyze", status_code="200", cache="miss")
+
+    assert client.post("/analyze", json={"feedback": ["metrics please"]}).status_code == 200
+
+    for stage, before in stages.items():
+        assert STAGE_SECONDS.count(stage=stage, prompt_size="lt_1k") == before + 1
+    assert UPSTREAM_SECONDS.count(model="metrics/model", status="200", prompt_size="lt_1k") == upstream + 1
+    assert REQUEST_SECONDS.count(method="POST", route="/analyze", status_code="200", cache="miss") == requests + 1
+
+    body = client.get("/metrics")
+    assert body.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'insight2spec_analysis_outcomes_total{mode="openrouter",outcome="miss"}' in body.text
+
+
+def test_analyze_errors_are_counted_with_upstream_status(monkeypatch) -> None:
+    monkeypatch.setenv("OPENROUTER_MAX_RETRIES", "0")
+    client = _app_with_upstream(monkeypatch, lambda request: httpx.Response(400, text="bad request"))
+    errors = ANALYSIS_ERRORS.value(code="openrouter_request_error", status_code=502, surface="http")
+    upstream = UPSTREAM_SECONDS.count(model="metrics/model", status="400", prompt_size="lt_1k")
+
+    assert client.post("/analyze", json={"feedback": ["broken upstream"]}).status_code == 502
+
+    assert ANALYSIS_ERRORS.value(code="openrouter_request_error", status_code=502, surface="http") == errors + 1
+    assert UPSTREAM_SECONDS.count(model="metrics/model", status="400", prompt_size="lt_1k") == upstream + 1
+    assert REQUEST_SECONDS.count(method="POST", route="/analyze", status_code="502", cache="") >= 1
@@ -0,0 +1,120 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.model_router import ModelRouter
+
+
+def test_router_prefers_unmeasured_then_fastest_model() -> None:
+    router = ModelRouter(["slow", "fast"])
+
+    assert router.choose(10) == ["slow"]
+    router.record_success("slow", 2.0)
+    assert router.choose(10) == ["fast"]
+    router.record_success("fast", 0.5)
+
+    assert router.choose(10) == ["fast"]
+
+
+def test_router_skips_unhealthy_model_until_cooldown() -> None:
+    now = 0.0
+    router = ModelRouter(["a", "b"], cooldown_seconds=30, clock=lambda: now)
+    router.record_success("a", 0.1)
+    router.record_success("b", 1.0)
+
+    router.record_failure("a")
+    router.record_failure("a")
+
+    assert not router.healthy("a")
+    assert router.choose(10) == ["b"]
+    now = 31.0
+    assert router.choose(10) == ["a"]
+
+
+def test_router_falls_back_to_least_failing_model_when_none_is_healthy() -> None:
+    router = ModelRouter(["a", "b"])
+    for _ in range(3):
+        router.record_failure("a")
+    router.record_failure("b")
+    router.record_failure("b")
+
+    assert router.choose(10) == ["b"]
+
+
+def test_router_routes_by_input_size() -> None:
+    router = ModelRouter(
+        ["default"],
+        small_model="cheap",
+        small_input_tokens=100,
+        large_model="long-context",
+        large_input_tokens=10_000,
+    )
+
+    assert router.choose(50) == ["cheap"]
+    assert router.choose(500) == ["default"]
+    assert router.choose(20_000) == ["long-context"]
+    assert router.cache_identity == "router:default,cheap,long-context"
+
+
+def test_single_model_router_keeps_plain_cache_identity(monkeypatch) -> None:
+    monkeypatch.setenv("OPENROUTER_MODEL", "vendor/model")
+
+    assert ModelRouter.from_env().cache_identity == "vendor/model"
+
+
+def test_analyze_races_two_models_and_cancels_the_loser(monkeypatch, analysis_completion) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("OPENROUTER_MODELS", "vendor/slow,vendor/fast")
+    monkeypatch.setenv("OPENROUTER_ROUTING_RACE", "true")
+    cancelled: list[str] = []
+
+    class RacingClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, *, model, **kwargs):
+            try:
+                await asyncio.sleep(1.0 if model == "vendor/slow" else 0.01)
+            except asyncio.CancelledError:
+                cancelled.append(model)
+                raise
+            return analysis_completion(f"from {model}")
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", RacingClient)
+
+    client = TestClient(create_app())
+    response = client.post("/analyze", json={"feedback": ["Checkout is slow"]})
+
+    assert response.status_code == 200
+    assert response.json()["summary"] == "from vendor/fast"
+    assert cancelled == ["vendor/slow"]
+    stats = {entry["model"]: entry for entry in client.get("/stats").json()["models"]}
+    assert stats["vendor/fast"]["race_wins"] == 1
+    assert stats["vendor/slow"]["calls"] == 0
+
+
+def test_analyze_records_model_failures(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("OPENROUTER_MODEL", "vendor/broken")
+
+    class BadOutputClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            return {"choices": [{"message": {"content": "not json"}}]}
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", BadOutputClient)
+
+    client = TestClient(create_app())
+    response = client.post("/analyze", json={"feedback": ["Checkout is slow"]})
+
+    assert response.status_code == 502
+    [stats] = client.get("/stats").json()["models"]
+    assert stats["model"] == "vendor/broken"
+    assert stats["failures"] == 1
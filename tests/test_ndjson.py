@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.ndjson import NDJSONLineTooLongError, iter_analysis_units, iter_lines
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def _collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+def test_iter_lines_reassembles_lines_split_across_chunks() -> None:
+    lines = asyncio.run(_collect(iter_lines(_chunks(b'"a"\n"b', b'c"\n\n', b'"d"'), max_line_bytes=100)))
+
+    assert lines == [(1, b'"a"'), (2, b'"bc"'), (4, b'"d"')]
+
+
+def test_iter_lines_rejects_oversized_partial_line() -> None:
+    with pytest.raises(NDJSONLineTooLongError, match="Line 2"):
+        asyncio.run(_collect(iter_lines(_chunks(b'"ok"\n', b"x" * 20, b"x" * 20), max_line_bytes=32)))
+
+
+def test_units_group_snippets_and_keep_requests_and_errors_in_order() -> None:
+    lines = [
+        (1, b'"one"'),
+        (2, b'{"text": "two"}'),
+        (3, b'"three"'),
+        (4, b'{"feedback": ["whole request"]}'),
+        (5, b"not json"),
+        (6, b'"four"'),
+    ]
+
+    async def source():
+        for line in lines:
+            yield line
+
+    units = asyncio.run(_collect(iter_analysis_units(source(), group_size=2, context="ctx")))
+
+    assert [(unit.first_line, unit.last_line) for unit in units] == [(1, 2), (3, 3), (4, 4), (5, 5), (6, 6)]
+    assert units[0].request == {"feedback": ["one", "two"], "context": "ctx"}
+    assert units[2].request == {"feedback": ["whole request"]}
+    assert units[3].error == "Line 5 is not valid JSON"
+
+
+def test_ndjson_endpoint_streams_results_in_input_order(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "mock")
+    monkeypatch.setenv("INSIGHT2SPEC_NDJSON_CONCURRENCY", "2")
+    body = "\n".join(
+        [
+            json.dumps({"feedback": ["Pricing is confusing"]}),
+            json.dumps({"feedback": []}),
+            json.dumps("Onboarding was confusing"),
+            json.dumps({"text": "The app is slow"}),
+            "[1, 2]",
+        ]
+    )
+
+    response = TestClient(create_app()).post("/analyze/ndjson?group_size=5", content=body.encode())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["index"] for item in results] == [0, 1, 2, 3]
+    assert results[0]["result"]["themes"] == ["Pricing Confusion"]
+    assert results[1]["error"]["code"] == "invalid_ndjson_record"
+    assert (results[2]["first_line"], results[2]["last_line"]) == (3, 4)
+    assert set(results[2]["result"]["themes"]) == {"Onboarding Friction", "Reliability Issues"}
+    assert results[3]["error"]["message"] == (
+        "Line 5 must be an AnalyzeRequest object, a string, or an object with a 'text' string"
+    )
+
+
+def test_ndjson_endpoint_reports_oversized_line(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_NDJSON_MAX_LINE_BYTES", "64")
+    body = json.dumps("short") + "\n" + json.dumps("x" * 200) + "\n"
+
+    response = TestClient(create_app()).post("/analyze/ndjson", content=body.encode())
+
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert results[0]["result"] is not None
+    assert results[-1]["error"]["code"] == "ndjson_line_too_long"
+
+
+def test_ndjson_endpoint_bounds_in_flight_analyses(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("INSIGHT2SPEC_NDJSON_CONCURRENCY", "3")
+    in_flight = 0
+    peak = 0
+
+    class SlowClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            content = {"summary": "S", "themes": ["A"], "opportunities": ["O"], "experiments": ["E"]}
+            return {"choices": [{"message": {"content": json.dumps(content)}}]}
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", SlowClient)
+    body = "\n".join(json.dumps({"feedback": [f"item {index}"]}) for index in range(12))
+
+    response = TestClient(create_app()).post("/analyze/ndjson", content=body.encode())
+
+    assert len(response.text.splitlines()) == 12
+    assert peak == 3
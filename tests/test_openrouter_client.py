@@ -0,0 +1,160 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.openrouter_client import AsyncOpenRouterClient, OpenRouterRequestError, OpenRouterTimeoutError
+
+
+def test_async_client_posts_chat_completion_with_auth_headers(completion) -> None:
+    seen: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(200, json=completion("ok"))
+
+    async def run() -> dict:
+        client = AsyncOpenRouterClient(api_key="k", base_url="https://fake.test/v1", transport=httpx.MockTransport(handler))
+        try:
+            first = await client.complete_json(model="m", system_prompt="s", user_prompt="u")
+            await client.complete_json(model="m", system_prompt="s", user_prompt="u")
+            return first
+        finally:
+            await client.aclose()
+
+    result = asyncio.run(run())
+
+    assert result == completion("ok")
+    assert len(seen) == 2
+    assert seen[0].url == "https://fake.test/v1/chat/completions"
+    assert seen[0].headers["Authorization"] == "Bearer k"
+
+
+def test_async_client_maps_http_error_status() -> None:
+    transport = httpx.MockTransport(lambda request: httpx.Response(429, text="slow down"))
+
+    async def run() -> None:
+        client = AsyncOpenRouterClient(api_key="k", transport=transport)
+        try:
+            await client.complete_json(model="m", system_prompt="s", user_prompt="u")
+        finally:
+            await client.aclose()
+
+    with pytest.raises(OpenRouterRequestError, match="HTTP 429"):
+        asyncio.run(run())
+
+
+def test_async_client_maps_timeouts() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    async def run() -> None:
+        client = AsyncOpenRouterClient(api_key="k", transport=httpx.MockTransport(handler))
+        try:
+            await client.complete_json(model="m", system_prompt="s", user_prompt="u")
+        finally:
+            await client.aclose()
+
+    with pytest.raises(OpenRouterTimeoutError):
+        asyncio.run(run())
+
+
+def test_async_client_from_env_reads_pool_limits(monkeypatch) -> None:
+    monkeypatch.setenv("OPENROUTER_API_KEY", "k")
+    monkeypatch.setenv("OPENROUTER_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("OPENROUTER_MAX_KEEPALIVE_CONNECTIONS", "3")
+
+    client = AsyncOpenRouterClient.from_env()
+
+    assert client.max_connections == 7
+    assert client.max_keepalive_connections == 3
+
+
+def test_async_client_streams_content_deltas() -> None:
+    body = (
+        ": OPENROUTER PROCESSING\n\n"
+        'data: {"choices":[{"delta":{"content":"{\\"sum"}}]}\n\n'
+        'data: {"choices":[{"delta":{"content":"mary\\""}}]}\n\n'
+        'data: {"choices":[{"delta":{}}]}\n\n'
+        "data: [DONE]\n\n"
+    )
+    seen: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(json.loads(request.content))
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    async def run() -> list[str]:
+        client = AsyncOpenRouterClient(api_key="k", transport=httpx.MockTransport(handler))
+        try:
+            return [delta async for delta in client.stream_chat(model="m", system_prompt="s", user_prompt="u")]
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == ['{"sum', 'mary"']
+    assert seen[0]["stream"] is True
+
+
+def test_async_client_stream_raises_on_error_chunk() -> None:
+    body = 'data: {"error":{"message":"provider overloaded"}}\n\n'
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=body))
+
+    async def run() -> None:
+        client = AsyncOpenRouterClient(api_key="k", transport=transport)
+        try:
+            async for _ in client.stream_chat(model="m", system_prompt="s", user_prompt="u"):
+                pass
+        finally:
+            await client.aclose()
+
+    with pytest.raises(OpenRouterRequestError, match="provider overloaded"):
+        asyncio.run(run())
+
+
+def test_async_client_marks_static_prefix_cacheable_for_matching_models(completion) -> None:
+    seen: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(json.loads(request.content))
+        return httpx.Response(200, json=completion("ok"))
+
+    async def run() -> None:
+        client = AsyncOpenRouterClient(
+            api_key="k", transport=httpx.MockTransport(handler), cache_control_models=("anthropic/",)
+        )
+        try:
+            await client.complete_json(model="anthropic/claude", system_prompt="s", user_prompt="u")
+            await client.complete_json(model="openai/gpt", system_prompt="s", user_prompt="u")
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+
+    assert seen[0]["messages"][0]["content"] == [
+        {"type": "text", "text": "s", "cache_control": {"type": "ephemeral"}}
+    ]
+    assert seen[1]["messages"][0]["content"] == "s"
+
+
+def test_async_client_stream_reports_final_usage() -> None:
+    body = (
+        'data: {"choices":[{"delta":{"content":"{}"}}]}\n\n'
+        'data: {"choices":[],"usage":{"prompt_tokens":12,"completion_tokens":3}}\n\n'
+        "data: [DONE]\n\n"
+    )
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=body))
+    usage: dict = {}
+
+    async def run() -> list[str]:
+        client = AsyncOpenRouterClient(api_key="k", transport=transport)
+        try:
+            return [
+                delta
+                async for delta in client.stream_chat(model="m", system_prompt="s", user_prompt="u", usage=usage)
+            ]
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == ["{}"]
+    assert usage == {"prompt_tokens": 12, "completion_tokens": 3}
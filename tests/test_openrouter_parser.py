@@ -1,6 +1,13 @@
 import pytest
 
-from app.openrouter_parser import OpenRouterParseError, extract_assistant_text, extract_structured_analysis
+from app.metrics import JSON_REPAIRS
+from app.openrouter_parser import (
+    OpenRouterParseError,
+    IncrementalAnalysisParser,
+    extract_assistant_text,
+    extract_structured_analysis,
+    repair_json,
+)
 
 
 def test_extract_assistant_text_from_plain_content() -> None:
@@ -101,3 +108,103 @@ def test_extract_structured_analysis_raises_on_invalid_json() -> None:
 
     with pytest.raises(OpenRouterParseError):
         extract_structured_analysis(payload)
+
+
+def test_incremental_parser_reports_fields_across_chunk_boundaries() -> None:
+    text = '```json\n{"summary": "S", "themes": ["A", "B"], "experiments": ["E"], "opportunities": ["O"]}\n```'
+    parser = IncrementalAnalysisParser()
+
+    events = [event for char in text for event in parser.feed(char)]
+
+    assert events == [("summary", "S"), ("themes", "A"), ("themes", "B"), ("experiments", "E"), ("opportunities", "O")]
+    assert parser.finish() == {
+        "summary": "S",
+        "themes": ["A", "B"],
+        "opportunities": ["O"],
+        "experiments": ["E"],
+        "prd_outline": [],
+    }
+
+
+def test_extract_structured_analysis_handles_nested_objects_inside_fences() -> None:
+    content = (
+        "Here you go:\n```json\n"
+        '{"summary": "S {braces} \\"quoted\\"", "meta": {"nested": {"deep": [1, {"x": "}"}]}},'
+        ' "themes": ["A"], "opportunities": ["O"], "experiments": ["E"], "prd_outline": null}\n```'
+    )
+
+    result = extract_structured_analysis({"choices": [{"message": {"content": content}}]})
+
+    assert result["summary"] == 'S {braces} "quoted"'
+    assert result["themes"] == ["A"]
+    assert result["prd_outline"] == []
+
+
+def test_incremental_parser_fails_fast_on_invalid_field() -> None:
+    parser = IncrementalAnalysisParser()
+    parser.feed('{"summary": "S", "themes": [')
+
+    with pytest.raises(OpenRouterParseError, match="non-empty strings"):
+        parser.feed('42, "never read"')
+
+
+@pytest.mark.parametrize(
+    ("content", "message"),
+    [
+        ('["not", "an", "object"]', "must be an object"),
+        ('{"summary": "S", "themes": ["A"', "valid JSON"),
+        ('{"summary": "S" "themes": ["A"]}', "valid JSON"),
+        ('{"summary": "S", "themes": [], "opportunities": ["O"], "experiments": ["E"]}', "'themes' must be a non-empty list"),
+        ('{"summary": "S", "themes": "A", "opportunities": ["O"], "experiments": ["E"]}', "'themes' must be a non-empty list"),
+        ('{"themes": ["A"], "opportunities": ["O"], "experiments": ["E"]}', "'summary' must be a non-empty string"),
+    ],
+)
+def test_extract_structured_analysis_rejects_malformed_output(content: str, message: str) -> None:
+    with pytest.raises(OpenRouterParseError, match=message):
+        extract_structured_analysis({"choices": [{"message": {"content": content}}]})
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '```json\n{"summary": " S ", "themes": ["A "], "opportunities": ["O"], "experiments": ["E"]}\n```',
+        'Here you go: {"summary": "S", "themes": ["A"], "opportunities": ["O"], "experiments": ["E"], "prd_outline": null}',
+        '{"summary": "S", "themes": ["A"], "opportunities": ["O"], "experiments": ["E"], "extra": {"k": [1]}} {trailing}',
+        '{"summary": "Résumé ✓", "themes": ["\\u00e9"], "opportunities": ["O"], "experiments": ["E"], "prd_outline": ["P"]}',
+    ],
+)
+def test_whole_text_fast_path_matches_incremental_parser(content: str) -> None:
+    parser = IncrementalAnalysisParser()
+    parser.feed(content)
+
+    assert extract_structured_analysis({"choices": [{"message": {"content": content}}]}) == parser.finish()
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        # Trailing and doubled commas, single quotes, bare keys, Python literals, prose around the object.
+        "Sure!\n```json\n{'summary': 'It\\'s slow', themes: ['A',], \"opportunities\": [\"O\",,],"
+        ' "experiments": ["E"], prd_outline: None}\n``` Hope that helps {:}',
+        # Missing comma, unescaped inner quotes and a raw newline.
+        '{"summary": "He said "slow"\nagain" "themes": ["A"], "opportunities": ["O"], "experiments": ["E"]}',
+        # Cut off mid-item: the unfinished item is dropped and the brackets closed.
+        '{"summary": "S", "themes": ["A"], "opportunities": ["O"], "experiments": ["E", "unfini',
+    ],
+)
+def test_extract_structured_analysis_repairs_malformed_json(content: str) -> None:
+    local = JSON_REPAIRS.value(outcome="local")
+
+    result = extract_structured_analysis({"choices": [{"message": {"content": content}}]})
+
+    assert result["themes"] == ["A"]
+    assert result["opportunities"] == ["O"]
+    assert result["experiments"] == ["E"]
+    assert result["prd_outline"] == []
+    assert JSON_REPAIRS.value(outcome="local") == local + 1
+
+
+def test_repair_json_gives_up_without_an_object() -> None:
+    assert repair_json("no json here") is None
+    assert repair_json('["not", {"an": "object"}]') is None
+    assert repair_json('{"summary": "S", "themes": [oops]}') is None
@@ -0,0 +1,53 @@
+import asyncio
+import json
+from contextlib import nullcontext
+
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.profiling import ProfilingConfig, RequestProfiler
+
+_CONTENT = '{"summary":"S","themes":["A"],"opportunities":["O"],"experiments":["E"]}'
+
+
+def test_profiling_is_off_without_a_directory_and_sampled_with_one(tmp_path) -> None:
+    off = RequestProfiler(ProfilingConfig(sample_rate=1.0))
+    sampled = RequestProfiler(ProfilingConfig(directory=str(tmp_path), sample_rate=0.5), rng=lambda: 0.4)
+    skipped = RequestProfiler(ProfilingConfig(directory=str(tmp_path), sample_rate=0.5), rng=lambda: 0.6)
+
+    assert isinstance(off.profile({"X-Insight2Spec-Profile": "1"}, "analyze"), nullcontext)
+    assert not isinstance(sampled.profile({}, "analyze"), nullcontext)
+    assert isinstance(skipped.profile({}, "analyze"), nullcontext)
+    assert not isinstance(skipped.profile({"X-Insight2Spec-Profile": "true"}, "analyze"), nullcontext)
+
+
+def test_profile_header_writes_wall_and_cpu_profiles_of_the_request(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("INSIGHT2SPEC_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("INSIGHT2SPEC_PROFILE_INTERVAL_MS", "1")
+
+    class SlowClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            await asyncio.sleep(0.05)
+            return {"choices": [{"message": {"content": _CONTENT}}]}
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", SlowClient)
+    client = TestClient(create_app())
+
+    client.post("/analyze", json={"feedback": ["not profiled"]})
+    response = client.post("/analyze", json={"feedback": ["app crashes"]}, headers={"X-Insight2Spec-Profile": "1"})
+
+    assert response.status_code == 200
+    [profile] = tmp_path.glob("*.speedscope.json")
+    document = json.loads(profile.read_text())
+    assert [item["name"] for item in document["profiles"]] == ["analyze (wall)", "analyze (cpu)"]
+    assert document["profiles"][0]["endValue"] >= 0.04
+    wall = (tmp_path / profile.name.replace(".speedscope.json", ".wall.folded")).read_text()
+    # Waiting on the coalesced upstream call is followed into the task that makes it.
+    assert any("analyze" in line and "SlowClient.complete_json" in line and "<await" in line for line in wall.splitlines())
+    assert (tmp_path / profile.name.replace(".speedscope.json", ".cpu.folded")).exists()
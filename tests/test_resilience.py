@@ -0,0 +1,229 @@
+import asyncio
+import json
+import random
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.openrouter_client import AsyncOpenRouterClient, OpenRouterCircuitOpenError, OpenRouterRequestError
+from app.resilience import CircuitBreaker, HedgePolicy, LatencyTracker, RetryPolicy
+
+
+def _run_client(client: AsyncOpenRouterClient, calls: int = 1) -> list:
+    async def run() -> list:
+        results = []
+        try:
+            for _ in range(calls):
+                try:
+                    results.append(await client.complete_json(model="m", system_prompt="s", user_prompt="u"))
+                except OpenRouterRequestError as error:
+                    results.append(error)
+        finally:
+            await client.aclose()
+        return results
+
+    return asyncio.run(run())
+
+
+def test_retry_backoff_is_jittered_and_capped() -> None:
+    policy = RetryPolicy(base_delay_seconds=1.0, max_delay_seconds=3.0, rng=random.Random(1))
+
+    delays = [policy.backoff(retry) for retry in range(6) for _ in range(50)]
+
+    assert all(0.0 <= delay <= 3.0 for delay in delays)
+    assert len(set(delays)) > 100
+    assert policy.backoff(0, retry_after=10.0) == 3.0
+
+
+def test_client_retries_transient_statuses_then_succeeds(completion) -> None:
+    statuses = iter([503, 429, 200])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = next(statuses)
+        return httpx.Response(status, json=completion("ok") if status == 200 else {"error": "busy"})
+
+    client = AsyncOpenRouterClient(
+        api_key="k",
+        transport=httpx.MockTransport(handler),
+        retry=RetryPolicy(max_attempts=3, base_delay_seconds=0.001),
+    )
+
+    assert _run_client(client) == [completion("ok")]
+    assert client.retries == 2
+
+
+def test_client_does_not_retry_client_errors() -> None:
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(400, text="bad request")
+
+    client = AsyncOpenRouterClient(
+        api_key="k",
+        transport=httpx.MockTransport(handler),
+        retry=RetryPolicy(max_attempts=3, base_delay_seconds=0.001),
+    )
+
+    [error] = _run_client(client)
+
+    assert isinstance(error, OpenRouterRequestError)
+    assert error.status_code == 400
+    assert calls == 1
+
+
+def test_client_hedges_slow_attempt_and_cancels_loser(completion) -> None:
+    calls = 0
+    cancelled = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls, cancelled
+        calls += 1
+        if calls == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled += 1
+                raise
+        return httpx.Response(200, json=completion("fast"))
+
+    client = AsyncOpenRouterClient(
+        api_key="k",
+        transport=httpx.MockTransport(handler),
+        hedge=HedgePolicy(initial_delay_seconds=0.02),
+    )
+
+    assert _run_client(client) == [completion("fast")]
+    assert client.hedges == 1
+    assert cancelled == 1
+
+
+def test_hedge_delay_follows_observed_p95() -> None:
+    latencies = LatencyTracker()
+    policy = HedgePolicy(min_samples=20, initial_delay_seconds=2.0)
+    for sample in range(1, 20):
+        latencies.record(sample / 100)
+    assert policy.delay(latencies) == 2.0
+
+    latencies.record(0.20)
+
+    assert policy.delay(latencies) == pytest.approx(0.19)
+
+
+def test_breaker_opens_on_error_rate_and_half_opens_after_cooldown() -> None:
+    now = 0.0
+    breaker = CircuitBreaker(failure_rate_threshold=0.5, window=10, min_calls=4, open_seconds=30, clock=lambda: now)
+
+    for outcome in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record_success() if outcome else breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.short_circuited == 1
+
+    now = 31.0
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_client_short_circuits_while_breaker_is_open() -> None:
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(500, text="down")
+
+    client = AsyncOpenRouterClient(
+        api_key="k",
+        transport=httpx.MockTransport(handler),
+        breaker=CircuitBreaker(min_calls=2, window=2),
+    )
+
+    results = _run_client(client, calls=4)
+
+    assert calls == 2
+    assert [type(result) for result in results[2:]] == [OpenRouterCircuitOpenError] * 2
+
+
+def test_client_errors_do_not_open_the_breaker() -> None:
+    statuses = iter([400, 401, 413, 400, 401, 413])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(next(statuses), text="rejected")
+
+    breaker = CircuitBreaker(min_calls=2, window=2)
+    client = AsyncOpenRouterClient(api_key="k", transport=httpx.MockTransport(handler), breaker=breaker)
+
+    async def stream() -> None:
+        async for _ in client.stream_chat(model="m", system_prompt="s", user_prompt="u"):
+            pass
+
+    async def run_streams() -> list:
+        errors = []
+        for _ in range(3):
+            try:
+                await stream()
+            except OpenRouterRequestError as error:
+                errors.append(error)
+        return errors
+
+    results = _run_client(client, calls=3)
+    stream_errors = asyncio.run(run_streams())
+
+    assert [result.status_code for result in results + stream_errors] == [400, 401, 413, 400, 401, 413]
+    assert breaker.state == "closed"
+    assert breaker.opened_count == 0
+
+
+def test_analyze_serves_mock_fallback_while_breaker_is_open(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("OPENROUTER_MAX_RETRIES", "0")
+    monkeypatch.setenv("OPENROUTER_BREAKER_MIN_CALLS", "2")
+    monkeypatch.setenv("OPENROUTER_BREAKER_WINDOW", "2")
+    monkeypatch.setenv("INSIGHT2SPEC_CACHE_MAX_ENTRIES", "0")
+    upstream_calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal upstream_calls
+        upstream_calls += 1
+        return httpx.Response(502, text="bad gateway")
+
+    app = create_app()
+    app.state.openrouter_client = AsyncOpenRouterClient.from_env()
+    app.state.openrouter_client.transport = httpx.MockTransport(handler)
+    client = TestClient(app)
+
+    statuses = [client.post("/analyze", json={"feedback": [f"pricing is confusing {i}"]}).status_code for i in range(2)]
+    response = client.post("/analyze", json={"feedback": ["pricing is confusing"]})
+
+    assert statuses == [502, 502]
+    assert response.status_code == 200
+    assert response.json()["mode"] == "mock_fallback"
+    assert response.json()["themes"] == ["Pricing Confusion"]
+    assert upstream_calls == 2
+    assert client.get("/stats").json()["upstream"]["breaker_state"] == "open"
+
+
+def test_stream_replays_mock_fallback_while_breaker_is_open(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    app = create_app()
+    breaker = CircuitBreaker(min_calls=1, window=1)
+    breaker.record_failure()
+    app.state.openrouter_client = AsyncOpenRouterClient(api_key="k", breaker=breaker)
+
+    response = TestClient(app).post("/analyze/stream", json={"feedback": ["pricing is confusing"]})
+
+    events = [block for block in response.text.split("\n\n") if block]
+    result = json.loads(events[-1].split("data: ", 1)[1])
+    assert events[-1].startswith("event: result")
+    assert result["mode"] == "mock_fallback"
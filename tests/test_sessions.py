@@ -0,0 +1,94 @@
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.sessions import EMPTY_DIGEST, SessionStore, chain_digest
+
+_CONTENT = {
+    "summary": "Login is unreliable",
+    "themes": ["Reliability"],
+    "opportunities": ["Fix login"],
+    "experiments": ["Retry login"],
+    "prd_outline": ["Problem"],
+}
+
+
+def test_refresh_sends_only_new_feedback_with_the_stored_analysis(capturing_client) -> None:
+    calls = capturing_client(_CONTENT)
+    client = TestClient(create_app())
+
+    created = client.post("/sessions", json={"context": "Mobile app", "feedback": ["App crashes on login"]})
+    session_id = created.json()["id"]
+    first = client.get(f"/sessions/{session_id}/analysis").json()
+    client.post(f"/sessions/{session_id}/feedback", json={"feedback": ["Need SSO"]})
+    second = client.get(f"/sessions/{session_id}/analysis").json()
+    third = client.get(f"/sessions/{session_id}/analysis").json()
+
+    assert created.status_code == 201
+    assert created.headers["Location"] == f"/sessions/{session_id}"
+    assert [first["refresh"], second["refresh"], third["refresh"]] == ["full", "delta", "none"]
+    assert len(calls) == 2
+    assert calls[0]["user_prompt"] == "Context: Mobile app\nFeedback:\n- App crashes on login"
+    assert calls[1]["user_prompt"].startswith("Context: Mobile app\nCurrent analysis:\n{")
+    assert calls[1]["user_prompt"].endswith("}\nNew feedback:\n- Need SSO")
+    assert '"summary":"Login is unreliable"' in calls[1]["user_prompt"]
+    assert "App crashes on login" not in calls[1]["user_prompt"]
+    assert "Update the analysis" in calls[1]["system_prompt"]
+    assert second["delta_items"] == 1
+    assert second["analyzed_items"] == 2
+    assert second["digest"] == chain_digest(EMPTY_DIGEST, ["App crashes on login", "Need SSO"])
+    assert third["analysis"] == {**second["analysis"], "metadata": {**second["analysis"]["metadata"], "usage": None}}
+
+
+def test_unknown_and_empty_sessions() -> None:
+    client = TestClient(create_app())
+    session_id = client.post("/sessions", json={}).json()["id"]
+
+    assert client.get("/sessions/missing/analysis").json()["detail"]["code"] == "session_not_found"
+    assert client.post("/sessions/missing/feedback", json={"feedback": ["x"]}).status_code == 404
+    assert client.get(f"/sessions/{session_id}/analysis").json()["detail"]["code"] == "session_empty"
+
+
+def test_session_state_persists_in_sqlite(tmp_path) -> None:
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SessionStore(path)
+    record = store.create(context=None, items=["a", "b"])
+    digest = chain_digest(record.digest, ["a", "b"])
+    assert store.save_analysis(record.id, {"summary": "s"}, analyzed_count=2, digest=digest, expected_digest=EMPTY_DIGEST)
+    store.add_items(record.id, ["c"])
+    store.close()
+
+    reopened = SessionStore(path)
+    loaded = reopened.get(record.id)
+
+    assert (loaded.item_count, loaded.analyzed_count, loaded.pending_count) == (3, 2, 1)
+    assert loaded.analysis == {"summary": "s"}
+    assert reopened.items(record.id, start=loaded.analyzed_count) == ["c"]
+    # A refresh computed from the old state loses to the one already stored.
+    assert not reopened.save_analysis(record.id, {}, analyzed_count=3, digest="x", expected_digest=EMPTY_DIGEST)
+
+
+def test_expired_sessions_are_purged() -> None:
+    now = [1000.0]
+    store = SessionStore(ttl_seconds=60, clock=lambda: now[0])
+    old = store.create(context=None, items=["a"])
+    now[0] += 61
+    store.create(context=None)
+
+    assert store.get(old.id) is None
+    assert store.items(old.id) == []
+
+
+def test_unchanged_session_analysis_is_not_modified() -> None:
+    client = TestClient(create_app())
+    session_id = client.post("/sessions", json={"feedback": ["pricing is confusing"]}).json()["id"]
+
+    first = client.get(f"/sessions/{session_id}/analysis")
+    etag = first.headers["ETag"]
+    unchanged = client.get(f"/sessions/{session_id}/analysis", headers={"If-None-Match": etag})
+    client.post(f"/sessions/{session_id}/feedback", json={"feedback": ["setup takes too long"]})
+    refreshed = client.get(f"/sessions/{session_id}/analysis", headers={"If-None-Match": etag})
+
+    assert etag == f'W/"{first.json()["digest"]}"'
+    assert unchanged.status_code == 304
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != etag
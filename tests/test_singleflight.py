@@ -0,0 +1,204 @@
+import asyncio
+import json
+import multiprocessing
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.singleflight import HostLock, SingleFlight
+
+
+def test_single_flight_shares_one_call_between_concurrent_callers() -> None:
+    calls = 0
+
+    async def work() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run() -> list[tuple[str, bool]]:
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+        assert len(flight) == 0
+        assert (flight.leaders, flight.coalesced) == (1, 4)
+        return results
+
+    results = asyncio.run(run())
+
+    assert calls == 1
+    assert [joined for _, joined in results] == [False, True, True, True, True]
+
+
+def test_single_flight_propagates_the_error_to_every_caller() -> None:
+    async def fail() -> str:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run() -> list[object]:
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(run())
+
+    assert [str(error) for error in errors] == ["upstream down"] * 3
+
+
+def test_single_flight_survives_leader_cancellation() -> None:
+    async def work() -> str:
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run() -> tuple[str, bool]:
+        flight = SingleFlight()
+        leader = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == ("done", True)
+
+
+def _hold_lock(directory: str, started, release) -> None:
+    async def run() -> None:
+        async with HostLock(directory).hold("abc123"):
+            started.set()
+            release.wait(5)
+
+    asyncio.run(run())
+
+
+def test_host_lock_makes_other_processes_wait(tmp_path) -> None:
+    pytest.importorskip("fcntl")
+    context = multiprocessing.get_context("spawn")
+    started, release = context.Event(), context.Event()
+    holder = context.Process(target=_hold_lock, args=(str(tmp_path), started, release))
+    holder.start()
+    assert started.wait(10)
+
+    async def run() -> bool:
+        lock = HostLock(str(tmp_path), timeout_seconds=5)
+        asyncio.get_running_loop().call_later(0.05, release.set)
+        async with lock.hold("abc999") as waited:
+            return waited
+
+    try:
+        assert asyncio.run(run()) is True
+    finally:
+        release.set()
+        holder.join(10)
+
+
+def test_host_lock_is_shared_within_a_process(tmp_path) -> None:
+    pytest.importorskip("fcntl")
+
+    async def run() -> tuple[bool, bool]:
+        lock = HostLock(str(tmp_path), timeout_seconds=5, prefix_chars=1)
+        other_worker = HostLock(str(tmp_path), timeout_seconds=0.05, prefix_chars=1)
+        async with lock.hold("a1") as parent:
+            # A nested key on the same stripe must not wait for this process's own lock.
+            async with lock.hold("a2") as nested:
+                pass
+            async with other_worker.hold("a3") as blocked:
+                pass
+        assert not lock._held
+        return parent or nested, blocked
+
+    assert asyncio.run(run()) == (False, True)
+
+
+def test_map_reduce_chunks_sharing_the_parent_stripe_do_not_stall(monkeypatch, tmp_path) -> None:
+    pytest.importorskip("fcntl")
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("INSIGHT2SPEC_CHUNK_TOKENS", "20")
+    monkeypatch.setenv("INSIGHT2SPEC_COALESCE_LOCK_DIR", str(tmp_path))
+    monkeypatch.setenv("INSIGHT2SPEC_COALESCE_LOCK_TIMEOUT_SECONDS", "5")
+
+    class ChunkClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            content = {"summary": "S", "themes": ["T"], "opportunities": ["O"], "experiments": ["E"]}
+            return {"choices": [{"message": {"content": json.dumps(content)}}]}
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", ChunkClient)
+    app = create_app()
+    # One stripe for every key, so each chunk lands on the parent request's stripe.
+    app.state.host_lock.prefix_chars = 0
+    client = TestClient(app)
+
+    response = client.post("/analyze", json={"feedback": [f"app crashes on screen number {n}" for n in range(6)]})
+
+    assert response.status_code == 200
+    assert response.json()["metadata"]["chunks_processed"] == 3
+    assert app.state.host_lock.timeouts == 0
+
+
+def test_map_reduce_requests_lock_only_their_chunks(monkeypatch, tmp_path) -> None:
+    pytest.importorskip("fcntl")
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("INSIGHT2SPEC_CHUNK_TOKENS", "20")
+    monkeypatch.setenv("INSIGHT2SPEC_COALESCE_LOCK_DIR", str(tmp_path))
+
+    class ChunkClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            content = {"summary": "S", "themes": ["T"], "opportunities": ["O"], "experiments": ["E"]}
+            return {"choices": [{"message": {"content": json.dumps(content)}}]}
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", ChunkClient)
+    app = create_app()
+    held: list[str] = []
+    hold = app.state.host_lock.hold
+
+    def recording_hold(key: str):
+        held.append(key)
+        return hold(key)
+
+    monkeypatch.setattr(app.state.host_lock, "hold", recording_hold)
+    client = TestClient(app)
+
+    response = client.post("/analyze", json={"feedback": [f"app crashes on screen number {n}" for n in range(6)]})
+
+    # No lock on the whole request is held across the chunks, so two workers
+    # with overlapping chunks cannot each hold a stripe the other waits on.
+    assert response.json()["metadata"]["chunks_processed"] == 3
+    assert len(held) == 3
+
+
+def test_analyze_coalesces_identical_concurrent_requests(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("INSIGHT2SPEC_CACHE_MAX_ENTRIES", "0")
+    calls = 0
+
+    class SlowClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def complete_json(self, **kwargs):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            content = {"summary": "S", "themes": ["A"], "opportunities": ["O"], "experiments": ["E"]}
+            return {"choices": [{"message": {"content": json.dumps(content)}}]}
+
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", SlowClient)
+
+    client = TestClient(create_app())
+    response = client.post("/analyze/batch", json={"items": [{"feedback": ["same"]}] * 4})
+
+    assert response.status_code == 200
+    assert calls == 1
+    assert client.get("/stats").json()["coalescing"]["coalesced"] == 3
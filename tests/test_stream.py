@@ -0,0 +1,155 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.openrouter_client import OpenRouterRequestError
+
+_CONTENT = (
+    '{"summary":"Streamed summary","themes":["Reliability Issues","Speed"],'
+    '"opportunities":["Improve incident visibility"],"experiments":["Test nudges"],"prd_outline":["Problem"]}'
+)
+
+
+def _parse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _streaming_client(chunks: list[str], *, fail_after: int | None = None):
+    class StreamingClient:
+        @classmethod
+        def from_env(cls):
+            return cls()
+
+        async def stream_chat(self, **kwargs):
+            for index, chunk in enumerate(chunks):
+                if fail_after is not None and index == fail_after:
+                    raise OpenRouterRequestError("upstream reset")
+                yield chunk
+
+    return StreamingClient
+
+
+def test_stream_mock_mode_replays_fields_then_result(monkeypatch) -> None:
+    monkeypatch.delenv("INSIGHT2SPEC_ANALYZE_MODE", raising=False)
+    client = TestClient(create_app())
+
+    response = client.post("/analyze/stream", json={"feedback": ["pricing is confusing"]})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_events(response.text)
+    assert events[0] == ("field", {"field": "summary", "value": events[-1][1]["summary"]})
+    assert events[-1][0] == "result"
+    assert events[-1][1]["mode"] == "mock"
+
+
+def test_stream_openrouter_mode_emits_fields_as_they_complete(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    chunks = [_CONTENT[index : index + 7] for index in range(0, len(_CONTENT), 7)]
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", _streaming_client(chunks))
+
+    client = TestClient(create_app())
+    response = client.post("/analyze/stream", json={"feedback": ["app crashes"]})
+
+    events = _parse_events(response.text)
+    assert [data for name, data in events if name == "field"][:3] == [
+        {"field": "summary", "value": "Streamed summary"},
+        {"field": "themes", "value": "Reliability Issues"},
+        {"field": "themes", "value": "Speed"},
+    ]
+    assert events[-1] == (
+        "result",
+        {
+            "mode": "openrouter",
+            "summary": "Streamed summary",
+            "themes": ["Reliability Issues", "Speed"],
+            "opportunities": ["Improve incident visibility"],
+            "prd_outline": ["Problem"],
+            "experiments": ["Test nudges"],
+            "metadata": {
+                "chunks_processed": 1,
+                "theme_hits": [],
+                "clusters": [],
+                "dedup": {
+                    "input_items": 1,
+                    "distinct_items": 1,
+                    "near_duplicates": 0,
+                    "input_chars": 11,
+                    "distinct_chars": 11,
+                },
+                "usage": {
+                    "estimated_prompt_tokens": 111,
+                    "prompt_tokens": None,
+                    "completion_tokens": None,
+                    "cached_prompt_tokens": None,
+                    "trimmed_items": 0,
+                },
+            },
+        },
+    )
+
+    replay = client.post("/analyze/stream", json={"feedback": ["app crashes"]})
+    assert replay.headers["X-Insight2Spec-Cache"] == "hit"
+    name, replayed = _parse_events(replay.text)[-1]
+    assert name == "result"
+    # A replay spent no tokens.
+    assert replayed == {**events[-1][1], "metadata": {**events[-1][1]["metadata"], "usage": None}}
+
+
+def test_stream_openrouter_mode_reports_mid_stream_errors(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    chunks = ['{"summary":"partial",', '"themes":["A"', "]}"]
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", _streaming_client(chunks, fail_after=2))
+
+    client = TestClient(create_app())
+    events = _parse_events(client.post("/analyze/stream", json={"feedback": ["x"]}).text)
+
+    assert events[0] == ("field", {"field": "summary", "value": "partial"})
+    assert events[-1] == (
+        "error",
+        {"status": 502, "code": "openrouter_request_error", "message": "upstream reset"},
+    )
+
+
+def test_stream_openrouter_mode_reports_contract_drift(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", _streaming_client(["no json here"]))
+
+    client = TestClient(create_app())
+    events = _parse_events(client.post("/analyze/stream", json={"feedback": ["x"]}).text)
+
+    assert events == [("error", {"status": 502, "code": "openrouter_parse_error", "message": events[0][1]["message"]})]
+
+
+def test_stream_openrouter_mode_fails_fast_on_missing_config(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+
+    client = TestClient(create_app())
+    response = client.post("/analyze/stream", json={"feedback": ["x"]})
+
+    assert response.status_code == 500
+    assert response.json()["detail"]["code"] == "openrouter_config_error"
+
+
+def test_stream_openrouter_mode_repairs_malformed_json_at_the_end(monkeypatch) -> None:
+    monkeypatch.setenv("INSIGHT2SPEC_ANALYZE_MODE", "openrouter")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    chunks = ['{"summary":"S",', '"themes":["A",],', '"opportunities":["O"],"experiments":["E"]}']
+    monkeypatch.setattr("app.main.AsyncOpenRouterClient", _streaming_client(chunks))
+
+    client = TestClient(create_app())
+    events = _parse_events(client.post("/analyze/stream", json={"feedback": ["x"]}).text)
+
+    assert events[0] == ("field", {"field": "summary", "value": "S"})
+    assert events[-1][0] == "result"
+    assert events[-1][1]["themes"] == ["A"]
+    assert events[-1][1]["experiments"] == ["E"]
@@ -0,0 +1,69 @@
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.taxonomy import TaxonomyError, TaxonomyStore, load_taxonomy
+
+
+def _write(path, taxonomy: dict, *, mtime_ns: int) -> None:
+    path.write_text(json.dumps(taxonomy), encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_load_taxonomy_reads_json_and_yaml(tmp_path) -> None:
+    json_path = tmp_path / "taxonomy.json"
+    json_path.write_text('{"Search": ["search", "filter"]}', encoding="utf-8")
+    yaml_path = tmp_path / "taxonomy.yaml"
+    yaml_path.write_text("Search:\n  - search\n  - filter\n", encoding="utf-8")
+
+    assert load_taxonomy(json_path) == {"Search": ("search", "filter")}
+    pytest.importorskip("yaml")
+    assert load_taxonomy(yaml_path) == {"Search": ("search", "filter")}
+
+
+@pytest.mark.parametrize("content", ['["search"]', '{"Search": []}', '{"Search": ["ok", 3]}', "{not json"])
+def test_load_taxonomy_rejects_bad_shapes(tmp_path, content: str) -> None:
+    path = tmp_path / "taxonomy.json"
+    path.write_text(content, encoding="utf-8")
+
+    with pytest.raises(TaxonomyError):
+        load_taxonomy(path)
+
+
+def test_store_swaps_matcher_on_change_and_keeps_it_on_broken_edit(tmp_path) -> None:
+    path = tmp_path / "taxonomy.json"
+    _write(path, {"Search": ["search"]}, mtime_ns=1_000_000_000)
+    store = TaxonomyStore(str(path), default={})
+    original = store.matcher
+
+    assert store.reload_if_changed() is False
+
+    _write(path, {"Search": ["search"], "Billing": ["invoice"]}, mtime_ns=2_000_000_000)
+    assert store.reload_if_changed() is True
+    assert store.matcher is not original
+    assert store.matcher.themes == ("Search", "Billing")
+    assert original.themes == ("Search",)
+
+    path.write_text("{broken", encoding="utf-8")
+    os.utime(path, ns=(3_000_000_000, 3_000_000_000))
+    reloaded = store.matcher
+    with pytest.raises(TaxonomyError):
+        store.reload_if_changed()
+    assert store.matcher is reloaded
+    assert store.reload_if_changed() is False
+
+
+def test_mock_analysis_uses_configured_taxonomy(tmp_path, monkeypatch) -> None:
+    path = tmp_path / "taxonomy.json"
+    _write(path, {"Search Quality": ["search", "results"]}, mtime_ns=1_000_000_000)
+    monkeypatch.delenv("INSIGHT2SPEC_ANALYZE_MODE", raising=False)
+    monkeypatch.setenv("INSIGHT2SPEC_TAXONOMY_PATH", str(path))
+
+    client = TestClient(create_app())
+    body = client.post("/analyze", json={"feedback": ["search results are stale"]}).json()
+
+    assert body["themes"] == ["Search Quality"]
+    assert body["metadata"]["theme_hits"] == [{"theme": "Search Quality", "hits": 2, "item_indexes": [0]}]
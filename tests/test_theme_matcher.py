@@ -0,0 +1,57 @@
+import pytest
+
+from app.theme_matcher import ThemeMatch, ThemeMatcher
+
+# Small taxonomies use the per-keyword scan by default; -1 forces the compiled trie.
+strategies = pytest.mark.parametrize("scan_max_keywords", [100, -1], ids=["scan", "trie"])
+
+
+@strategies
+def test_theme_matcher_reports_hits_and_item_indexes_in_taxonomy_order(scan_max_keywords: int) -> None:
+    matcher = ThemeMatcher(
+        {
+            "Pricing": ("price", "pricing"),
+            "Reliability": ("crash", "slow"),
+            "Unused": ("zapier",),
+        },
+        scan_max_keywords=scan_max_keywords,
+    )
+
+    matches = matcher.match(["App CRASHES and is slow", "fine", "Pricing page: price is unclear"])
+
+    assert matches == [
+        ThemeMatch(theme="Pricing", hits=2, item_indexes=(2,)),
+        ThemeMatch(theme="Reliability", hits=2, item_indexes=(0,)),
+    ]
+
+
+@strategies
+def test_theme_matcher_reports_overlapping_keywords_across_themes(scan_max_keywords: int) -> None:
+    matcher = ThemeMatcher(
+        {"Setup": ("set",), "Setup Wizard": ("setup",), "Wizard": ("tup",)}, scan_max_keywords=scan_max_keywords
+    )
+
+    matches = matcher.match(["setup"])
+
+    assert [match.theme for match in matches] == ["Setup", "Setup Wizard", "Wizard"]
+
+
+@strategies
+def test_theme_matcher_accepts_generators_and_empty_taxonomies(scan_max_keywords: int) -> None:
+    assert ThemeMatcher({}, scan_max_keywords=scan_max_keywords).match(["anything"]) == []
+    matcher = ThemeMatcher({"A": ("a",)}, scan_max_keywords=scan_max_keywords)
+    assert matcher.match(item for item in ["a", "b", "aa"]) == [
+        ThemeMatch(theme="A", hits=3, item_indexes=(0, 2))
+    ]
+
+
+def test_scan_and_trie_agree_on_repeats_and_item_boundaries() -> None:
+    taxonomy = {"Loop": ("aa", "a\nb"), "Setup": ("setup", "set"), "Edge": ("ab",)}
+    items = ["aaaa", "a", "b set", "a\nb SETUP", "", "xa", "ab"]
+
+    scan = ThemeMatcher(taxonomy)
+    trie = ThemeMatcher(taxonomy, scan_max_keywords=-1)
+
+    assert scan.match(items) == trie.match(items)
+    # "a" ending one item and "b" starting the next is not a match.
+    assert scan.match(["xa", "b"]) == []
@@ -0,0 +1,96 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.dedup import collapse_feedback
+from app.main import create_app
+from app.openrouter_client import OpenRouterConfigError
+from app.token_budget import InputBudget, InputTooLargeError, estimate_chat_tokens, estimate_tokens
+
+_USAGE = {"prompt_tokens": 120, "completion_tokens": 40, "prompt_tokens_details": {"cached_tokens": 64}}
+
+
+def test_estimate_tokens_counts_multibyte_text_as_more_tokens() -> None:
+    assert estimate_tokens("a" * 40) == 10
+    assert estimate_tokens("登录失败") == 3
+    assert estimate_chat_tokens("abcd", "abcd") == 1 + 4 + 1 + 4 + 3
+
+
+def test_trim_keeps_the_most_reported_groups_in_order() -> None:
+    collapsed = collapse_feedback(["rare one", "common", "rare two", "common", "common"], max_distance=0)
+    budget = InputBudget(max_input_tokens=10, policy="trim")
+
+    trimmed, dropped = budget.fit(collapsed, fixed_tokens=4, line_tokens=[3, 3, 3])
+
+    assert [group.text for group in trimmed.groups] == ["rare one", "common"]
+    assert dropped == 1
+    assert trimmed.input_items == 5
+
+
+def test_reject_policy_raises_and_unknown_policy_is_a_config_error(monkeypatch) -> None:
+    collapsed = collapse_feedback(["a", "b"])
+
+    with pytest.raises(InputTooLargeError) as raised:
+        InputBudget(max_input_tokens=5).fit(collapsed, fixed_tokens=4, line_tokens=[1, 1])
+    assert raised.value.estimated_tokens == 6
+
+    monkeypatch.setenv("INSIGHT2SPEC_INPUT_BUDGET_POLICY", "truncate")
+    with pytest.raises(OpenRouterConfigError):
+        InputBudget.from_env()
+
+
+def test_system_prompt_is_static_and_usage_is_reported(capturing_client) -> None:
+    calls = capturing_client(usage=_USAGE)
+    client = TestClient(create_app())
+
+    first = client.post("/analyze", json={"feedback": ["Export is slow"], "context": "B2B"})
+    client.post("/analyze", json={"feedback": ["Need SSO"]})
+
+    assert calls[0]["system_prompt"] == calls[1]["system_prompt"]
+    assert calls[0]["user_prompt"] == "Context: B2B\nFeedback:\n- Export is slow"
+    usage = first.json()["metadata"]["usage"]
+    assert usage["estimated_prompt_tokens"] == estimate_chat_tokens(calls[0]["system_prompt"], calls[0]["user_prompt"])
+    assert (usage["prompt_tokens"], usage["completion_tokens"], usage["cached_prompt_tokens"]) == (120, 40, 64)
+
+
+def test_cache_hits_report_no_token_usage(capturing_client) -> None:
+    calls = capturing_client(usage=_USAGE)
+    client = TestClient(create_app())
+
+    first = client.post("/analyze", json={"feedback": ["Export is slow"]})
+    second = client.post("/analyze", json={"feedback": ["Export is slow"]})
+    replayed = client.post("/analyze/stream", json={"feedback": ["Export is slow"]})
+
+    assert len(calls) == 1
+    assert first.json()["metadata"]["usage"]["prompt_tokens"] == 120
+    assert second.headers["X-Insight2Spec-Cache"] == "hit"
+    assert second.json()["metadata"]["usage"] is None
+    assert '"usage":null' in replayed.text.replace(" ", "")
+
+
+def test_oversized_prompt_is_rejected_with_413_before_any_upstream_call(monkeypatch, capturing_client) -> None:
+    calls = capturing_client()
+    monkeypatch.setenv("INSIGHT2SPEC_MAX_INPUT_TOKENS", "150")
+    client = TestClient(create_app())
+
+    response = client.post("/analyze", json={"feedback": [f"distinct complaint number {i}" * 3 for i in range(20)]})
+    stream = client.post("/analyze/stream", json={"feedback": [f"another long complaint {i}" * 3 for i in range(20)]})
+
+    assert response.status_code == 413
+    assert response.json()["detail"]["code"] == "input_too_large"
+    assert stream.status_code == 413
+    assert calls == []
+
+
+def test_trim_policy_drops_least_reported_feedback(monkeypatch, capturing_client) -> None:
+    calls = capturing_client()
+    monkeypatch.setenv("INSIGHT2SPEC_MAX_INPUT_TOKENS", "150")
+    monkeypatch.setenv("INSIGHT2SPEC_INPUT_BUDGET_POLICY", "trim")
+    feedback = ["Search ignores filters"] * 3 + [f"One-off request about widget {i} " * 4 for i in range(10)]
+
+    response = TestClient(create_app()).post("/analyze", json={"feedback": feedback})
+
+    assert response.status_code == 200
+    assert calls[0]["user_prompt"].startswith("Feedback:\n- Search ignores filters (x3)")
+    usage = response.json()["metadata"]["usage"]
+    assert usage["estimated_prompt_tokens"] <= 150
+    assert usage["trimmed_items"] > 0